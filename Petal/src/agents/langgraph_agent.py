@@ -14,11 +14,10 @@ import time
 
 # Try to import OpenAI and other dependencies
 try:
-    from openai import OpenAI
     from dotenv import load_dotenv
     load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    openai_client = OpenAI(api_key=api_key) if api_key else None
+    from src.utils.openai_client import get_openai_client
+    openai_client = get_openai_client()
 except:
     openai_client = None
 
@@ -360,16 +359,13 @@ def get_medical_content_from_database(query: str) -> str:
     
     # Try to load from FAISS index (from your ingest.py)
     try:
-        from langchain.vectorstores import FAISS
-        from langchain_openai import OpenAIEmbeddings
+        from src.graph.vector_store import get_vector_store, FAISS_INDEX_PATH
         
-        if openai_client and os.path.exists("src/graph/faiss_index"):
-            print("📚 Loading from FAISS medical database...")
-            embeddings = OpenAIEmbeddings(openai_api_key=api_key)
-            vectorstore = FAISS.load_local("src/graph/faiss_index", embeddings)
+        if os.path.exists(FAISS_INDEX_PATH):
+            print("📚 Searching resident FAISS medical database...")
             
             # Search for relevant documents
-            docs = vectorstore.similarity_search(query, k=3)
+            docs = get_vector_store().similarity_search(query, k=3)
             
             medical_content = ""
             for doc in docs:
@@ -384,46 +380,25 @@ def get_medical_content_from_database(query: str) -> str:
     except Exception as e:
         print(f"⚠️ FAISS database error: {e}")
     
-    # Fallback: Try raw medical content files (from your ingest.py backup)
+    # Fallback: BM25 index over raw medical content files (from your ingest.py backup)
     try:
-        if os.path.exists("src/graph/raw_medical_content"):
-            print("📄 Loading from raw medical content backup...")
+        from src.graph.bm25_index import get_bm25_index
+        
+        index = get_bm25_index()
+        if index is not None:
+            print("📄 Searching raw medical content index...")
             
             all_content = ""
-            query_lower = query.lower()
-            query_terms = [term for term in query_lower.split() if len(term) > 2]
             
-            for filename in os.listdir("src/graph/raw_medical_content"):
-                if filename.endswith('.txt'):
-                    filepath = os.path.join("src/graph/raw_medical_content", filename)
+            for doc_id, score in index.search(query, k=5):
+                # Body text is stored without the metadata header
+                medical_lines = [line.strip() for line in index.docs[doc_id]["text"].split('\n') if len(line.strip()) > 30]
+                
+                if medical_lines:
+                    all_content += '\n\n'.join(medical_lines[:3])  # First 3 relevant paragraphs
                     
-                    try:
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        
-                        # Check if content is relevant to query
-                        content_lower = content.lower()
-                        if any(term in content_lower for term in query_terms):
-                            # Extract just the medical content (skip metadata)
-                            lines = content.split('\n')
-                            medical_lines = []
-                            skip_metadata = True
-                            
-                            for line in lines:
-                                if '=' * 20 in line:  # End of metadata
-                                    skip_metadata = False
-                                    continue
-                                if not skip_metadata and len(line.strip()) > 30:
-                                    medical_lines.append(line.strip())
-                            
-                            if medical_lines:
-                                all_content += '\n\n'.join(medical_lines[:3])  # First 3 relevant paragraphs
-                                
-                        if len(all_content) > 1000:  # Enough content
-                            break
-                            
-                    except Exception as e:
-                        continue
+                if len(all_content) > 1000:  # Enough content
+                    break
             
             return all_content
             
@@ -10,8 +10,10 @@ except Exception as e:
     print(f"⚠️ LangGraph agent build error: {e}")
     agent = None
 
-def get_agent_response(user_input, emotion=None):
-    """Get agent response with CRISIS DETECTION FIRST"""
+def get_agent_response(user_input, emotion=None, stream=False):
+    """Get agent response with CRISIS DETECTION FIRST.
+    stream=True lets the GraphRAG step return a generator of text deltas;
+    crisis, agent and fallback replies are always whole strings."""
     
     print(f"🤖 LangGraph Router processing: {user_input}")
     
@@ -72,8 +74,11 @@ You don't have to go through this alone. 🌸"""
     try:
         print(f"🔄 Falling back to GraphRAG system")
         from src.graph.graphrag_retriever import get_comprehensive_response
-        response = get_comprehensive_response(user_input)
+        response = get_comprehensive_response(user_input, stream=stream)
         
+        if response is not None and not isinstance(response, str):
+            print(f"✅ GraphRAG streaming response")
+            return response
         if response and len(response) > 50:
             print(f"✅ GraphRAG provided response ({len(response)} chars)")
             return response
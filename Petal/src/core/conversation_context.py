@@ -0,0 +1,229 @@
+# src/core/conversation_context.py - ROLLING PER-USER CONVERSATION CONTEXT
+# Each user keeps a ring buffer of their last few turns, already cut to preview
+# length, plus the rendered context string and its token count. store_memory
+# pushes a turn; get_conversation_context returns the cached string without
+# rebuilding it or reading the conversation store. Turns that leave the window
+# wait for the compaction stage in user_memory to fold them into a running
+# summary, so the context stays within a fixed token budget.
+
+import os
+import threading
+from collections import deque, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+CONTEXT_TURNS = 5            # turns in the context window
+RESPONSE_PREVIEW_CHARS = 150  # assistant replies are cut to this in the context
+CONTEXT_TOKEN_BUDGET = int(os.getenv("PETAL_CONTEXT_TOKENS", "500"))  # summary + recent turns
+SUMMARY_TOKENS = int(os.getenv("PETAL_SUMMARY_TOKENS", "120"))       # share reserved for the summary
+PENDING_RESPONSE_CHARS = 600  # reply text kept for the summarizer
+MAX_PENDING_TURNS = 20       # turns awaiting compaction before the oldest are dropped
+MAX_CACHED_USERS = 10000     # process-level contexts kept (least recently used dropped)
+SUMMARY_PREFIX = "Earlier in this conversation: "
+
+
+def _count_tokens(text: str) -> int:
+    try:
+        from src.utils.tokens import count_tokens
+        return count_tokens(text)
+    except Exception:
+        return max(1, len(text) // 4)
+
+
+def render_turn(message: str, response: str) -> str:
+    """One turn as it appears in the context"""
+    preview = response[:RESPONSE_PREVIEW_CHARS] + "..." if len(response) > RESPONSE_PREVIEW_CHARS else response
+    return f"User: {message}\nAssistant: {preview}"
+
+
+class RollingContext:
+    """Running summary plus the last N turns of one user, pre-rendered, with the
+    joined string and token count cached"""
+
+    def __init__(self, turns: int = CONTEXT_TURNS, token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.max_turns = turns
+        self.token_budget = token_budget
+        self._turns = deque()  # (rendered turn, tokens, message, response)
+        self._pending = []     # (message, response) that left the window, not yet summarized
+        self._summary = ""
+        self._summary_tokens = 0
+        self._text = ""
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def _render(self) -> None:
+        """Re-join at most N short strings - keeps every update O(1)"""
+        parts = [SUMMARY_PREFIX + self._summary] if self._summary else []
+        parts.extend(turn for turn, _, _, _ in self._turns)
+        self._text = "\n".join(parts)
+        self._tokens = (self._summary_tokens + sum(tokens for _, tokens, _, _ in self._turns)
+                        + max(0, len(parts) - 1))
+
+    def push(self, message: str, response: str) -> bool:
+        """Add a turn; True when turns are waiting to be compacted into the summary"""
+        message, response = message or "", response or ""
+        turn = render_turn(message, response)
+        tokens = _count_tokens(turn)
+        with self._lock:
+            self._turns.append((turn, tokens, message, response[:PENDING_RESPONSE_CHARS]))
+            # Verbose turns leave the window early, so recent turns + summary stay within budget
+            recent_budget = self.token_budget - SUMMARY_TOKENS
+            while len(self._turns) > 1 and (len(self._turns) > self.max_turns
+                                            or sum(t for _, t, _, _ in self._turns) > recent_budget):
+                _, _, old_message, old_response = self._turns.popleft()
+                self._pending.append((old_message, old_response))
+            del self._pending[:-MAX_PENDING_TURNS]
+            self._render()
+            return bool(self._pending)
+
+    def extend(self, turns: List[Dict]) -> None:
+        for turn in turns[-self.max_turns:]:
+            self.push(turn.get("message", ""), turn.get("response", ""))
+
+    def pending(self) -> Tuple[str, List[Tuple[str, str]]]:
+        """(current summary, turns waiting to be folded into it)"""
+        with self._lock:
+            return self._summary, list(self._pending)
+
+    def set_summary(self, summary: str, compacted: int = 0) -> None:
+        """Install a new running summary covering the first `compacted` pending turns"""
+        tokens = _count_tokens(summary) if summary else 0
+        with self._lock:
+            del self._pending[:compacted]
+            self._summary = summary
+            self._summary_tokens = tokens
+            self._render()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._turns.clear()
+            self._pending.clear()
+            self._summary = ""
+            self._summary_tokens = 0
+            self._text = ""
+            self._tokens = 0
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+
+_process_contexts = OrderedDict()
+_contexts_lock = threading.Lock()
+_stats = {"hits": 0, "seeded": 0, "pushes": 0}
+
+
+def _count(key: str) -> None:
+    with _contexts_lock:
+        _stats[key] += 1
+
+
+def _session_contexts() -> Optional[Dict]:
+    """Per-browser-session contexts when running under Streamlit, else None"""
+    try:
+        import streamlit as st
+        if 'conversation_contexts' not in st.session_state:
+            st.session_state.conversation_contexts = {}
+        return st.session_state.conversation_contexts
+    except Exception:
+        return None
+
+
+def _seed(context: RollingContext, user_id: str) -> None:
+    """Fill a context this process hasn't seen yet (once per user): the stored
+    running summary, then recent turns from session memory or the store.
+    A shared user id is seeded from session memory only - its stored history is someone else's."""
+    try:
+        from src.core.conversation_store import get_conversation_store, has_user_identity
+        store = get_conversation_store() if has_user_identity(user_id) else None
+    except Exception as e:
+        print(f"⚠️ Could not seed context for {user_id}: {e}")
+        return
+    try:
+        if store is not None:
+            context.set_summary(store.load_summary(user_id))
+        turns = None
+        try:
+            import streamlit as st
+            turns = st.session_state.get('conversation_memory', {}).get(user_id)
+        except Exception:
+            pass
+        if turns:
+            context.extend(turns[-CONTEXT_TURNS:])
+        elif store is not None:
+            context.extend(store.tail(user_id, CONTEXT_TURNS))
+    except Exception as e:
+        print(f"⚠️ Could not seed context for {user_id}: {e}")
+
+
+def get_rolling_context(user_id: str) -> RollingContext:
+    """The user's context, created (and seeded from earlier turns) on first use"""
+    contexts = _session_contexts()
+    if contexts is not None:
+        context = contexts.get(user_id)
+        if context is None:
+            context = contexts[user_id] = RollingContext()
+            _seed(context, user_id)
+            _count("seeded")
+        return context
+
+    with _contexts_lock:
+        context = _process_contexts.get(user_id)
+        if context is not None:
+            _process_contexts.move_to_end(user_id)
+            return context
+    context = RollingContext()
+    _seed(context, user_id)
+    with _contexts_lock:
+        # Another thread may have seeded the same user meanwhile - keep the first
+        context = _process_contexts.setdefault(user_id, context)
+        _stats["seeded"] += 1
+        if len(_process_contexts) > MAX_CACHED_USERS:
+            _process_contexts.popitem(last=False)
+    return context
+
+
+def record_turn(user_id: str, message: str, response: str) -> Optional[RollingContext]:
+    """Push a finished turn (call before the turn is added to session memory, so a seed can't include it).
+    Returns the context when it has turns waiting for compaction."""
+    context = get_rolling_context(user_id)
+    _count("pushes")
+    return context if context.push(message, response) else None
+
+
+def conversation_context(user_id: str) -> str:
+    context = get_rolling_context(user_id)
+    _count("hits")
+    return context.text
+
+
+def clear_contexts(user_id: Optional[str] = None, everyone: bool = False) -> None:
+    """Empty one user's context, or (no user_id) every context in the caller's browser session.
+    everyone=True also empties the process-wide contexts of all users - admin and test use only.
+    Emptied contexts stay registered so the next turn doesn't re-seed them from stored history."""
+    contexts = _session_contexts()
+    registries = [contexts] if contexts is not None else []
+    if user_id is not None or everyone:
+        registries.append(_process_contexts)
+    for registry in registries:
+        with _contexts_lock:
+            if user_id is not None and user_id not in registry:
+                registry[user_id] = RollingContext()
+            for uid, context in list(registry.items()):
+                if user_id is None or uid == user_id:
+                    context.clear()
+
+
+def get_context_stats() -> Dict:
+    with _contexts_lock:
+        return dict(_stats, cached_users=len(_process_contexts))
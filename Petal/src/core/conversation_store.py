@@ -0,0 +1,265 @@
+# src/core/conversation_store.py - APPEND-ONLY CONVERSATION STORE
+# Every turn is one INSERT into SQLite (WAL mode), so a message costs the same
+# whether the user has 5 turns or 5,000 and concurrent sessions never rewrite
+# each other's history. Recent history is an index range scan per user. The old
+# user_conversation_memory.json is imported once, the first time the store opens.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from src.utils.write_behind import get_write_behind
+
+CONVERSATION_DB = os.getenv("PETAL_CONVERSATION_DB", "src/data/conversations.db")
+LEGACY_MEMORY_FILE = "user_conversation_memory.json"
+BUSY_TIMEOUT_MS = 5000  # how long a writer waits for another writer's lock
+# Ids every visitor gets until the app has logins - history saved under them belongs to
+# whoever used the app last, so summaries and episodes are never read back for them
+SHARED_USER_IDS = set(os.getenv("PETAL_SHARED_USER_IDS", "user_001").split(","))
+
+def has_user_identity(user_id: Optional[str]) -> bool:
+    """Whether user_id names one person (set, and not an id shared by every session)"""
+    return bool(user_id) and user_id not in SHARED_USER_IDS
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id   TEXT NOT NULL,
+    message   TEXT NOT NULL,
+    response  TEXT NOT NULL,
+    emotion   TEXT NOT NULL DEFAULT '',
+    symptoms  TEXT NOT NULL DEFAULT '[]',
+    timestamp TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS turns_by_user ON turns (user_id, id);
+CREATE TABLE IF NOT EXISTS summaries (
+    user_id       TEXT PRIMARY KEY,
+    summary       TEXT NOT NULL,
+    turns_covered INTEGER NOT NULL DEFAULT 0,
+    updated       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id   TEXT NOT NULL,
+    text      TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    vector    BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS episodes_by_user ON episodes (user_id, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _read_legacy_json(path: str) -> Dict[str, List[Dict]]:
+    """The old memory file - written as UTF-8 by the app, UTF-16 by some editors"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    encoding = "utf-16" if raw[:2] in (b"\xff\xfe", b"\xfe\xff") else "utf-8-sig"
+    text = raw.decode(encoding).strip()
+    data = json.loads(text) if text else {}
+    return data if isinstance(data, dict) else {}
+
+
+class ConversationStore:
+    """Per-user turn log in SQLite; safe to share between threads and processes"""
+
+    def __init__(self, path: str = CONVERSATION_DB):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"appends": 0, "tail_reads": 0, "append_ms": 0.0, "read_ms": 0.0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections can't be shared across threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable across app crashes; WAL keeps it consistent
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    @staticmethod
+    def _row(user_id: str, message: str, response: str, emotion: str = "",
+             symptoms: Optional[List[str]] = None, timestamp: Optional[str] = None) -> tuple:
+        return (user_id, message or "", response or "", emotion or "",
+                json.dumps(symptoms or []), timestamp or datetime.now().isoformat())
+
+    def append(self, user_id: str, message: str, response: str, emotion: str = "",
+               symptoms: Optional[List[str]] = None, timestamp: Optional[str] = None) -> None:
+        """Add one turn - a single indexed insert, independent of history size"""
+        self.append_many([self._row(user_id, message, response, emotion, symptoms, timestamp)])
+
+    def append_many(self, rows: Iterable[tuple]) -> int:
+        """Add several turns in one transaction; rows as built by _row"""
+        start = time.perf_counter()
+        rows = list(rows)
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO turns (user_id, message, response, emotion, symptoms, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._count("appends", len(rows))
+        self._count("append_ms", (time.perf_counter() - start) * 1000)
+        return len(rows)
+
+    def tail(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """A user's most recent turns, oldest first (all of them when limit is None)"""
+        start = time.perf_counter()
+        query = "SELECT message, response, emotion, symptoms, timestamp FROM turns WHERE user_id = ? ORDER BY id DESC"
+        params = (user_id,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (user_id, limit)
+        rows = self._connection().execute(query, params).fetchall()
+        self._count("tail_reads")
+        self._count("read_ms", (time.perf_counter() - start) * 1000)
+
+        turns = []
+        for row in reversed(rows):
+            turn = dict(row)
+            try:
+                turn["symptoms"] = json.loads(turn["symptoms"])
+            except (TypeError, ValueError):
+                turn["symptoms"] = []
+            turns.append(turn)
+        return turns
+
+    def count(self, user_id: str) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM turns WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def save_summary(self, user_id: str, summary: str, turns_added: int = 0) -> None:
+        """Replace a user's running summary of turns older than the context window"""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO summaries (user_id, summary, turns_covered, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET summary = excluded.summary, "
+                "turns_covered = turns_covered + excluded.turns_covered, updated = excluded.updated",
+                (user_id, summary, turns_added, datetime.now().isoformat()))
+
+    def load_summary(self, user_id: str) -> str:
+        row = self._connection().execute("SELECT summary FROM summaries WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else ""
+
+    def save_episode(self, user_id: str, text: str, timestamp: str, vector: bytes, capacity: int,
+                     replace: Iterable[int] = ()) -> tuple:
+        """Store one embedded message, dropping `replace` and the user's oldest beyond capacity.
+        Returns (new id, evicted ids)."""
+        replace = list(replace)
+        with self._connection() as conn:
+            if replace:
+                conn.executemany("DELETE FROM episodes WHERE id = ?", [(i,) for i in replace])
+            episode_id = conn.execute(
+                "INSERT INTO episodes (user_id, text, timestamp, vector) VALUES (?, ?, ?, ?)",
+                (user_id, text, timestamp, vector)).lastrowid
+            evicted = [row[0] for row in conn.execute(
+                "SELECT id FROM episodes WHERE user_id = ? ORDER BY id DESC LIMIT -1 OFFSET ?",
+                (user_id, capacity))]
+            if evicted:
+                conn.executemany("DELETE FROM episodes WHERE id = ?", [(i,) for i in evicted])
+        return episode_id, evicted
+
+    def load_episodes(self, user_id: str) -> List[tuple]:
+        """A user's stored episodes as (id, text, timestamp, vector bytes), oldest first"""
+        rows = self._connection().execute(
+            "SELECT id, text, timestamp, vector FROM episodes WHERE user_id = ? ORDER BY id", (user_id,)).fetchall()
+        return [tuple(row) for row in rows]
+
+    def migrate_json(self, path: str = LEGACY_MEMORY_FILE) -> int:
+        """Import the old whole-file JSON memory once; returns the number of turns imported.
+        A missing or unreadable file is skipped (and retried next start) rather than failing the app."""
+        if not os.path.exists(path):
+            return 0
+        key = f"migrated:{os.path.abspath(path)}"
+        conn = self._connection()
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return 0
+
+        try:
+            data = _read_legacy_json(path)
+        except Exception as e:
+            print(f"⚠️ Could not import {path}: {e}")
+            return 0
+
+        rows = []
+        for user_id, entries in data.items():
+            for entry in entries if isinstance(entries, list) else []:
+                if isinstance(entry, dict):
+                    rows.append(self._row(str(user_id), entry.get("message", ""), entry.get("response", ""),
+                                          entry.get("emotion", ""), entry.get("symptoms"),
+                                          entry.get("timestamp", "")))
+
+        with conn:
+            # Marker and rows commit together, so a concurrent start can't import twice
+            inserted = conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+                                    (key, datetime.now().isoformat())).rowcount
+            if inserted:
+                conn.executemany(
+                    "INSERT INTO turns (user_id, message, response, emotion, symptoms, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        if inserted and rows:
+            print(f"📦 Imported {len(rows)} turns for {len(data)} users from {path}")
+        return len(rows) if inserted else 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        conn = self._connection()
+        stats["turns"] = conn.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+        stats["users"] = conn.execute("SELECT COUNT(DISTINCT user_id) FROM turns").fetchone()[0]
+        stats["path"] = self.path
+        stats["avg_append_ms"] = round(stats["append_ms"] / stats["appends"], 3) if stats["appends"] else 0.0
+        stats["avg_read_ms"] = round(stats["read_ms"] / stats["tail_reads"], 3) if stats["tail_reads"] else 0.0
+        del stats["append_ms"], stats["read_ms"]
+        return stats
+
+
+_conversation_store = None
+_conversation_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    """Get the process-wide conversation store (imports the legacy JSON file on first use)"""
+    global _conversation_store
+    if _conversation_store is None:
+        with _conversation_store_lock:
+            if _conversation_store is None:
+                store = ConversationStore()
+                try:
+                    store.migrate_json()
+                except Exception as e:
+                    print(f"⚠️ Legacy memory import failed: {e}")
+                _conversation_store = store
+    return _conversation_store
+
+
+def get_conversation_store_stats() -> Dict:
+    return get_conversation_store().get_stats()
+
+
+def append_turn_later(user_id: str, message: str, response: str, emotion: str = "",
+                      symptoms: Optional[List[str]] = None) -> None:
+    """Queue a turn for the background writer; queued turns are inserted in one transaction"""
+    get_write_behind().submit("turn", ConversationStore._row(user_id, message, response, emotion, symptoms))
+
+
+get_write_behind().register("turn", lambda rows: get_conversation_store().append_many(rows))
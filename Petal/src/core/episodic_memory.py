@@ -0,0 +1,296 @@
+# src/core/episodic_memory.py - PER-USER EPISODIC MEMORY INDEX
+# Every user message is embedded (offline hashing embedder by default) and kept
+# as a float32 BLOB next to the conversation store. Only its content words are
+# embedded - function words and period/cycle boilerplate, which nearly every
+# message shares, would otherwise outweigh the symptom. A query recalls the user's
+# most similar earlier messages - a symptom mentioned weeks ago - with one matrix
+# product over a bounded per-user set, so recall cost doesn't grow with history.
+# Only users with their own identity are stored; a shared id (every visitor is
+# "user_001" until there are logins) gets an in-memory index per browser session.
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.core.conversation_store import get_conversation_store, has_user_identity
+from src.utils.write_behind import get_write_behind
+from src.graph.embeddings import create_embeddings
+
+EPISODIC_MEMORY = os.getenv("PETAL_EPISODIC_MEMORY", "1") == "1"
+EPISODIC_EMBEDDINGS = os.getenv("PETAL_EPISODIC_EMBEDDINGS", "local")
+# 512 hashed dimensions = 2 KB per remembered message (fewer collisions between short messages than 256)
+EPISODIC_EMBEDDING_MODEL = os.getenv("PETAL_EPISODIC_EMBEDDING_MODEL", "hash-512")
+EPISODIC_CAPACITY = int(os.getenv("PETAL_EPISODIC_CAPACITY", "200"))  # messages kept per user
+EPISODIC_TOP_K = int(os.getenv("PETAL_EPISODIC_TOP_K", "3"))
+EPISODIC_MIN_SIMILARITY = float(os.getenv("PETAL_EPISODIC_MIN_SIMILARITY", "0.35"))
+DUPLICATE_SIMILARITY = 0.97  # a repeat of a remembered message replaces it instead of taking a slot
+MAX_EPISODE_CHARS = 300
+MIN_EPISODE_WORDS = 3        # "ok", "thanks" etc. aren't worth a slot
+MAX_LOADED_USERS = 1000      # users whose vectors are held in memory (least recently used dropped)
+SKIP_EMOTIONS = ("crisis", "redirect")  # crisis disclosures and off-topic messages are never recalled
+RECALLED_HEADER = "Relevant earlier messages from this user:"
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset("""
+a an the i i'm im me my mine myself you your we our it its it's is am are was were be been being
+do does did doing have has had having get gets got getting just really so very too also still always
+and or but if then than of to in on at by for with from about as into over up down out off again
+this that these those there here what when where why how which who can can't cant could would should
+will won't not no don't dont feel feels feeling felt like kind sort bit lot every time times
+day days night nights week weeks month months lately today now usually before during after
+start starts started starting keep keeps
+""".split())
+# Shared by nearly every message in a period-tracking chat, so they say nothing about which one
+CYCLE_WORDS = frozenset("""period periods cycle cycles menstrual menstruation menstruating menses
+pms flow""".split())
+# Everyday words for the same symptom embed as one word
+SYMPTOM_WORDS = {
+    **dict.fromkeys(["pain", "pains", "painful", "cramp", "cramps", "cramping", "ache", "aches", "aching",
+                     "achy", "hurt", "hurts", "hurting", "sore"], "pain"),
+    **dict.fromkeys(["sleep", "sleeping", "slept", "asleep", "insomnia", "awake", "waking"], "sleep"),
+    **dict.fromkeys(["tired", "fatigue", "fatigued", "exhausted", "exhaustion", "drained"], "tired"),
+    **dict.fromkeys(["headache", "headaches", "migraine", "migraines"], "headache"),
+    **dict.fromkeys(["bloated", "bloating", "bloat"], "bloating"),
+    **dict.fromkeys(["nausea", "nauseous", "sick", "queasy"], "nausea"),
+}
+
+
+def content_words(text: str) -> str:
+    """What a message is about: its words minus function words and cycle boilerplate,
+    with symptom synonyms folded together"""
+    words = _TOKEN_PATTERN.findall(text.lower())
+    return " ".join(SYMPTOM_WORDS.get(w, w) for w in words if w not in _STOPWORDS and w not in CYCLE_WORDS)
+
+
+class _UserEpisodes:
+    """One user's remembered messages: ids, texts and a (n, dim) unit-vector matrix"""
+
+    def __init__(self, rows: List[tuple], dim: Optional[int]):
+        self.ids = [row[0] for row in rows]
+        self.texts = [row[1] for row in rows]
+        self.timestamps = [row[2] for row in rows]
+        vectors = [np.frombuffer(row[3], dtype=np.float32) for row in rows]
+        if vectors and dim is not None:
+            keep = [i for i, v in enumerate(vectors) if v.shape[0] == dim]  # skip rows from another embedder
+            self.ids = [self.ids[i] for i in keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.timestamps = [self.timestamps[i] for i in keep]
+            vectors = [vectors[i] for i in keep]
+        self.vectors = np.vstack(vectors) if vectors else None
+        self.lock = threading.Lock()
+
+    def add(self, episode_id: int, text: str, timestamp: str, vector: np.ndarray, evicted: List[int]) -> None:
+        gone = set(evicted)
+        if gone:
+            keep = [i for i, existing in enumerate(self.ids) if existing not in gone]
+            self.ids = [self.ids[i] for i in keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.timestamps = [self.timestamps[i] for i in keep]
+            self.vectors = self.vectors[keep] if keep else None
+        self.ids.append(episode_id)
+        self.texts.append(text)
+        self.timestamps.append(timestamp)
+        row = vector[np.newaxis, :]
+        self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])
+
+
+class _SessionEpisodeStore:
+    """save_episode/load_episodes held in memory, for an index that lives only as long as its session"""
+
+    def __init__(self):
+        self._rows = {}  # user_id -> [(id, text, timestamp, vector bytes)], oldest first
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def save_episode(self, user_id: str, text: str, timestamp: str, vector: bytes, capacity: int,
+                     replace=()) -> tuple:
+        with self._lock:
+            gone = set(replace)
+            rows = [row for row in self._rows.get(user_id, []) if row[0] not in gone]
+            self._next_id += 1
+            rows.append((self._next_id, text, timestamp, vector))
+            evicted = [row[0] for row in rows[:-capacity]] if len(rows) > capacity else []
+            self._rows[user_id] = rows[-capacity:]
+            return self._next_id, evicted
+
+    def load_episodes(self, user_id: str) -> List[tuple]:
+        with self._lock:
+            return list(self._rows.get(user_id, []))
+
+
+class EpisodicMemory:
+    """Top-k recall over each user's earlier messages, capped at `capacity` per user (oldest evicted)"""
+
+    def __init__(self, capacity: int = EPISODIC_CAPACITY, embeddings=None, store=None):
+        self.capacity = capacity
+        self.embeddings = embeddings or create_embeddings(EPISODIC_EMBEDDINGS, EPISODIC_EMBEDDING_MODEL)
+        self.store = store or get_conversation_store()
+        self._dim = None
+        self._users = OrderedDict()  # user_id -> _UserEpisodes, least recently used first
+        self._lock = threading.Lock()
+        self._stats = {"remembered": 0, "replaced": 0, "evicted": 0, "recalls": 0, "recalled": 0,
+                       "recall_ms": 0.0}
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Unit vector of the message's content words (all zeros when it has none)"""
+        vector = np.asarray(self.embeddings.embed_query(content_words(text)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        self._dim = vector.shape[0]
+        return vector / norm if norm > 0 else vector
+
+    def _episodes(self, user_id: str) -> _UserEpisodes:
+        with self._lock:
+            episodes = self._users.get(user_id)
+            if episodes is not None:
+                self._users.move_to_end(user_id)
+                return episodes
+        if self._dim is None:
+            self._embed("petal")  # learn the embedder's dimension so stale-width rows can be skipped
+        episodes = _UserEpisodes(self.store.load_episodes(user_id), self._dim)
+        with self._lock:
+            episodes = self._users.setdefault(user_id, episodes)
+            if len(self._users) > MAX_LOADED_USERS:
+                self._users.popitem(last=False)
+        return episodes
+
+    def remember(self, user_id: str, message: str, timestamp: Optional[str] = None) -> bool:
+        """Embed and keep a user message; False if it's too short to be worth recalling"""
+        text = " ".join((message or "").split())[:MAX_EPISODE_CHARS]
+        if len(text.split()) < MIN_EPISODE_WORDS or not content_words(text):
+            return False
+        vector = self._embed(text)
+        timestamp = timestamp or datetime.now().isoformat()
+        episodes = self._episodes(user_id)
+
+        with episodes.lock:
+            replace = []
+            if episodes.vectors is not None:
+                similarities = episodes.vectors @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= DUPLICATE_SIMILARITY:
+                    replace = [episodes.ids[best]]
+            episode_id, evicted = self.store.save_episode(user_id, text, timestamp, vector.tobytes(),
+                                                          self.capacity, replace)
+            episodes.add(episode_id, text, timestamp, vector, replace + evicted)
+
+        self._count("remembered")
+        self._count("replaced", len(replace))
+        self._count("evicted", len(evicted))
+        return True
+
+    def recall(self, user_id: str, query: str, k: int = EPISODIC_TOP_K,
+               min_similarity: float = EPISODIC_MIN_SIMILARITY, exclude: str = "") -> List[Dict]:
+        """Up to k earlier messages most similar to the query, best first.
+        Messages that appear in `exclude` (e.g. the recent context) are skipped."""
+        start = time.perf_counter()
+        episodes = self._episodes(user_id)
+        recalled = []
+        with episodes.lock:
+            if episodes.vectors is not None:
+                similarities = episodes.vectors @ self._embed(query)
+                candidates = min(len(similarities), k + EPISODIC_TOP_K)  # spare picks for excluded ones
+                top = np.argpartition(-similarities, candidates - 1)[:candidates]
+                for i in top[np.argsort(-similarities[top])]:
+                    if similarities[i] < min_similarity or len(recalled) == k:
+                        break
+                    if episodes.texts[i] in exclude:
+                        continue
+                    recalled.append({"text": episodes.texts[i], "timestamp": episodes.timestamps[i],
+                                     "similarity": round(float(similarities[i]), 3)})
+
+        self._count("recalls")
+        self._count("recalled", len(recalled))
+        self._count("recall_ms", (time.perf_counter() - start) * 1000)
+        return recalled
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["loaded_users"] = len(self._users)
+        stats["capacity"] = self.capacity
+        stats["dim"] = self._dim
+        stats["bytes_per_user_max"] = self.capacity * (self._dim or 0) * 4
+        stats["avg_recall_ms"] = round(stats["recall_ms"] / stats["recalls"], 3) if stats["recalls"] else 0.0
+        del stats["recall_ms"]
+        return stats
+
+
+def format_recalled(recalled: List[Dict]) -> str:
+    """Recalled messages as a context block (no "User:" lines, so the prompt builder keeps it whole)"""
+    if not recalled:
+        return ""
+    lines = [f"- ({item['timestamp'][:10]}) {item['text']}" for item in recalled]
+    return RECALLED_HEADER + "\n" + "\n".join(lines)
+
+
+_episodic_memory = None
+_episodic_memory_lock = threading.Lock()
+
+
+def get_episodic_memory() -> EpisodicMemory:
+    """Get the process-wide episodic memory index"""
+    global _episodic_memory
+    if _episodic_memory is None:
+        with _episodic_memory_lock:
+            if _episodic_memory is None:
+                _episodic_memory = EpisodicMemory()
+    return _episodic_memory
+
+
+def _memory_for(user_id: str, clear: bool = False) -> Optional[EpisodicMemory]:
+    """The persistent index for a user with their own identity. A shared id gets an in-memory
+    index in the browser session (dropped with the session, or on clear); None outside a session."""
+    if has_user_identity(user_id):
+        return get_episodic_memory()
+    try:
+        import streamlit as st
+        if clear or 'episodic_memory' not in st.session_state:
+            st.session_state.episodic_memory = EpisodicMemory(store=_SessionEpisodeStore())
+        return st.session_state.episodic_memory
+    except Exception:
+        return None
+
+
+def remember_turn_later(user_id: str, message: str, emotion: str = "") -> None:
+    """Embed and store a user message on the background writer (the index is picked
+    here, on the request thread, where the session is known)"""
+    if not EPISODIC_MEMORY:
+        return
+    if message == "CHAT_CLEARED":
+        if not has_user_identity(user_id):
+            _memory_for(user_id, clear=True)
+        return
+    if emotion in SKIP_EMOTIONS:
+        return
+    memory = _memory_for(user_id)
+    if memory is not None:
+        get_write_behind().defer(lambda: memory.remember(user_id, message))
+
+
+def recalled_context(user_id: str, query: str, context: str = "") -> str:
+    """Context block of the user's earlier messages relevant to the query, skipping
+    ones already in `context`; empty when disabled, nothing clears the threshold or recall fails"""
+    memory = _memory_for(user_id) if EPISODIC_MEMORY else None
+    if memory is None:
+        return ""
+    try:
+        return format_recalled(memory.recall(user_id, query, exclude=context))
+    except Exception as e:
+        print(f"⚠️ Episodic recall failed for {user_id}: {e}")
+        return ""
+
+
+def get_episodic_memory_stats() -> Dict:
+    if _episodic_memory is None:
+        return {"enabled": EPISODIC_MEMORY, "loaded": False}
+    return dict(get_episodic_memory().get_stats(), enabled=EPISODIC_MEMORY, loaded=True)
@@ -1,13 +1,174 @@
 # src/core/user_memory.py - COMPLETE UPDATED VERSION
 
-import json
 import os
-from typing import List, Dict
+import re
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
-# Keep original file-based system as backup
+from src.core.conversation_store import get_conversation_store, append_turn_later, has_user_identity
+from src.core.conversation_context import RollingContext, record_turn, clear_contexts, SUMMARY_TOKENS
+from src.core.episodic_memory import remember_turn_later
+from src.utils.tokens import count_tokens, truncate_tokens
+from src.utils.write_behind import get_write_behind
+
+# Legacy whole-file memory - imported into the conversation store on first use
 MEMORY_FILE = "user_conversation_memory.json"
 
+# ====================
+# HISTORY COMPACTION (older turns rolled into a running summary)
+# ====================
+
+# extractive: no API calls | llm: gpt-3.5-turbo rewrites the summary (extractive if it fails) | off
+SUMMARY_MODE = os.getenv("PETAL_SUMMARY_MODE", "extractive").lower()
+SUMMARY_LLM_TIMEOUT = 15
+MAX_POINT_CHARS = 160   # one extractive point: the first sentence of a user message
+MAX_TOPICS = 12         # keywords kept for history too old to quote
+TOPICS_PREFIX = "Earlier topics: "
+POINT_SEPARATOR = " | "
+
+_STOPWORDS = frozenset("""about after again also been before being could does doing done even every feel
+feeling from have having just know like make more much really should some still than that their them then
+there these they thing think this those very want what when where which while will with would your yours
+okay thanks thank please""".split())
+
+# One worker: compaction is background work and must never compete with chat turns for threads
+_compaction_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="petal-compact")
+_compacting = set()  # ids of contexts with a compaction queued or running
+_compaction_lock = threading.Lock()
+_compaction_stats = {"scheduled": 0, "compactions": 0, "turns_compacted": 0, "llm_summaries": 0,
+                     "extractive_summaries": 0, "failures": 0, "compact_ms": 0.0}
+
+def _count_compaction(key: str, amount: float = 1) -> None:
+    with _compaction_lock:
+        _compaction_stats[key] += amount
+
+def _key_sentence(text: str) -> str:
+    sentence = re.split(r"(?<=[.!?])\s+", " ".join(text.split()), maxsplit=1)[0]
+    if len(sentence) <= MAX_POINT_CHARS:
+        return sentence
+    return sentence[:MAX_POINT_CHARS].rsplit(" ", 1)[0] + "…"
+
+def _keywords(text: str) -> List[str]:
+    words = re.findall(r"[a-z']{4,}", text.lower())
+    return [word for word, _ in Counter(w for w in words if w not in _STOPWORDS).most_common(MAX_TOPICS)]
+
+def extractive_summary(previous: str, turns: List[Tuple[str, str]], budget: int = SUMMARY_TOKENS) -> str:
+    """Running summary without an API call. Recent turns are kept as the user's own
+    first sentence; points that no longer fit shrink to keywords, so older history
+    gets coarser instead of disappearing."""
+    topics, points = [], []
+    for part in previous.split(POINT_SEPARATOR) if previous else []:
+        if part.startswith(TOPICS_PREFIX):
+            topics = part[len(TOPICS_PREFIX):].split(", ")
+        elif part:
+            points.append(part)
+    points.extend(f"User: {_key_sentence(message)}" for message, _ in turns if message.strip())
+    
+    def render() -> str:
+        parts = ([TOPICS_PREFIX + ", ".join(topics)] if topics else []) + points
+        return POINT_SEPARATOR.join(parts)
+    
+    while points and count_tokens(render()) > budget:
+        oldest = points.pop(0)
+        oldest = oldest[len("User: "):] if oldest.startswith("User: ") else oldest
+        topics = list(dict.fromkeys(topics + _keywords(oldest)))[-MAX_TOPICS:]
+    while topics and count_tokens(render()) > budget:
+        topics.pop(0)
+    return render()
+
+def _llm_summary(previous: str, turns: List[Tuple[str, str]]) -> Optional[str]:
+    """Updated running summary from gpt-3.5-turbo, or None if unavailable"""
+    try:
+        from src.utils.openai_client import get_openai_client
+        client = get_openai_client()
+        if not client:
+            return None
+        
+        transcript = "\n".join(f"User: {message}\nPetal: {response}" for message, response in turns)
+        response = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You keep a running summary of a user's conversation with Petal, "
+                                              "a menstrual health companion. Keep symptoms, cycle details, worries, "
+                                              "feelings and advice already given; drop greetings and filler. "
+                                              "Reply with the summary only."},
+                {"role": "user", "content": f"Summary so far: {previous or '(none)'}\n\nNew turns:\n{transcript}\n\n"
+                                            f"Updated summary in at most {int(SUMMARY_TOKENS * 0.7)} words:"}
+            ],
+            temperature=0.2,
+            max_tokens=SUMMARY_TOKENS,
+            timeout=SUMMARY_LLM_TIMEOUT
+        )
+        text = (response.choices[0].message.content or "").strip()
+        return truncate_tokens(text, SUMMARY_TOKENS) if text else None
+    except Exception as e:
+        print(f"⚠️ LLM summary failed, using extractive: {e}")
+        return None
+
+def compact_history(user_id: str, context: RollingContext) -> None:
+    """Fold the turns that left a context's window into its running summary (and persist it
+    for users with their own identity - a shared id's summary stays in its session)"""
+    while True:
+        summary, pending = context.pending()
+        if not pending:
+            return
+        start = time.perf_counter()
+        
+        new_summary = _llm_summary(summary, pending) if SUMMARY_MODE == "llm" else None
+        _count_compaction("llm_summaries" if new_summary else "extractive_summaries")
+        if not new_summary:
+            new_summary = extractive_summary(summary, pending)
+        context.set_summary(new_summary, len(pending))
+        
+        if has_user_identity(user_id):
+            try:
+                get_conversation_store().save_summary(user_id, new_summary, len(pending))
+            except Exception as e:
+                print(f"⚠️ Summary store failed: {e}")
+        
+        compact_ms = (time.perf_counter() - start) * 1000
+        _count_compaction("compactions")
+        _count_compaction("turns_compacted", len(pending))
+        _count_compaction("compact_ms", compact_ms)
+        print(f"🗜️ Compacted {len(pending)} turns for {user_id} in {compact_ms:.0f}ms - "
+              f"context now {context.tokens} tokens")
+
+def _run_compaction(user_id: str, context: RollingContext) -> None:
+    try:
+        compact_history(user_id, context)
+    except Exception as e:
+        _count_compaction("failures")
+        print(f"⚠️ History compaction failed for {user_id}: {e}")
+    finally:
+        with _compaction_lock:
+            _compacting.discard(id(context))
+
+def update_context(user_id: str, message: str, response: str, emotion: str = "") -> None:
+    """Push a turn into the user's rolling context; older turns are summarized in the background.
+    The message also goes into the episodic index so it can be recalled after it leaves the window."""
+    remember_turn_later(user_id, message, emotion)
+    context = record_turn(user_id, message, response)
+    if context is None or SUMMARY_MODE == "off":
+        return
+    with _compaction_lock:
+        if id(context) in _compacting:
+            return  # the running compaction picks the new turns up too
+        _compacting.add(id(context))
+        _compaction_stats["scheduled"] += 1
+    _compaction_executor.submit(_run_compaction, user_id, context)
+
+def get_compaction_stats() -> Dict:
+    with _compaction_lock:
+        stats = dict(_compaction_stats)
+    stats["mode"] = SUMMARY_MODE
+    stats["avg_compact_ms"] = round(stats["compact_ms"] / stats["compactions"], 1) if stats["compactions"] else 0.0
+    del stats["compact_ms"]
+    return stats
+
 def initialize_streamlit_memory():
     """Initialize Streamlit session state for conversation memory"""
     try:
@@ -29,18 +190,15 @@ def initialize_streamlit_memory():
 def store_memory(user_id: str, message: str, response: str, emotion: str = "", symptoms: List[str] = None) -> None:
     """
     Store user message, bot response, emotion, and optional symptoms.
-    UPDATED: Uses Streamlit session state + file backup
+    UPDATED: Session state is updated right away; crisis re-detection and the
+    persistent copy run on the background writer, off the chat turn's path
     """
     
-    # Handle crisis logging first
-    try:
-        from src.utils.crisis_detector import is_crisis_message
-        from src.utils.logger import log_crisis
-        
-        if is_crisis_message(message):
-            log_crisis(user_id, message)
-    except Exception as e:
-        print(f"⚠️ Crisis detection failed: {e}")
+    # Crisis re-detection (keyword patterns) and its log write happen off the request path
+    get_write_behind().defer(lambda: _log_if_crisis(user_id, message))
+    
+    # Rolling context first - a context seeded from session memory must not already hold this turn
+    update_context(user_id, message, response, emotion)
     
     # NEW: Store in Streamlit session state for current session
     try:
@@ -71,50 +229,35 @@ def store_memory(user_id: str, message: str, response: str, emotion: str = "", s
     except Exception as e:
         print(f"⚠️ Streamlit session storage failed: {e}")
     
-    # ORIGINAL: Also store in file as backup
+    # Persistent copy: queued, then batched into one conversation store transaction
     try:
-        memory = load_memory_from_file(user_id)
+        append_turn_later(user_id, message, response, emotion, symptoms)
         
-        memory.append({
-            "message": message,
-            "response": response,
-            "emotion": emotion,
-            "symptoms": symptoms or []
-        })
-
-        # Preserve existing user data
-        if os.path.exists(MEMORY_FILE):
-            with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-                all_data = json.load(f)
-        else:
-            all_data = {}
-
-        all_data[user_id] = memory
+    except Exception as e:
+        print(f"⚠️ Conversation store write failed: {e}")
 
-        with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(all_data, f, indent=2)
-            
-        print(f"✅ Also stored in file backup")
+def _log_if_crisis(user_id: str, message: str) -> None:
+    try:
+        from src.utils.crisis_detector import is_crisis_message
+        from src.utils.logger import log_crisis
         
+        if is_crisis_message(message):
+            log_crisis(user_id, message)
     except Exception as e:
-        print(f"⚠️ File backup storage failed: {e}")
-
-def load_memory_from_file(user_id: str) -> List[Dict]:
-    """Load memory from file (original function)"""
-    if not os.path.exists(MEMORY_FILE):
-        return []
+        print(f"⚠️ Crisis detection failed: {e}")
 
+def load_memory_from_file(user_id: str, limit: Optional[int] = None) -> List[Dict]:
+    """Load persisted memory (newest `limit` turns, oldest first) from the conversation store"""
     try:
-        with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-            all_data = json.load(f)
-        return all_data.get(user_id, [])
-    except (json.JSONDecodeError, FileNotFoundError):
+        return get_conversation_store().tail(user_id, limit)
+    except Exception as e:
+        print(f"⚠️ Conversation store read failed: {e}")
         return []
 
-def load_memory(user_id: str) -> List[Dict]:
+def load_memory(user_id: str, limit: Optional[int] = None) -> List[Dict]:
     """
-    Retrieve conversation history for a given user.
-    UPDATED: Prioritizes Streamlit session state, falls back to file
+    Retrieve conversation history for a given user (only the newest `limit` turns if given).
+    UPDATED: Prioritizes Streamlit session state, falls back to the conversation store
     """
     
     # NEW: Try to load from Streamlit session state first
@@ -124,6 +267,8 @@ def load_memory(user_id: str) -> List[Dict]:
         
         if user_id in st.session_state.conversation_memory:
             session_memory = st.session_state.conversation_memory[user_id]
+            if limit is not None:
+                session_memory = session_memory[-limit:]
             print(f"📖 Loaded {len(session_memory)} messages from Streamlit session state")
             return session_memory
             
@@ -132,9 +277,9 @@ def load_memory(user_id: str) -> List[Dict]:
     except Exception as e:
         print(f"⚠️ Streamlit session load failed: {e}")
     
-    # ORIGINAL: Fall back to file-based memory
-    file_memory = load_memory_from_file(user_id)
-    print(f"📖 Loaded {len(file_memory)} messages from file backup")
+    # Fall back to persisted memory
+    file_memory = load_memory_from_file(user_id, limit)
+    print(f"📖 Loaded {len(file_memory)} messages from conversation store")
     return file_memory
 
 def summarize_memory(user_id: str) -> str:
@@ -142,7 +287,7 @@ def summarize_memory(user_id: str) -> str:
     Summarize recent conversation history for a user.
     UPDATED: Uses the enhanced load_memory function
     """
-    memory = load_memory(user_id)
+    memory = load_memory(user_id, limit=5)
     if not memory:
         return ""
     
@@ -274,6 +419,7 @@ def clear_session_memory():
         import streamlit as st
         if 'conversation_memory' in st.session_state:
             st.session_state.conversation_memory = {}
+            clear_contexts()  # this browser session's contexts only - other users keep theirs
             print("✅ Cleared Streamlit session memory")
             return True
     except:
@@ -0,0 +1,226 @@
+# src/graph/bm25_index.py - INVERTED-INDEX BM25 SEARCH OVER RAW MEDICAL CONTENT
+# Built by ingest.py alongside the raw_medical_content files, loaded once per
+# process, and queried without touching the corpus files again.
+
+import os
+import re
+import json
+import math
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+RAW_CONTENT_DIR = "src/graph/raw_medical_content"
+BM25_INDEX_PATH = os.getenv("PETAL_BM25_INDEX_PATH", "src/graph/bm25_index.json")
+HEADER_SEPARATOR = "=" * 50
+INDEX_VERSION = 1
+RELOAD_CHECK_INTERVAL = 5.0
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+_SENTENCE_PATTERN = re.compile(r"[^.!?]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens longer than two characters (same rule as the old keyword scan)"""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if len(token) > 2]
+
+
+def sentence_spans(text: str) -> List[List[int]]:
+    """Offsets of the sentences long enough to quote back to the user"""
+    spans = []
+    for match in _SENTENCE_PATTERN.finditer(text):
+        sentence = match.group()
+        stripped = sentence.strip()
+        if len(stripped) > 40:
+            start = match.start() + (len(sentence) - len(sentence.lstrip()))
+            spans.append([start, start + len(stripped)])
+    return spans
+
+
+class BM25Index:
+    """Term -> postings inverted index with BM25 ranking and sentence offsets"""
+
+    def __init__(self, docs: List[Dict], postings: Dict[str, List[List[int]]], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+
+        # Everything query-independent is computed once at load time
+        doc_count = len(docs)
+        avg_length = sum(doc["length"] for doc in docs) / doc_count if doc_count else 0.0
+        self.idf = {
+            term: math.log(1 + (doc_count - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+        self.length_norm = [
+            k1 * (1 - b + b * doc["length"] / avg_length) if avg_length else k1
+            for doc in docs
+        ]
+        self.sentence_terms = [
+            [frozenset(tokenize(doc["text"][start:end])) for start, end in doc["sentences"]]
+            for doc in docs
+        ]
+
+    @classmethod
+    def build(cls, records: List[Dict]) -> "BM25Index":
+        """Build from records with 'text' plus source/category/authority metadata"""
+        docs = []
+        postings = {}
+
+        for doc_id, record in enumerate(records):
+            text = record["text"]
+            terms = tokenize(text)
+
+            frequencies = {}
+            for term in terms:
+                frequencies[term] = frequencies.get(term, 0) + 1
+            for term, tf in frequencies.items():
+                postings.setdefault(term, []).append([doc_id, tf])
+
+            docs.append({
+                "file": record.get("file", ""),
+                "source": record.get("source", "Unknown"),
+                "category": record.get("category", "Unknown"),
+                "authority": record.get("authority", "Unknown"),
+                "text": text,
+                "length": len(terms),
+                "sentences": sentence_spans(text),
+            })
+
+        return cls(docs, postings)
+
+    @classmethod
+    def from_chunks(cls, chunks) -> "BM25Index":
+        """Build from ingest.py chunks (LangChain documents)"""
+        return cls.build([
+            {
+                "file": f"medical_content_{i:03d}.txt",
+                "source": chunk.metadata.get("source", "Unknown"),
+                "category": chunk.metadata.get("category", "Unknown"),
+                "authority": chunk.metadata.get("authority_level", "Unknown"),
+                "text": chunk.page_content,
+            }
+            for i, chunk in enumerate(chunks)
+        ])
+
+    @classmethod
+    def from_directory(cls, directory: str = RAW_CONTENT_DIR) -> "BM25Index":
+        """Build from raw_medical_content files written by save_raw_medical_content"""
+        records = []
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".txt"):
+                continue
+            with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                content = f.read()
+
+            header, _, body = content.partition(HEADER_SEPARATOR + "\n")
+            if not body:
+                header, body = "", content
+
+            record = {"file": filename, "text": body}
+            for line in header.splitlines():
+                key, _, value = line.partition(": ")
+                if key in ("SOURCE", "CATEGORY", "AUTHORITY"):
+                    record[key.lower()] = value.strip()
+            records.append(record)
+
+        return cls.build(records)
+
+    def save(self, path: str = BM25_INDEX_PATH) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "docs": self.docs,
+                "postings": self.postings,
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = BM25_INDEX_PATH) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported BM25 index version {data.get('version')}")
+        return cls(data["docs"], data["postings"], data.get("k1", 1.5), data.get("b", 0.75))
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """Top-k (doc_id, BM25 score) pairs for a query"""
+        scores = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in plist:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.length_norm[doc_id])
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def best_sentences(self, doc_id: int, query: str, limit: int = 2) -> List[str]:
+        """The first `limit` sentences of a document that mention any query term"""
+        query_terms = set(tokenize(query))
+        doc = self.docs[doc_id]
+
+        sentences = []
+        for (start, end), terms in zip(doc["sentences"], self.sentence_terms[doc_id]):
+            if query_terms & terms:
+                sentences.append(doc["text"][start:end])
+                if len(sentences) >= limit:
+                    break
+        return sentences
+
+
+# Loaded once per process and reloaded when ingest writes a new index
+_bm25_index = None
+_bm25_mtime = None
+_bm25_last_check = 0.0
+_bm25_generation = 0  # bumped whenever a new index is installed
+_bm25_lock = threading.Lock()
+
+
+def get_bm25_index(path: str = BM25_INDEX_PATH, raw_dir: str = RAW_CONTENT_DIR) -> Optional[BM25Index]:
+    """Get the process-wide BM25 index, building it from raw files if none was saved"""
+    global _bm25_index, _bm25_mtime, _bm25_last_check, _bm25_generation
+
+    if _bm25_index is not None and time.time() - _bm25_last_check < RELOAD_CHECK_INTERVAL:
+        return _bm25_index
+
+    with _bm25_lock:
+        _bm25_last_check = time.time()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if mtime is not None and mtime != _bm25_mtime:
+            try:
+                start = time.perf_counter()
+                _bm25_index = BM25Index.load(path)
+                _bm25_mtime = mtime
+                _bm25_generation += 1
+                print(f"✅ BM25 index loaded: {len(_bm25_index.docs)} docs in {(time.perf_counter() - start) * 1000:.0f}ms")
+            except Exception as e:
+                print(f"⚠️ BM25 index load failed: {e}")
+
+        elif _bm25_index is None and os.path.isdir(raw_dir):
+            # Older ingests only wrote the raw files - index them once and save
+            try:
+                _bm25_index = BM25Index.from_directory(raw_dir)
+                _bm25_generation += 1
+                print(f"✅ BM25 index built from {raw_dir}: {len(_bm25_index.docs)} docs")
+                _bm25_index.save(path)
+                _bm25_mtime = os.stat(path).st_mtime_ns
+            except Exception as e:
+                print(f"⚠️ BM25 index build failed: {e}")
+
+        return _bm25_index
+
+
+def get_bm25_generation() -> int:
+    """Changes every time get_bm25_index installs a new index (for caches derived from it)"""
+    return _bm25_generation
@@ -0,0 +1,175 @@
+# src/graph/compact_index.py - QUANTIZED, MEMORY-MAPPED VECTOR INDEX FORMAT
+# SQ8 or IVF-PQ codes opened with faiss IO_FLAG_MMAP, plus an offset-indexed
+# text store that is paged in on demand - workers share the page cache instead
+# of each unpickling a full docstore.
+
+import os
+import json
+import mmap
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+INDEX_FORMATS = ("flat", "sq8", "ivfpq")
+INDEX_FORMAT = os.getenv("PETAL_INDEX_FORMAT", "flat")
+IVF_NPROBE = int(os.getenv("PETAL_IVF_NPROBE", "8"))
+# Full-precision vectors beside the codes - only IVF-PQ needs them to re-index without
+# re-embedding (SQ8 codes decode closely enough to be reused), and they cost more disk than the codes
+KEEP_FULL_VECTORS = os.getenv("PETAL_INDEX_KEEP_VECTORS", "0") == "1"
+
+# faiss wants ~39 training points per centroid; below this PQ codebooks are noise
+PQ_CODEBOOK_SIZE = 256
+MIN_TRAINING_POINTS_PER_CENTROID = 39
+
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "texts.offsets.npy"
+DOCS_FILE = "docs.json"
+
+
+def resolve_index_format(index_format: Optional[str] = None) -> str:
+    index_format = index_format or INDEX_FORMAT
+    if index_format not in INDEX_FORMATS:
+        raise ValueError(f"Unknown index format '{index_format}' - choose from {list(INDEX_FORMATS)}")
+    return index_format
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """Largest sub-vector count giving at least 8 dims per sub-quantizer (bigger m = better recall)"""
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0 and m <= 96:
+            return m
+    return 1
+
+
+def build_faiss_index(vectors: np.ndarray, index_format: str) -> Tuple[object, str]:
+    """Train and fill a quantized index; IVF-PQ falls back to SQ8 on small corpora"""
+    import faiss
+
+    count, dim = vectors.shape
+    if index_format == "ivfpq":
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // MIN_TRAINING_POINTS_PER_CENTROID))
+        if count >= max(PQ_CODEBOOK_SIZE, nlist) * MIN_TRAINING_POINTS_PER_CENTROID:
+            quantizer = faiss.IndexFlatL2(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), 8)
+            index.train(vectors)
+            index.add(vectors)
+            return index, "ivfpq"
+        print(f"⚠️ {count} vectors is too few to train IVF-PQ - using SQ8 instead")
+
+    index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    index.train(vectors)
+    index.add(vectors)
+    return index, "sq8"
+
+
+class TextStore:
+    """Chunk texts in one UTF-8 file, addressed by an int64 offset table"""
+
+    def __init__(self, path: str):
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self._file = open(os.path.join(path, TEXTS_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @staticmethod
+    def write(path: str, texts: List[str]) -> None:
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        with open(os.path.join(path, TEXTS_FILE), "wb") as f:
+            for i, text in enumerate(texts):
+                encoded = text.encode("utf-8")
+                f.write(encoded)
+                offsets[i + 1] = offsets[i] + len(encoded)
+        np.save(os.path.join(path, OFFSETS_FILE), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, i: int) -> str:
+        return self._data[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+
+class CompactVectorStore:
+    """Quantized FAISS index + mmapped text store with the LangChain search interface"""
+
+    def __init__(self, index, embeddings, ids: List[str], metadatas: List[Dict],
+                 texts=None, vectors: Optional[np.ndarray] = None, index_format: str = "sq8"):
+        self.index = index
+        self.embeddings = embeddings
+        self.ids = ids
+        self.metadatas = metadatas
+        self.texts = texts          # list while building, TextStore once loaded
+        self.vectors = vectors      # full-precision copy while building; on disk only with KEEP_FULL_VECTORS
+        self.index_format = index_format
+        if hasattr(index, "nprobe"):
+            index.nprobe = IVF_NPROBE
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray, texts: List[str], embeddings, metadatas: List[Dict],
+                     ids: List[str], index_format: str = "sq8") -> "CompactVectorStore":
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index, built_format = build_faiss_index(vectors, index_format)
+        return cls(index, embeddings, list(ids), list(metadatas), list(texts), vectors, built_format)
+
+    def save_local(self, path: str) -> None:
+        import faiss
+
+        os.makedirs(path, exist_ok=True)
+        faiss.write_index(self.index, os.path.join(path, INDEX_FILE))
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        if KEEP_FULL_VECTORS and self.vectors is not None:
+            np.save(vectors_path, np.asarray(self.vectors, dtype=np.float32))
+        elif os.path.exists(vectors_path):
+            os.remove(vectors_path)
+        TextStore.write(path, [self._text(i) for i in range(len(self.ids))])
+        with open(os.path.join(path, DOCS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"format": self.index_format, "ids": self.ids, "metadatas": self.metadatas}, f)
+
+    @classmethod
+    def load_local(cls, path: str, embeddings) -> "CompactVectorStore":
+        """Open an index without reading it: codes, texts (and kept vectors) are all memory-mapped"""
+        import faiss
+
+        try:
+            index = faiss.read_index(os.path.join(path, INDEX_FILE), faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            index = faiss.read_index(os.path.join(path, INDEX_FILE))
+        with open(os.path.join(path, DOCS_FILE), "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+        return cls(index, embeddings, docs["ids"], docs["metadatas"], TextStore(path), vectors, docs["format"])
+
+    def reusable_vectors(self) -> Optional[np.ndarray]:
+        """Vectors to rebuild from without re-embedding: the kept full-precision copy, or
+        decoded SQ8 codes. None for IVF-PQ without a kept copy (its codes are too lossy)"""
+        if self.vectors is not None:
+            return np.asarray(self.vectors, dtype=np.float32)
+        if self.index_format == "sq8":
+            return self.index.reconstruct_n(0, self.index.ntotal)
+        return None
+
+    def _text(self, i: int) -> str:
+        return self.texts.get(i) if isinstance(self.texts, TextStore) else self.texts[i]
+
+    def _document(self, i: int) -> Document:
+        return Document(id=self.ids[i], page_content=self._text(i), metadata=dict(self.metadatas[i]))
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        query_vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+        distances, positions = self.index.search(query_vector, k)
+        return [
+            (self._document(int(i)), float(distance))
+            for distance, i in zip(distances[0], positions[0])
+            if i >= 0
+        ]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def documents(self) -> Iterator[Document]:
+        for i in range(len(self.ids)):
+            yield self._document(i)
@@ -0,0 +1,114 @@
+# src/graph/embed_pipeline.py - STREAMING, BATCHED EMBEDDING STAGE FOR INGEST
+# Consumes texts lazily, packs them into token-bounded batches, keeps a fixed
+# number of batches in flight, retries rate-limited calls with backoff, and
+# writes vectors straight into one float32 matrix.
+
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.tokens import count_tokens
+
+EMBED_BATCH_TOKENS = int(os.getenv("PETAL_EMBED_BATCH_TOKENS", "8000"))
+EMBED_BATCH_MAX_ITEMS = 256
+EMBED_MAX_IN_FLIGHT = int(os.getenv("PETAL_EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_MAX_RETRIES = 6
+
+
+def token_batches(texts: Iterable[str], max_tokens: int = EMBED_BATCH_TOKENS,
+                  max_items: int = EMBED_BATCH_MAX_ITEMS) -> Iterator[Tuple[List[str], int]]:
+    """Group a text stream into (batch, token count) under a token budget (an oversized text goes alone)"""
+    batch, batch_tokens = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            yield batch, batch_tokens
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        yield batch, batch_tokens
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError" or "429" in str(error)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _embed_with_retry(embeddings, batch: List[str], max_retries: int, stats: Dict, stats_lock) -> List[List[float]]:
+    delay = 1.0
+    for attempt in range(max_retries + 1):
+        try:
+            return embeddings.embed_documents(batch)
+        except Exception as e:
+            if attempt == max_retries or not _is_rate_limited(e):
+                raise
+            # Full jitter so parallel batches don't retry in lockstep
+            wait_for = _retry_after(e) or random.uniform(0, delay)
+            with stats_lock:
+                stats["retries"] += 1
+            print(f"   ⏳ Rate limited - retrying batch of {len(batch)} in {wait_for:.1f}s")
+            time.sleep(wait_for)
+            delay = min(delay * 2, 60.0)
+
+
+def embed_stream(texts: Iterable[str], embeddings, expected: int = 0,
+                 max_batch_tokens: int = EMBED_BATCH_TOKENS,
+                 max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+                 max_retries: int = EMBED_MAX_RETRIES) -> Tuple[np.ndarray, Dict]:
+    """Embed a text stream into an (n, dim) float32 matrix, row i being text i.
+
+    `expected` preallocates the matrix; it grows by doubling if the stream is longer.
+    Returns (vectors, stats) with batch, retry and token counts.
+    """
+    stats = {"batches": 0, "retries": 0, "tokens": 0, "texts": 0}
+    stats_lock = threading.Lock()
+    matrix = None
+
+    def store(offset: int, vectors: List[List[float]]) -> None:
+        nonlocal matrix
+        block = np.asarray(vectors, dtype=np.float32)
+        needed = offset + len(block)
+        if matrix is None:
+            matrix = np.empty((max(expected, needed), block.shape[1]), dtype=np.float32)
+        elif needed > len(matrix):
+            grown = np.empty((max(needed, len(matrix) * 2), matrix.shape[1]), dtype=np.float32)
+            grown[:len(matrix)] = matrix
+            matrix = grown
+        matrix[offset:needed] = block
+
+    offset = 0
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="petal-embed") as pool:
+        for batch, batch_tokens in token_batches(texts, max_batch_tokens):
+            # Backpressure: stop pulling from the stream until a slot frees up
+            while len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    store(in_flight.pop(future), future.result())
+
+            in_flight[pool.submit(_embed_with_retry, embeddings, batch, max_retries, stats, stats_lock)] = offset
+            offset += len(batch)
+            stats["batches"] += 1
+            stats["tokens"] += batch_tokens
+
+        for future in list(in_flight):
+            store(in_flight.pop(future), future.result())
+
+    stats["texts"] = offset
+    if matrix is None:
+        return np.empty((0, 0), dtype=np.float32), stats
+    return matrix[:offset], stats
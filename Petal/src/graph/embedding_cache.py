@@ -0,0 +1,241 @@
+# src/graph/embedding_cache.py - QUERY EMBEDDING CACHE
+# LRU cache of query vectors keyed by normalized text, bounded by memory and
+# optionally backed by a memory-mapped file so it survives restarts.
+
+import os
+import re
+import json
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_MB = float(os.getenv("PETAL_EMBEDDING_CACHE_MB", "8"))
+EMBEDDING_CACHE_PATH = os.getenv("PETAL_EMBEDDING_CACHE_PATH", "src/data/embedding_cache")
+SAVE_EVERY = 32  # Persist the key index after this many new entries
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.json"
+
+
+def normalize_query(text: str) -> str:
+    """Normalize query text so trivially different phrasings share a cache entry"""
+    text = text.lower().strip()
+    text = re.sub(r"[^\w\s']", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class QueryEmbeddingCache:
+    """Memory-bounded LRU cache of query embeddings"""
+
+    def __init__(self, max_bytes: int, persist_path: Optional[str] = None, namespace: str = "default"):
+        self.max_bytes = max_bytes
+        self.persist_path = persist_path
+        self.namespace = namespace
+
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()  # key -> row in self._vectors, least recently used first
+        self._free = []
+        self._vectors = None
+        self._dim = None
+        self._capacity = 0
+        self._unsaved = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if persist_path:
+            self._load()
+            atexit.register(self.flush)
+
+    def _allocate(self, dim: int) -> None:
+        """Create vector storage once the embedding dimension is known"""
+        self._dim = dim
+        self._capacity = max(1, self.max_bytes // (dim * 4))
+
+        if self.persist_path:
+            os.makedirs(self.persist_path, exist_ok=True)
+            self._vectors = np.memmap(
+                os.path.join(self.persist_path, VECTORS_FILE),
+                dtype=np.float32, mode="w+", shape=(self._capacity, dim)
+            )
+        else:
+            self._vectors = np.zeros((self._capacity, dim), dtype=np.float32)
+
+        self._free = list(range(self._capacity - 1, -1, -1))
+
+    def _load(self) -> None:
+        """Reopen a persisted cache, discarding it if it was built for another model"""
+        index_path = os.path.join(self.persist_path, INDEX_FILE)
+        vectors_path = os.path.join(self.persist_path, VECTORS_FILE)
+        if not (os.path.exists(index_path) and os.path.exists(vectors_path)):
+            return
+
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+
+            if index.get("namespace") != self.namespace:
+                print(f"🔄 Embedding cache built for {index.get('namespace')} - starting fresh")
+                return
+
+            dim, capacity = index["dim"], index["capacity"]
+            if capacity * dim * 4 != os.path.getsize(vectors_path):
+                print("⚠️ Embedding cache file size mismatch - starting fresh")
+                return
+
+            self._dim = dim
+            self._capacity = capacity
+            self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+            slots = [(key, slot) for key, slot in index["slots"] if 0 <= slot < capacity]
+
+            limit = max(1, self.max_bytes // (dim * 4))
+            if limit != capacity:
+                slots = self._resize(limit, slots)
+
+            self._slots.update(slots)
+            used = set(self._slots.values())
+            self._free = [slot for slot in range(self._capacity - 1, -1, -1) if slot not in used]
+            if limit != capacity:
+                self.flush()  # the index on disk still describes the old layout
+
+            print(f"✅ Embedding cache restored: {len(self._slots)} queries")
+
+        except Exception as e:
+            print(f"⚠️ Embedding cache restore failed: {e}")
+            self._slots.clear()
+            self._vectors = None
+            self._dim = None
+
+    def _resize(self, capacity: int, slots: List[tuple]) -> List[tuple]:
+        """Rewrite the vector file for a changed byte budget, keeping the most recently
+        used entries that fit; returns their (key, slot) pairs, least recently used first"""
+        kept = slots[-capacity:]
+        rows = np.array(self._vectors[[slot for _, slot in kept]]) if kept else None
+        self._vectors.flush()
+        self._vectors = None  # release the old mapping before the file is recreated
+
+        self._capacity = capacity
+        self._vectors = np.memmap(os.path.join(self.persist_path, VECTORS_FILE),
+                                  dtype=np.float32, mode="w+", shape=(capacity, self._dim))
+        if rows is not None:
+            self._vectors[:len(kept)] = rows
+        print(f"🔄 Embedding cache resized to {capacity} entries ({len(slots) - len(kept)} dropped)")
+        return [(key, row) for row, (key, _) in enumerate(kept)]
+
+    def flush(self) -> None:
+        """Write the key index (and dirty vector pages) to disk"""
+        if not self.persist_path or self._vectors is None:
+            return
+
+        with self._lock:
+            try:
+                self._vectors.flush()
+                index = {
+                    "namespace": self.namespace,
+                    "dim": self._dim,
+                    "capacity": self._capacity,
+                    "slots": list(self._slots.items()),
+                }
+                tmp_path = os.path.join(self.persist_path, INDEX_FILE + ".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, os.path.join(self.persist_path, INDEX_FILE))
+                self._unsaved = 0
+            except Exception as e:
+                print(f"⚠️ Embedding cache save failed: {e}")
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = normalize_query(text)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            self._slots.move_to_end(key)
+            self.hits += 1
+            return self._vectors[slot].tolist()
+
+    def put(self, text: str, vector: List[float]) -> None:
+        key = normalize_query(text)
+        with self._lock:
+            if self._vectors is None:
+                self._allocate(len(vector))
+            elif len(vector) != self._dim:
+                return
+
+            slot = self._slots.get(key)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    _, slot = self._slots.popitem(last=False)
+                    self.evictions += 1
+                self._unsaved += 1
+
+            self._vectors[slot] = vector
+            self._slots[key] = slot
+            self._slots.move_to_end(key)
+            should_save = self._unsaved >= SAVE_EVERY
+
+        if should_save:
+            self.flush()
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "capacity": self._capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "persistent": bool(self.persist_path),
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated queries from a QueryEmbeddingCache"""
+
+    def __init__(self, embeddings: Embeddings, cache: QueryEmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(text, vector)
+        return vector
+
+
+# One cache per embedding model per process
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_query_embedding_cache(namespace: str) -> QueryEmbeddingCache:
+    """Get the process-wide query embedding cache for an embedding model"""
+    with _caches_lock:
+        if namespace not in _caches:
+            persist_path = None
+            if EMBEDDING_CACHE_PATH:
+                persist_path = os.path.join(EMBEDDING_CACHE_PATH, re.sub(r"[^\w.-]", "_", namespace))
+            _caches[namespace] = QueryEmbeddingCache(
+                max_bytes=int(EMBEDDING_CACHE_MB * 1024 * 1024),
+                persist_path=persist_path,
+                namespace=namespace
+            )
+        return _caches[namespace]
+
+
+def get_embedding_cache_stats() -> Dict:
+    """Hit/miss counters for every query embedding cache in this process"""
+    return {namespace: cache.get_stats() for namespace, cache in _caches.items()}
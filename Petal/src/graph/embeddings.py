@@ -0,0 +1,129 @@
+# src/graph/embeddings.py - PLUGGABLE EMBEDDING PROVIDERS
+# OpenAI embeddings when a key is available, plus an offline CPU-only
+# hashed n-gram embedder so the RAG path runs (and is testable) without network.
+
+import os
+import re
+import zlib
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "openai", "local", or "auto" (OpenAI when OPENAI_API_KEY is set, local otherwise)
+EMBEDDING_PROVIDER = os.getenv("PETAL_EMBEDDINGS", "auto")
+LOCAL_EMBEDDING_DIM = 768
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+@lru_cache(maxsize=65536)
+def _hash_feature(feature: str, dim: int):
+    """Map a feature string to a (bucket, sign) pair"""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+class LocalHashingEmbeddings(Embeddings):
+    """Offline embeddings from signed feature hashing of word and character n-grams"""
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM, char_ngrams=(3, 4, 5)):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+
+    @property
+    def model(self) -> str:
+        return f"hash-{self.dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_PATTERN.findall(text.lower())
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+
+        # Character n-grams make "cramp"/"cramps"/"cramping" land close together
+        for word in words:
+            padded = f"<{word}>"
+            for n in self.char_ngrams:
+                features += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+        return features
+
+    def _embed(self, text: str) -> np.ndarray:
+        counts = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in counts.items():
+            bucket, sign = _hash_feature(feature, self.dim)
+            vector[bucket] += sign * (1.0 + np.log(count))  # Sublinear term frequency
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+
+def _openai_embeddings(model: Optional[str] = None) -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY not set - cannot use OpenAI embeddings")
+    if model:
+        return OpenAIEmbeddings(openai_api_key=api_key, model=model)
+    return OpenAIEmbeddings(openai_api_key=api_key)
+
+
+def _local_embeddings(model: Optional[str] = None) -> Embeddings:
+    dim = int(model.split("-")[-1]) if model else LOCAL_EMBEDDING_DIM
+    return LocalHashingEmbeddings(dim=dim)
+
+
+# name -> (factory(model) -> Embeddings, is_remote)
+EMBEDDING_PROVIDERS: Dict[str, tuple] = {
+    "openai": (_openai_embeddings, True),
+    "local": (_local_embeddings, False),
+}
+
+
+def register_embedding_provider(name: str, factory: Callable[[Optional[str]], Embeddings], is_remote: bool = True) -> None:
+    """Register an additional embedding backend"""
+    EMBEDDING_PROVIDERS[name] = (factory, is_remote)
+
+
+def resolve_provider(provider: Optional[str] = None) -> str:
+    """Turn "auto"/None into a concrete provider name"""
+    provider = provider or EMBEDDING_PROVIDER
+    if provider == "auto":
+        return "openai" if os.getenv("OPENAI_API_KEY") else "local"
+    if provider not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider '{provider}' - choose from {list(EMBEDDING_PROVIDERS)}")
+    return provider
+
+
+def is_remote_provider(provider: str) -> bool:
+    return EMBEDDING_PROVIDERS[resolve_provider(provider)][1]
+
+
+def create_embeddings(provider: Optional[str] = None, model: Optional[str] = None) -> Embeddings:
+    """Create embeddings for a provider name ("openai", "local", "auto")"""
+    factory, _ = EMBEDDING_PROVIDERS[resolve_provider(provider)]
+    return factory(model)
+
+
+def describe_embeddings(provider: str, embeddings: Embeddings) -> Dict[str, str]:
+    """Index marker fields that let a retriever recreate matching embeddings"""
+    return {
+        "embedding_provider": resolve_provider(provider),
+        "embedding_model": str(getattr(embeddings, "model", "") or ""),
+    }
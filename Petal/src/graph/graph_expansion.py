@@ -0,0 +1,127 @@
+# src/graph/graph_expansion.py - KNOWLEDGE-GRAPH EXPANSION FOR RETRIEVAL
+# Classifies a query onto graph_config topics, expands 1-2 hops through the
+# topic graph, and boosts retrieved chunks whose topic falls in that neighborhood.
+
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+
+from src.graph.graph_config import graph, QUESTION_CATEGORIES
+
+MAX_HOPS = 2
+HOP_WEIGHTS = {0: 1.0, 1: 0.5, 2: 0.25}
+GRAPH_BOOST = 0.5  # Fused score multiplier is (1 + GRAPH_BOOST * topic weight)
+
+# ingest.py tags every chunk with one of these categories; map them to their topic node
+CATEGORY_TO_NODE = {
+    "pain_management": "cramps",
+    "urgent_medical": "heavy_bleeding",
+    "mental_health": "emotional",
+    "adolescent_health": "first_period",
+    "cycle_disorders": "irregularities",
+    "contraception": "birth_control",
+    "social_health": "cultural",
+    "general_health": "period_basics",
+}
+
+
+def chunk_topic(metadata: Dict) -> Optional[str]:
+    """Topic node of a chunk from its ingest metadata"""
+    return metadata.get("node") or CATEGORY_TO_NODE.get(metadata.get("category"))
+
+
+class TopicGraph:
+    """Precompiled topic classifier, hop neighborhoods and topic -> chunk index"""
+
+    def __init__(self, adjacency: Dict[str, List[str]] = graph,
+                 categories: Dict[str, List[str]] = QUESTION_CATEGORIES, max_hops: int = MAX_HOPS):
+        # Relatedness runs both ways ("heavy_bleeding" -> "urgent" also makes urgent queries reach heavy bleeding)
+        self.nx_graph = nx.Graph()
+        for node, neighbors in adjacency.items():
+            self.nx_graph.add_node(node)
+            for neighbor in neighbors:
+                self.nx_graph.add_edge(node, neighbor)
+        for node in categories:
+            self.nx_graph.add_node(node)
+
+        self.neighborhoods = {
+            node: nx.single_source_shortest_path_length(self.nx_graph, node, cutoff=max_hops)
+            for node in self.nx_graph.nodes
+        }
+
+        # Keyword automaton: one alternation over every category phrase, longest first
+        self.phrase_topics = {}
+        for topic, phrases in categories.items():
+            for phrase in phrases:
+                self.phrase_topics.setdefault(phrase.lower(), []).append(topic)
+        alternation = "|".join(re.escape(p) for p in sorted(self.phrase_topics, key=len, reverse=True))
+        self.pattern = re.compile(rf"\b(?:{alternation})\b")
+
+        self._chunk_lock = threading.Lock()
+        self._chunk_signature = None
+        self.topic_chunks = {}  # topic -> set of chunk keys
+        self.chunk_topics = {}  # chunk key -> topic
+
+    def classify(self, query: str) -> Dict[str, int]:
+        """Topic nodes mentioned by the query, with hit counts"""
+        topics = {}
+        for match in self.pattern.finditer(query.lower()):
+            for topic in self.phrase_topics[match.group()]:
+                topics[topic] = topics.get(topic, 0) + 1
+        return topics
+
+    def expand(self, topics: Iterable[str]) -> Dict[str, float]:
+        """Weight every node within MAX_HOPS of the seed topics (closest seed wins)"""
+        weights = {}
+        for topic in topics:
+            for node, hops in self.neighborhoods.get(topic, {}).items():
+                weight = HOP_WEIGHTS.get(hops, 0.0)
+                if weight > weights.get(node, 0.0):
+                    weights[node] = weight
+        return weights
+
+    def topic_weights(self, query: str) -> Dict[str, float]:
+        return self.expand(self.classify(query))
+
+    def refresh_chunk_index(self, signature, records: Callable[[], Iterable[Tuple[str, Dict]]]) -> None:
+        """Rebuild the topic -> chunk index when the underlying indexes change"""
+        if signature == self._chunk_signature:
+            return
+
+        with self._chunk_lock:
+            if signature == self._chunk_signature:
+                return
+
+            topic_chunks, chunk_topics = {}, {}
+            for key, metadata in records():
+                topic = chunk_topic(metadata)
+                if topic and key not in chunk_topics:
+                    chunk_topics[key] = topic
+                    topic_chunks.setdefault(topic, set()).add(key)
+
+            self.topic_chunks, self.chunk_topics = topic_chunks, chunk_topics
+            self._chunk_signature = signature
+            print(f"🕸️ Topic index built: {len(chunk_topics)} chunks across {len(topic_chunks)} topics")
+
+    def chunks_for(self, weights: Dict[str, float]) -> Set[str]:
+        """Chunk keys belonging to any expanded topic"""
+        keys = set()
+        for topic in weights:
+            keys |= self.topic_chunks.get(topic, set())
+        return keys
+
+
+_topic_graph = None
+_topic_graph_lock = threading.Lock()
+
+
+def get_topic_graph() -> TopicGraph:
+    """Get the process-wide topic graph (compiled once)"""
+    global _topic_graph
+    if _topic_graph is None:
+        with _topic_graph_lock:
+            if _topic_graph is None:
+                _topic_graph = TopicGraph()
+    return _topic_graph
@@ -166,11 +166,15 @@ import pickle
 import re
 import sys
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, AsyncIterator, Union
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 import time
+import hashlib
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Add path for imports
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -179,16 +183,31 @@ sys.path.insert(0, parent_dir)
 
 # Try to import OpenAI and other dependencies
 try:
-    from openai import OpenAI
     from dotenv import load_dotenv
     load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    openai_client = OpenAI(api_key=api_key) if api_key else None
+    from src.utils.openai_client import get_openai_client, get_async_openai_client
+    openai_client = get_openai_client()
+    async_openai_client = get_async_openai_client()
     print(f"✅ OpenAI client: {'Available' if openai_client else 'Not available'}")
 except:
     openai_client = None
+    async_openai_client = None
     print(f"❌ OpenAI import failed")
 
+from src.graph.topic_classifier import get_topic_classifier, is_referential, verdict_line, VERDICT_LOG_FILE
+from src.graph.response_cache import get_response_cache, UNCACHEABLE_EMOTIONS
+from src.graph.prompt_builder import build_generation_prompt, format_breakdown, join_chunks
+from src.utils.single_flight import get_single_flight, request_key
+from src.utils.rate_limiter import get_rate_limiter, estimate_tokens
+from src.core.conversation_store import append_turn_later
+from src.core.conversation_context import conversation_context
+from src.core.user_memory import update_context
+from src.core.episodic_memory import recalled_context
+
+# Identical concurrent completions (same prompt from several sessions) share one API call
+llm_flights = get_single_flight("llm")
+llm_limiter = get_rate_limiter()
+
 # Try to import crisis detector
 try:
     from src.utils.crisis_detector import is_crisis_message, get_comprehensive_crisis_response
@@ -288,8 +307,106 @@ def log_injection_attempt(text, pattern, detection_method):
     except:
         print(f"🚨 SECURITY: Injection attempt detected - {pattern}")
 
-def is_menstrual_related(query: str) -> bool:
-    """Uses the comprehensive menstrual terms list + AI context understanding"""
+# COMPREHENSIVE MENSTRUAL VOCABULARY - ALL TERMS
+MENSTRUAL_TERMS = [
+    # Core period terms
+    "period", "periods", "menstrual", "menstruation", "menses", "cycle", "cycles",
+    "monthly", "time of month", "that time", "monthly cycle", "feminine cycle",
+    
+    # Bleeding & flow terms
+    "bleed", "bleeding", "bled", "blood", "bloody", "flow", "flowing",
+    "spotting", "spot", "discharge", "red", "brown", "clots", "clotting",
+    "heavy", "light", "moderate", "flooding", "gushing", "trickling",
+    "soaked", "soaking", "dripping", "streaming",
+    
+    # Stains & accidents
+    "stain", "stains", "stained", "leak", "leaked", "leaking", "mess",
+    "accident", "spill", "spilled", "through", "all over", "everywhere",
+    "ruined", "destroyed", "damaged", "wet", "damp", "moisture",
+    
+    # Clothing & items
+    "pants", "jeans", "skirt", "dress", "shorts", "leggings", "tights",
+    "underwear", "panties", "bra", "clothes", "clothing", "fabric",
+    "white", "light colored", "bed", "sheets", "mattress", "pillow",
+    "chair", "seat", "car seat", "couch", "sofa",
+    
+    # Pain & physical symptoms
+    "cramp", "cramps", "cramping", "pain", "painful", "hurt", "hurts",
+    "hurting", "ache", "aches", "aching", "sore", "tender", "sensitive",
+    "throbbing", "stabbing", "sharp", "dull", "constant", "severe",
+    "unbearable", "excruciating", "punch", "kick", "twist", "squeeze",
+    
+    # Emotional & psychological (only period-specific)
+    "pms", "pmdd", "premenstrual", "period mood", "period emotions",
+    "period depression", "period anxiety", "hate periods", "love periods",
+    "hate being woman", "hate being women", "hate being female",
+    
+    # Physical symptoms & discomfort
+    "bloated", "bloating", "swollen", "puffy", "tight", "full", "heavy feeling",
+    "nausea", "nauseous", "sick", "queasy", "dizzy", "lightheaded",
+    "tired", "exhausted", "fatigue", "weak", "drained", "sleepy",
+    "headache", "migraine", "backache", "back pain", "leg pain",
+    "breast", "boobs", "chest", "nipples", "tender breasts",
+    
+    # Products & management
+    "pad", "pads", "sanitary pad", "tampon", "tampons", "applicator",
+    "cup", "menstrual cup", "diva cup", "liner", "liners", "panty liner",
+    "sanitary", "feminine", "hygiene", "protection", "absorb", "absorption",
+    "wings", "overnight", "super", "regular", "light", "heavy duty",
+    
+    # Anatomy & medical
+    "vagina", "vaginal", "vulva", "labia", "cervix", "uterus", "womb",
+    "ovaries", "ovary", "fallopian", "pelvis", "pelvic", "reproductive",
+    "down there", "private parts", "lady parts", "intimate area",
+    
+    # Cycle characteristics & timing
+    "irregular", "regular", "normal", "abnormal", "unusual", "different",
+    "changed", "pattern", "schedule", "timing", "frequency", "duration",
+    "late", "early", "missed", "skipped", "delayed", "overdue",
+    
+    # Medical conditions
+    "pcos", "endometriosis", "fibroids", "cysts", "polyps", "adenomyosis",
+    "dysmenorrhea", "amenorrhea", "menorrhagia", "oligomenorrhea",
+    "anemia", "iron deficiency", "hormonal imbalance", "hormone",
+    "estrogen", "progesterone",
+    
+    # Activities & lifestyle (period-specific)
+    "swimming during period", "exercise during period", "period exercise",
+    "period swimming", "gym during period", "yoga during period",
+    
+    # Food & nutrition (period-specific)
+    "chocolate", "sweet", "sweets", "sugar", "candy", "dessert", "ice cream",
+    "crave", "craving", "appetite", "hungry", "spicy", "salty",
+    
+    # Cultural & social (period-specific)
+    "temple", "religious", "cultural", "period restriction", "period taboo",
+    
+    # Medical care & professionals (period-specific)
+    "gynecologist", "obgyn", "period doctor", "menstrual health doctor",
+    
+    # First period & development
+    "first period", "menarche", "teen period", "puberty menstruation"
+]
+
+# Obvious non-menstrual messages (prevents false positives)
+NON_MENSTRUAL_EXCLUSIONS = [
+    "hate my sister", "hate my brother", "hate my mom", "hate my dad",
+    "hate my family", "hate my friend", "hate my job", "hate work",
+    "hate school", "hate my teacher", "hate my boss", "hate people",
+    "first date", "dating", "relationship problems", "breakup"
+]
+
+def _keyword_label(query: str) -> Optional[bool]:
+    """Vocabulary match -> True, exclusion match -> False, otherwise None"""
+    query_lower = query.lower()
+    if any(term in query_lower for term in MENSTRUAL_TERMS):
+        return True
+    if any(exclusion in query_lower for exclusion in NON_MENSTRUAL_EXCLUSIONS):
+        return False
+    return None
+
+def _keyword_topic_decision(query: str) -> Optional[bool]:
+    """Decide from the menstrual vocabulary, exclusions and local classifier (None = needs context)"""
     
     if not query or len(query.strip()) < 2:
         return False
@@ -299,114 +416,20 @@ def is_menstrual_related(query: str) -> bool:
         print(f"🆘 Crisis message - excluding from menstrual detection")
         return False
     
-    query_lower = query.lower()
-    
-    # COMPREHENSIVE MENSTRUAL VOCABULARY - ALL TERMS
-    comprehensive_menstrual_terms = [
-        # Core period terms
-        "period", "periods", "menstrual", "menstruation", "menses", "cycle", "cycles",
-        "monthly", "time of month", "that time", "monthly cycle", "feminine cycle",
-        
-        # Bleeding & flow terms
-        "bleed", "bleeding", "bled", "blood", "bloody", "flow", "flowing",
-        "spotting", "spot", "discharge", "red", "brown", "clots", "clotting",
-        "heavy", "light", "moderate", "flooding", "gushing", "trickling",
-        "soaked", "soaking", "dripping", "streaming",
-        
-        # Stains & accidents
-        "stain", "stains", "stained", "leak", "leaked", "leaking", "mess",
-        "accident", "spill", "spilled", "through", "all over", "everywhere",
-        "ruined", "destroyed", "damaged", "wet", "damp", "moisture",
-        
-        # Clothing & items
-        "pants", "jeans", "skirt", "dress", "shorts", "leggings", "tights",
-        "underwear", "panties", "bra", "clothes", "clothing", "fabric",
-        "white", "light colored", "bed", "sheets", "mattress", "pillow",
-        "chair", "seat", "car seat", "couch", "sofa",
-        
-        # Pain & physical symptoms
-        "cramp", "cramps", "cramping", "pain", "painful", "hurt", "hurts",
-        "hurting", "ache", "aches", "aching", "sore", "tender", "sensitive",
-        "throbbing", "stabbing", "sharp", "dull", "constant", "severe",
-        "unbearable", "excruciating", "punch", "kick", "twist", "squeeze",
-        
-        # Emotional & psychological (only period-specific)
-        "pms", "pmdd", "premenstrual", "period mood", "period emotions",
-        "period depression", "period anxiety", "hate periods", "love periods",
-        "hate being woman", "hate being women", "hate being female",
-        
-        # Physical symptoms & discomfort
-        "bloated", "bloating", "swollen", "puffy", "tight", "full", "heavy feeling",
-        "nausea", "nauseous", "sick", "queasy", "dizzy", "lightheaded",
-        "tired", "exhausted", "fatigue", "weak", "drained", "sleepy",
-        "headache", "migraine", "backache", "back pain", "leg pain",
-        "breast", "boobs", "chest", "nipples", "tender breasts",
-        
-        # Products & management
-        "pad", "pads", "sanitary pad", "tampon", "tampons", "applicator",
-        "cup", "menstrual cup", "diva cup", "liner", "liners", "panty liner",
-        "sanitary", "feminine", "hygiene", "protection", "absorb", "absorption",
-        "wings", "overnight", "super", "regular", "light", "heavy duty",
-        
-        # Anatomy & medical
-        "vagina", "vaginal", "vulva", "labia", "cervix", "uterus", "womb",
-        "ovaries", "ovary", "fallopian", "pelvis", "pelvic", "reproductive",
-        "down there", "private parts", "lady parts", "intimate area",
-        
-        # Cycle characteristics & timing
-        "irregular", "regular", "normal", "abnormal", "unusual", "different",
-        "changed", "pattern", "schedule", "timing", "frequency", "duration",
-        "late", "early", "missed", "skipped", "delayed", "overdue",
-        
-        # Medical conditions
-        "pcos", "endometriosis", "fibroids", "cysts", "polyps", "adenomyosis",
-        "dysmenorrhea", "amenorrhea", "menorrhagia", "oligomenorrhea",
-        "anemia", "iron deficiency", "hormonal imbalance", "hormone",
-        "estrogen", "progesterone",
-        
-        # Activities & lifestyle (period-specific)
-        "swimming during period", "exercise during period", "period exercise",
-        "period swimming", "gym during period", "yoga during period",
-        
-        # Food & nutrition (period-specific)
-        "chocolate", "sweet", "sweets", "sugar", "candy", "dessert", "ice cream",
-        "crave", "craving", "appetite", "hungry", "spicy", "salty",
-        
-        # Cultural & social (period-specific)
-        "temple", "religious", "cultural", "period restriction", "period taboo",
-        
-        # Medical care & professionals (period-specific)
-        "gynecologist", "obgyn", "period doctor", "menstrual health doctor",
-        
-        # First period & development
-        "first period", "menarche", "teen period", "puberty menstruation"
-    ]
-    
-    # Check comprehensive menstrual terms
-    if any(term in query_lower for term in comprehensive_menstrual_terms):
+    label = _keyword_label(query)
+    if label is True:
         print(f"✅ Comprehensive menstrual term detected")
         return True
-    
-    # Exclude obvious non-menstrual (to prevent false positives)
-    non_menstrual_exclusions = [
-        "hate my sister", "hate my brother", "hate my mom", "hate my dad",
-        "hate my family", "hate my friend", "hate my job", "hate work",
-        "hate school", "hate my teacher", "hate my boss", "hate people",
-        "first date", "dating", "relationship problems", "breakup"
-    ]
-    
-    if any(exclusion in query_lower for exclusion in non_menstrual_exclusions):
+    if label is False:
         print(f"🚫 Non-menstrual exclusion detected")
         return False
     
-    # AI context analysis for follow-ups
-    context = get_conversation_context("user_001")
-    
-    if context and openai_client:
-        try:
-            print(f"🤖 AI analyzing with context...")
-            
-            ai_prompt = f"""Previous conversation:
+    # Local classifier settles confident cases without an API call
+    return get_topic_classifier(MENSTRUAL_TERMS, NON_MENSTRUAL_EXCLUSIONS).decide(query)
+
+def _followup_messages(query: str, context: str) -> List[Dict]:
+    """Prompt asking the model whether a message continues the health conversation"""
+    ai_prompt = f"""Previous conversation:
 {context}
 
 Current message: "{query}"
@@ -419,28 +442,44 @@ Important:
 - "chocolate help?" after cramps = health follow-up (remedy seeking)
 
 Answer: HEALTH_FOLLOWUP or NOT_FOLLOWUP"""
+    
+    return [
+        {"role": "system", "content": "Analyze if current message is health follow-up. Be precise."},
+        {"role": "user", "content": ai_prompt}
+    ]
 
-            response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Analyze if current message is health follow-up. Be precise."},
-                    {"role": "user", "content": ai_prompt}
-                ],
-                temperature=0.1,
-                max_tokens=10
-            )
-            
-            ai_result = response.choices[0].message.content.strip().upper()
-            print(f"🤖 AI result: {ai_result}")
-            
-            if "HEALTH_FOLLOWUP" in ai_result:
-                print(f"✅ AI: Health follow-up")
-                return True
-                
-        except Exception as e:
-            print(f"AI failed: {e}")
+# The topic gate blocks the whole turn, so it gives up sooner than generation does
+GATE_TIMEOUT = float(os.getenv("PETAL_GATE_TIMEOUT", "8"))
+
+def _followup_request(query: str, context: str) -> Dict:
+    return dict(
+        model="gpt-3.5-turbo",
+        messages=_followup_messages(query, context),
+        temperature=0.1,
+        max_tokens=10,
+        timeout=GATE_TIMEOUT
+    )
+
+def _record_gate_verdict(query: str, is_health: bool) -> None:
+    """Log the LLM's verdict on an escalated message - the local classifier trains on these"""
+    try:
+        log_event(VERDICT_LOG_FILE, verdict_line(query, is_health))
+    except Exception as e:
+        print(f"⚠️ Could not record topic verdict: {e}")
+
+def _is_health_followup(ai_result: str) -> bool:
+    ai_result = ai_result.strip().upper()
+    print(f"🤖 AI result: {ai_result}")
+    
+    if "HEALTH_FOLLOWUP" in ai_result:
+        print(f"✅ AI: Health follow-up")
+        return True
+    return False
+
+def _referential_followup(query: str, context: str) -> bool:
+    """Simple referential fallback with context"""
+    query_lower = query.lower()
     
-    # Simple referential fallback with context
     if context:
         refs = ["it", "this", "that", "help", "what", "how"]
         is_short = len(query.split()) <= 6
@@ -453,6 +492,31 @@ Answer: HEALTH_FOLLOWUP or NOT_FOLLOWUP"""
     print(f"🚫 Not menstrual-related")
     return False
 
+def is_menstrual_related(query: str, user_id: str = "user_001") -> bool:
+    """Uses the comprehensive menstrual terms list + AI context understanding"""
+    
+    decision = _keyword_topic_decision(query)
+    if decision is not None:
+        return decision
+    
+    # AI context analysis for follow-ups - the asking user's own conversation
+    return _contextual_topic_decision(query, get_conversation_context(user_id))
+
+def _contextual_topic_decision(query: str, context: str) -> bool:
+    """Topic gate for messages the keyword/local checks couldn't settle"""
+    if context and openai_client:
+        try:
+            print(f"🤖 AI analyzing with context...")
+            is_health = _is_health_followup(_complete(_followup_request(query, context)))
+            _record_gate_verdict(query, is_health)
+            if is_health:
+                return True
+                
+        except Exception as e:
+            print(f"AI failed: {e}")
+    
+    return _referential_followup(query, context)
+
 def detect_emotion(text):
     """Enhanced emotion detection"""
     text = text.lower()
@@ -488,6 +552,7 @@ def detect_emotion(text):
 
 def store_memory(user_id: str, message: str, response: str, emotion: str = ""):
     """Enhanced memory storage"""
+    update_context(user_id, message, response, emotion)
     try:
         import streamlit as st
         if 'conversation_memory' not in st.session_state:
@@ -510,86 +575,69 @@ def store_memory(user_id: str, message: str, response: str, emotion: str = ""):
         print(f"✅ Stored in memory: {len(st.session_state.conversation_memory[user_id])} total messages")
         
     except:
-        # File backup
+        # Persistent backup - queued for the background writer, no whole-file rewrite
         try:
-            memory_file = "user_conversation_memory.json"
-            
-            if os.path.exists(memory_file):
-                with open(memory_file, "r", encoding="utf-8") as f:
-                    all_data = json.load(f)
-            else:
-                all_data = {}
-            
-            if user_id not in all_data:
-                all_data[user_id] = []
-            
-            all_data[user_id].append({
-                "message": message,
-                "response": response,
-                "emotion": emotion,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            if len(all_data[user_id]) > 20:
-                all_data[user_id] = all_data[user_id][-20:]
-            
-            with open(memory_file, "w", encoding="utf-8") as f:
-                json.dump(all_data, f, indent=2)
-                
-            print(f"✅ Stored in file backup")
+            append_turn_later(user_id, message, response, emotion)
                 
         except Exception as e:
             print(f"Memory storage error: {e}")
 
 def get_conversation_context(user_id: str) -> str:
-    """Get recent conversation context"""
-    try:
-        import streamlit as st
-        if user_id in st.session_state.get('conversation_memory', {}):
-            recent = st.session_state.conversation_memory[user_id][-5:]  # Get last 5 messages
-            context_parts = []
-            for conv in recent:
-                context_parts.append(f"User: {conv['message']}")
-                # Shorter response preview for context
-                response_preview = conv['response'][:150] + "..." if len(conv['response']) > 150 else conv['response']
-                context_parts.append(f"Assistant: {response_preview}")
-            context = "\n".join(context_parts)
-            print(f"📖 Context from Streamlit: {len(context)} chars")
-            return context
-    except:
-        pass
-    
-    # File fallback
-    try:
-        memory_file = "user_conversation_memory.json"
-        if os.path.exists(memory_file):
-            with open(memory_file, "r", encoding="utf-8") as f:
-                all_data = json.load(f)
-            
-            if user_id in all_data:
-                recent = all_data[user_id][-5:]
-                context_parts = []
-                for conv in recent:
-                    context_parts.append(f"User: {conv['message']}")
-                    response_preview = conv['response'][:150] + "..." if len(conv['response']) > 150 else conv['response']
-                    context_parts.append(f"Assistant: {response_preview}")
-                context = "\n".join(context_parts)
-                print(f"📖 Context from file: {len(context)} chars")
-                return context
-    except:
-        pass
-    
-    print(f"📖 No context available")
-    return ""
+    """Recent conversation context - kept up to date by store_memory, so this never rebuilds it or reads disk"""
+    context = conversation_context(user_id)
+    if context:
+        print(f"📖 Context: {len(context)} chars")
+    else:
+        print(f"📖 No context available")
+    return context
 
-def openai_chat(prompt):
-    """OpenAI chat with enhanced personality"""
-    if not openai_client:
-        print(f"❌ OpenAI not available")
-        return None
-    
-    try:
-        system_message = """You are Petal, a warm and caring best friend who specializes in menstrual health support.
+def _with_recalled_turns(user_id: str, query: str, context: str) -> str:
+    """Generation context: the user's earlier messages relevant to this query (from the
+    episodic index, skipping ones still in the window) ahead of the recent turns"""
+    recalled = recalled_context(user_id, query, context)
+    if not recalled:
+        return context
+    print(f"🧠 Recalled earlier messages: {recalled.count(chr(10))}")
+    return f"{recalled}\n{context}" if context else recalled
+
+class _DeltaStream:
+    """Text deltas from a streamed completion; a dropped stream just ends early.
+    close() releases the HTTP connection, even before the first delta was read.
+    `completed` tells a finished answer (finish_reason "stop") from a cut-off one."""
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._chunks = iter(stream)
+        self.finish_reason = None
+    
+    @property
+    def completed(self) -> bool:
+        return self.finish_reason == "stop"
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> str:
+        while True:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self.close()
+                raise
+            except Exception as e:
+                print(f"❌ OpenAI stream interrupted: {e}")
+                self.close()
+                raise StopIteration
+            if chunk.choices and chunk.choices[0].finish_reason:
+                self.finish_reason = chunk.choices[0].finish_reason
+            if chunk.choices and chunk.choices[0].delta.content:
+                return chunk.choices[0].delta.content
+    
+    def close(self) -> None:
+        if hasattr(self._stream, "close"):
+            self._stream.close()
+
+PETAL_SYSTEM_MESSAGE = """You are Petal, a warm and caring best friend who specializes in menstrual health support.
 
 PERSONALITY:
 - Use warm language: "Hey honey," "Oh sweetie," "Love"
@@ -606,119 +654,243 @@ FOLLOW-UP AWARENESS:
 
 Provide evidence-based medical information from trusted sources."""
 
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.8,
-            max_tokens=700,
-            frequency_penalty=0.3,
-            presence_penalty=0.3
-        )
+def _chat_request(prompt: str, stream: bool) -> Dict:
+    """Completion arguments shared by the sync and async clients"""
+    return dict(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": PETAL_SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.8,
+        max_tokens=700,
+        frequency_penalty=0.3,
+        presence_penalty=0.3,
+        stream=stream
+    )
 
-        print(f"✅ OpenAI response generated")
+def _complete(request: Dict, user_id: Optional[str] = None) -> str:
+    """Non-streamed completion text, coalesced with identical in-flight requests.
+    Only the call that reaches the API spends quota - user_id's, or just the global one when None"""
+    def create():
+        estimated = estimate_tokens(request["messages"], request.get("max_tokens", 0))
+        llm_limiter.acquire(user_id, estimated)
+        response = openai_client.chat.completions.create(**request)
+        llm_limiter.settle(user_id, estimated, getattr(getattr(response, "usage", None), "total_tokens", None))
         return response.choices[0].message.content
+    
+    return llm_flights.do(request_key(request), create)
+
+def _open_stream(request: Dict, user_id: Optional[str] = None) -> Iterator[str]:
+    llm_limiter.acquire(user_id, estimate_tokens(request["messages"], request.get("max_tokens", 0)))
+    return _DeltaStream(openai_client.chat.completions.create(**request))
+
+def openai_chat(prompt, stream: bool = False, user_id: Optional[str] = None):
+    """OpenAI chat with enhanced personality (stream=True returns a generator of text deltas),
+    rate-limited against user_id's buckets"""
+    if not openai_client:
+        print(f"❌ OpenAI not available")
+        return None
+    
+    try:
+        request = _chat_request(prompt, stream)
+        
+        if stream:
+            deltas = llm_flights.stream(request_key(request), lambda: _open_stream(request, user_id))
+            if deltas is None:
+                print(f"❌ OpenAI stream could not be opened")
+                return None
+            print(f"✅ OpenAI response streaming")
+            return deltas
+
+        response = _complete(request, user_id)
+        print(f"✅ OpenAI response generated")
+        return response
         
     except Exception as e:
         print(f"❌ OpenAI error: {e}")
         return None
 
-def get_medical_content_from_database(query: str) -> str:
-    """Get medical content from RAG database"""
+# ====================
+# HYBRID RETRIEVAL (dense FAISS + BM25, reciprocal rank fusion)
+# ====================
+
+RRF_K = 60               # Standard reciprocal rank fusion constant
+HYBRID_CANDIDATES = 10   # Candidates pulled from each retriever before fusion
+
+# Shared pool so dense and lexical searches overlap instead of running in series
+_retrieval_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="petal-retrieval")
+
+def _chunk_key(text: str) -> str:
+    """Identity of a chunk across indexes (same chunk text => same key)"""
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+def _authority_name(source: str) -> Optional[str]:
+    """Short display name for a trusted medical source"""
+    if 'acog.org' in source:
+        return 'ACOG'
+    elif 'mayoclinic.org' in source:
+        return 'Mayo Clinic'
+    elif 'nhs.uk' in source:
+        return 'NHS'
+    elif 'plannedparenthood.org' in source:
+        return 'Planned Parenthood'
+    return None
+
+def _dense_candidates(query: str, k: int) -> List[Dict]:
+    """Top-k chunks from the resident FAISS index"""
+    from src.graph.vector_store import get_vector_store, FAISS_INDEX_PATH
     
-    # Try FAISS database first
+    if not os.path.exists(FAISS_INDEX_PATH):
+        return []
+    
+    return [
+        {"key": _chunk_key(doc.page_content), "text": doc.page_content, "metadata": dict(doc.metadata)}
+        for doc in get_vector_store().similarity_search(query, k=k)
+    ]
+
+def _lexical_candidates(query: str, k: int) -> List[Dict]:
+    """Top-k chunks from the BM25 index, with their most relevant sentences"""
+    from src.graph.bm25_index import get_bm25_index
+    
+    index = get_bm25_index()
+    if index is None:
+        return []
+    
+    candidates = []
+    for doc_id, score in index.search(query, k=k):
+        doc = index.docs[doc_id]
+        candidates.append({
+            "key": _chunk_key(doc["text"]),
+            "text": doc["text"],
+            "metadata": {"source": doc["source"], "category": doc["category"], "authority_level": doc["authority"]},
+            "sentences": index.best_sentences(doc_id, query, limit=2),
+        })
+    return candidates
+
+def _run_retriever(name: str, retriever, query: str, k: int) -> List[Dict]:
     try:
-        from langchain_community.vectorstores import FAISS
-        from langchain_openai import OpenAIEmbeddings
-        
-        if openai_client and os.path.exists("src/graph/faiss_index"):
-            print("📚 Searching FAISS medical database...")
-            embeddings = OpenAIEmbeddings(openai_api_key=api_key)
-            
-            vectorstore = FAISS.load_local(
-                "src/graph/faiss_index", 
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
-            
-            docs = vectorstore.similarity_search(query, k=3)
-            
-            medical_content = ""
-            authorities = set()
-            
-            for doc in docs:
-                content = doc.page_content
-                source = doc.metadata.get('source', '')
-                
-                # Extract authority
-                if 'acog.org' in source:
-                    authorities.add('ACOG')
-                elif 'mayoclinic.org' in source:
-                    authorities.add('Mayo Clinic')
-                elif 'nhs.uk' in source:
-                    authorities.add('NHS')
-                elif 'plannedparenthood.org' in source:
-                    authorities.add('Planned Parenthood')
-                
-                medical_content += content + "\n\n"
+        return retriever(query, k)
+    except Exception as e:
+        print(f"⚠️ {name} retrieval failed: {e}")
+        return []
+
+def _refresh_topic_index(topic_graph) -> None:
+    """Keep the topic -> chunk index in step with the resident FAISS and BM25 indexes"""
+    from src.graph.vector_store import get_vector_store, iter_documents
+    from src.graph.bm25_index import get_bm25_index, get_bm25_generation
+    
+    vector_store = get_vector_store()
+    # Read before the indexes: a reload in between only costs one extra rebuild, never a stale topic index
+    signature = (vector_store.generation, get_bm25_generation())
+    bm25_index = get_bm25_index()
+    
+    def records():
+        vectorstore = vector_store.current()
+        if vectorstore is not None:
+            for doc in iter_documents(vectorstore):
+                yield _chunk_key(doc.page_content), doc.metadata
+        if bm25_index is not None:
+            for doc in bm25_index.docs:
+                yield _chunk_key(doc["text"]), {"category": doc["category"]}
+    
+    topic_graph.refresh_chunk_index(signature, records)
+
+def _apply_graph_expansion(query: str, fused: Dict[str, Dict], k: int, topic_filter: bool) -> None:
+    """Boost (and optionally filter) fused candidates by knowledge-graph topic proximity"""
+    from src.graph.graph_expansion import get_topic_graph, chunk_topic, GRAPH_BOOST
+    
+    topic_graph = get_topic_graph()
+    weights = topic_graph.topic_weights(query)
+    if not weights:
+        return
+    
+    _refresh_topic_index(topic_graph)
+    on_topic = topic_graph.chunks_for(weights)
+    
+    for key, entry in fused.items():
+        topic = topic_graph.chunk_topics.get(key) or chunk_topic(entry["metadata"])
+        entry["topic"] = topic
+        entry["score"] *= 1 + GRAPH_BOOST * weights.get(topic, 0.0)
+    
+    if topic_filter and sum(1 for key in fused if key in on_topic) >= k:
+        for key in [key for key in fused if key not in on_topic]:
+            del fused[key]
+    
+    print(f"🕸️ Graph expansion: {len(weights)} related topics, {len(on_topic & fused.keys())} on-topic candidates")
+
+def hybrid_search(query: str, k: int = 3, candidates: int = HYBRID_CANDIDATES, topic_filter: bool = False) -> List[Dict]:
+    """Dense + lexical retrieval run concurrently and fused with reciprocal rank fusion.
+    
+    Returns up to k chunks, best first, each with its fused score and provenance
+    (the rank it had in each retriever, or None if that retriever missed it).
+    Candidates near the query's topics in graph_config.graph are boosted, and
+    with topic_filter=True off-topic candidates are dropped when enough remain.
+    """
+    dense_future = _retrieval_executor.submit(_run_retriever, "Dense", _dense_candidates, query, candidates)
+    lexical_future = _retrieval_executor.submit(_run_retriever, "Lexical", _lexical_candidates, query, candidates)
+    ranked_lists = {"dense": dense_future.result(), "lexical": lexical_future.result()}
+    
+    fused = {}
+    for retriever_name, ranked in ranked_lists.items():
+        for rank, candidate in enumerate(ranked, start=1):
+            entry = fused.get(candidate["key"])
+            if entry is None:
+                entry = {
+                    "text": candidate["text"],
+                    "metadata": candidate["metadata"],
+                    "sentences": [],
+                    "score": 0.0,
+                    "provenance": {"dense": None, "lexical": None},
+                    "topic": None,
+                }
+                fused[candidate["key"]] = entry
             
-            if medical_content:
-                authority_note = f"Medical guidance from {', '.join(authorities)}" if authorities else "trusted medical sources"
-                print(f"✅ Retrieved medical content from {authority_note}")
-                return medical_content + f"\n\n*Source: {authority_note}*"
-                
+            entry["score"] += 1.0 / (RRF_K + rank)
+            entry["provenance"][retriever_name] = rank
+            if candidate.get("sentences"):
+                entry["sentences"] = candidate["sentences"]
+            for field, value in candidate["metadata"].items():
+                entry["metadata"].setdefault(field, value)
+    
+    try:
+        _apply_graph_expansion(query, fused, k, topic_filter)
     except Exception as e:
-        print(f"⚠️ FAISS search failed: {e}")
+        print(f"⚠️ Graph expansion failed: {e}")
     
-    # Try raw medical content backup
+    results = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)[:k]
+    print(f"🔀 Hybrid retrieval: {len(ranked_lists['dense'])} dense + {len(ranked_lists['lexical'])} lexical → {len(results)} fused")
+    return results
+
+def get_medical_content_from_database(query: str) -> str:
+    """Get medical content from RAG database"""
+    
+    # Hybrid dense + lexical search over the medical database
     try:
-        if os.path.exists("src/graph/raw_medical_content"):
-            print("📄 Searching raw medical content...")
-            
-            query_words = [word for word in query.lower().split() if len(word) > 2]
-            all_content = ""
+        print("📚 Searching medical database (FAISS + BM25)...")
+        results = hybrid_search(query, k=3)
+        
+        chunks = []
+        authorities = set()
+        
+        for result in results:
+            authority = _authority_name(result["metadata"].get('source', ''))
+            if authority:
+                authorities.add(authority)
             
-            for filename in os.listdir("src/graph/raw_medical_content")[:5]:
-                if filename.endswith('.txt'):
-                    filepath = os.path.join("src/graph/raw_medical_content", filename)
-                    
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # Check relevance
-                    content_lower = content.lower()
-                    relevance_score = sum(1 for word in query_words if word in content_lower)
-                    
-                    if relevance_score > 0:
-                        # Extract clean medical content
-                        sentences = re.split(r'[.!?]+', content)
-                        relevant_sentences = []
-                        
-                        for sentence in sentences:
-                            sentence = sentence.strip()
-                            if len(sentence) > 40:
-                                sentence_relevance = sum(1 for word in query_words if word in sentence.lower())
-                                if sentence_relevance > 0:
-                                    clean_sentence = re.sub(r'SOURCE:.*|CATEGORY:.*|AUTHORITY:.*|={2,}', '', sentence).strip()
-                                    if len(clean_sentence) > 30:
-                                        relevant_sentences.append(clean_sentence)
-                                        if len(relevant_sentences) >= 2:
-                                            break
-                        
-                        if relevant_sentences:
-                            all_content += '\n\n'.join(relevant_sentences) + "\n\n"
-                            
-                        if len(all_content) > 800:
-                            break
+            # Dense hits carry the whole chunk; lexical-only hits contribute their matching sentences
+            if result["provenance"]["dense"] is None and result["sentences"]:
+                chunks.append(' '.join(result["sentences"]))
+            else:
+                chunks.append(result["text"])
+        
+        if chunks:
+            authority_note = f"Medical guidance from {', '.join(sorted(authorities))}" if authorities else "trusted medical sources"
+            print(f"✅ Retrieved medical content from {authority_note}")
+            return join_chunks(chunks + [f"*Source: {authority_note}*"])
             
-            if all_content:
-                print(f"✅ Retrieved content from raw medical files")
-                return all_content
-                
     except Exception as e:
-        print(f"⚠️ Raw content search failed: {e}")
+        print(f"⚠️ Medical database search failed: {e}")
     
     # Fallback medical advice based on query analysis
     query_lower = query.lower()
@@ -738,33 +910,99 @@ def get_medical_content_from_database(query: str) -> str:
     else:
         return """Based on medical experts, maintaining good menstrual hygiene, staying hydrated, getting adequate rest, and listening to your body's needs are important during your period. Heat therapy, gentle exercise, and over-the-counter pain relievers can help with discomfort. If you have severe symptoms or concerns, consulting with a healthcare provider is recommended."""
 
-def create_response_with_all_systems(query: str, medical_content: str, emotion: str, context: str) -> str:
-    """Create comprehensive response"""
-    
-    print(f"🎭 Creating response for emotion: {emotion}")
+MEDICAL_FOOTER = "\n\n💙 *Medical info from trusted sources*"
+
+def _generation_prompt(query: str, medical_content: str, emotion: str, context: str) -> str:
+    """Generation prompt held to the token budget (ranked evidence + newest history)"""
+    prompt, breakdown = build_generation_prompt(query, medical_content, emotion, context, PETAL_SYSTEM_MESSAGE)
+    summary = format_breakdown(breakdown)
+    print(f"🧾 Prompt tokens: {summary}")
+    log_event("prompt_logs.txt", f"Query: {query[:50]} | {summary}")
+    return prompt
+
+def _cacheable_query(query: str, emotion: str) -> bool:
+    """The one rule for both lookup and store: standalone questions (nothing like "is that
+    normal?" pointing back at the conversation) outside crisis. Any asker may be served a
+    cached answer; which answers get cached is _remember_response's call."""
+    return emotion not in UNCACHEABLE_EMOTIONS and not is_referential(query)
+
+def _cached_response(query: str, emotion: str) -> Optional[str]:
+    """Earlier answer to a near-duplicate standalone question, if any (see _cacheable_query)"""
+    if not _cacheable_query(query, emotion):
+        return None
+    try:
+        return get_response_cache().get(query, emotion)
+    except Exception as e:
+        print(f"⚠️ Response cache lookup failed: {e}")
+        return None
+
+def _remember_response(query: str, emotion: str, context: str, response: str) -> None:
+    """Cache the answer to a standalone question (see _cacheable_query), but only one generated
+    without conversation in the prompt. The cache is shared by every user, and an answer written
+    with someone's history (earlier turns, summary, recalled messages) may refer back to it."""
+    if not _cacheable_query(query, emotion) or (context or "").strip():
+        return
+    try:
+        get_response_cache().put(query, emotion, response)
+    except Exception as e:
+        print(f"⚠️ Response cache store failed: {e}")
+
+def _stream_finished(deltas) -> bool:
+    """Whether a delta stream ended with a complete answer (not dropped or cut at max_tokens)"""
+    return getattr(deltas, "completed", True)
+
+def _stream_with_fallback(deltas: Iterator[str], fallback, on_complete=None) -> Iterator[str]:
+    """Pass deltas through, falling back to the offline answer if nothing arrived.
+    on_complete only sees answers the model finished - a cut-off one is never cached."""
+    parts = []
+    for delta in deltas:
+        parts.append(delta)
+        yield delta
+    
+    if parts:
+        if not _stream_finished(deltas):
+            print(f"⚠️ OpenAI stream ended early - answer not cached")
+        elif on_complete:
+            on_complete("".join(parts) + MEDICAL_FOOTER)
+        yield MEDICAL_FOOTER
+    else:
+        print(f"❌ OpenAI stream empty, using fallback")
+        yield fallback()
+
+def _finish_generation(raw, query: str, medical_content: str, emotion: str, context: str,
+                       stream: bool, stream_wrapper=None) -> Union[str, Iterator[str], AsyncIterator[str]]:
+    """Turn raw model output (delta stream, text or None) into the answer, falling back offline"""
+    if stream and raw is not None:
+        return (stream_wrapper or _stream_with_fallback)(
+            raw, lambda: _fallback_response(query, medical_content, emotion),
+            lambda text: _remember_response(query, emotion, context, text))
+    if not stream and raw:
+        response = raw + MEDICAL_FOOTER
+        _remember_response(query, emotion, context, response)
+        return response
     
     if openai_client:
-        context_info = f"Previous conversation: {context[-400:]}\n\n" if context else ""
-        emotion_info = f"User emotion: {emotion}\n\n" if emotion != "neutral" else ""
-        
-        prompt = f"""{context_info}{emotion_info}User question: "{query}"
-
-Medical information: {medical_content}
+        print(f"❌ OpenAI failed, using fallback")
+    return _fallback_response(query, medical_content, emotion)
 
-Instructions:
-- If this continues a previous conversation, acknowledge it naturally
-- If user asking about food/remedies, connect to their health concern
-- If expressing emotions, validate feelings first
-- Be warm, caring, and conversational as Petal"""
+def _generate(query: str, medical_content: str, emotion: str, context: str, stream: bool,
+              user_id: Optional[str] = None):
+    """Raw model output: a delta iterator (stream=True), the text, or None when OpenAI is unavailable/failed"""
+    if not openai_client:
+        return None
+    return openai_chat(_generation_prompt(query, medical_content, emotion, context), stream=stream, user_id=user_id)
 
-        response = openai_chat(prompt)
-        
-        if response:
-            return response + "\n\n💙 *Medical info from trusted sources*"
-        else:
-            print(f"❌ OpenAI failed, using fallback")
+def create_response_with_all_systems(query: str, medical_content: str, emotion: str, context: str,
+                                     stream: bool = False, user_id: Optional[str] = None) -> Union[str, Iterator[str]]:
+    """Create comprehensive response (stream=True returns a generator of text deltas when OpenAI is up)"""
+    
+    print(f"🎭 Creating response for emotion: {emotion}")
     
-    # Enhanced fallback
+    raw = _generate(query, medical_content, emotion, context, stream, user_id)
+    return _finish_generation(raw, query, medical_content, emotion, context, stream)
+
+def _fallback_response(query: str, medical_content: str, emotion: str) -> str:
+    """Enhanced fallback"""
     emotion_openings = {
         "angry": "Oh honey, I can hear the frustration! 💕 Those feelings are totally valid.",
         "embarrassed": "Oh sweetie, I understand those feelings completely! 💕",
@@ -786,10 +1024,60 @@ Instructions:
     
     ending = "You've got this, honey! Feel free to ask more. 🌸"
     
-    return f"{opening}\n\n{medical_info}\n\n{ending}\n\n💙 *Medical info from trusted sources*"
+    return f"{opening}\n\n{medical_info}\n\n{ending}{MEDICAL_FOOTER}"
+
+def _finish_streamed_turn(response: Union[str, Iterator[str]], user_id: str, query: str,
+                          emotion: str, started: float) -> Iterator[str]:
+    """Yield the answer as it streams, then store it (whatever was sent, if abandoned) and log time-to-first-token"""
+    if isinstance(response, str):
+        response = iter([response])
+    
+    parts = []
+    ttft_ms = None
+    finished = False
+    try:
+        for delta in response:
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+                print(f"⚡ First token after {ttft_ms:.0f}ms")
+            parts.append(delta)
+            yield delta
+        finished = True
+    finally:
+        # Also runs when the reader stops early (closed stream, page rerun) - the turn is still recorded
+        full_response = "".join(parts)
+        total_ms = (time.perf_counter() - started) * 1000
+        if full_response or finished:
+            store_memory(user_id, query, full_response, emotion)
+        log_event("chat_logs.txt", f"User: {query[:50]} | Emotion: {emotion} | "
+                                   f"{'Success' if finished else 'Abandoned'} | "
+                                   f"TTFT: {ttft_ms or total_ms:.0f}ms | Total: {total_ms:.0f}ms")
+        print(f"{'✅ Response streamed' if finished else '⚠️ Stream abandoned after'}: {len(full_response)} chars")
+
+EMERGENCY_RESPONSE = """I hear you, and I'm so glad you reached out. 💙
+
+📞 **Please get help right now:**
+• Text HOME to 741741 (Crisis Text Line - 24/7)
+• Call 988 (Suicide Prevention - immediate help)
+• Call 911 if you're in immediate danger
+
+You matter so much. These feelings can change with help. 🌸"""
 
-def get_comprehensive_response(query: str, user_id: str = "user_001") -> str:
-    """MAIN function - Complete processing pipeline"""
+REDIRECT_RESPONSE = """I'm Petal, your menstrual health companion! 🌸 
+
+I help with period-related questions using medical expertise from trusted sources.
+
+**I can help with:**
+🩸 Period timing, flow, irregularities, what's normal
+💊 Cramp relief, PMS/PMDD, bloating, mood changes  
+👧 First period support, teen concerns
+🏥 When to see doctors, warning signs
+💙 Emotional support, anxiety, self-care
+
+Could you ask me something about periods or reproductive health? I'm here with caring support! 💕"""
+
+def _screen_query(query: str, user_id: str):
+    """Steps 1-2: sanitization, then crisis detection. Returns (sanitized query, final response or None)"""
     
     print(f"\n" + "="*60)
     print(f"🔍 PROCESSING: '{query}'")
@@ -799,7 +1087,7 @@ def get_comprehensive_response(query: str, user_id: str = "user_001") -> str:
     sanitized_query = sanitize_input(query)
     if sanitized_query.startswith("[🚫"):
         print(f"🛡️ BLOCKED by security")
-        return sanitized_query
+        return sanitized_query, sanitized_query
     
     # Step 2: CRISIS DETECTION FIRST - ABSOLUTE PRIORITY
     if is_crisis_message(sanitized_query):
@@ -808,55 +1096,499 @@ def get_comprehensive_response(query: str, user_id: str = "user_001") -> str:
         if crisis_response:
             store_memory(user_id, sanitized_query, crisis_response, "crisis")
             log_crisis(user_id, sanitized_query)
-            return crisis_response
+            return sanitized_query, crisis_response
         else:
             # Emergency fallback
-            emergency_response = """I hear you, and I'm so glad you reached out. 💙
+            store_memory(user_id, sanitized_query, EMERGENCY_RESPONSE, "crisis")
+            return sanitized_query, EMERGENCY_RESPONSE
+    
+    return sanitized_query, None
 
-📞 **Please get help right now:**
-• Text HOME to 741741 (Crisis Text Line - 24/7)
-• Call 988 (Suicide Prevention - immediate help)
-• Call 911 if you're in immediate danger
+def _redirect_response(user_id: str, sanitized_query: str) -> str:
+    print(f"🚫 Not menstrual-related - providing redirect")
+    store_memory(user_id, sanitized_query, REDIRECT_RESPONSE, "redirect")
+    return REDIRECT_RESPONSE
 
-You matter so much. These feelings can change with help. 🌸"""
-            store_memory(user_id, sanitized_query, emergency_response, "crisis")
-            return emergency_response
+def _serve_cached_response(response: str, user_id: str, query: str, emotion: str,
+                           started: float, stream: bool) -> Union[str, Iterator[str]]:
+    """Skip retrieval and generation for a near-duplicate of an earlier question"""
+    if stream:
+        return _finish_streamed_turn(response, user_id, query, emotion, started)
+    
+    store_memory(user_id, query, response, emotion)
+    log_event("chat_logs.txt", f"User: {query[:50]} | Emotion: {emotion} | Success | Cached")
+    print(f"✅ Cached response served in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return response
+
+# ====================
+# SPECULATIVE EXECUTION (retrieval/generation overlap the LLM topic gate)
+# ====================
+
+# off: gate first | retrieval: retrieve while the gate decides | full: also start generating
+SPECULATION_MODE = os.getenv("PETAL_SPECULATION", "off").lower()
+# Full mode only spends a generation call when the local classifier leans this far towards health
+SPECULATION_MIN_CONFIDENCE = float(os.getenv("PETAL_SPECULATION_MIN_CONFIDENCE", "0.5"))
+
+# Own pool: speculative retrieval submits to _retrieval_executor and would otherwise wait on itself
+_speculation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="petal-speculate")
+_speculation_lock = threading.Lock()
+_speculation_stats = {"started": 0, "committed": 0, "discarded": 0, "generations_started": 0,
+                      "generations_cancelled": 0, "generations_wasted": 0, "hidden_ms": 0.0}
+
+def _count_speculation(key: str, amount: float = 1) -> None:
+    with _speculation_lock:
+        _speculation_stats[key] += amount
+
+def _speculate_generation(query: str, client) -> bool:
+    """Whether full mode should start the answer before the gate has passed"""
+    if SPECULATION_MODE != "full" or not client:
+        return False
+    try:
+        classifier = get_topic_classifier(MENSTRUAL_TERMS, NON_MENSTRUAL_EXCLUSIONS)
+        return classifier.health_probability(query) >= SPECULATION_MIN_CONFIDENCE
+    except Exception as e:
+        print(f"⚠️ Speculation check failed: {e}")
+        return False
+
+def _close_discarded(raw) -> None:
+    """Release a speculative answer nobody will read (an open stream holds an HTTP connection)"""
+    if hasattr(raw, "close"):
+        raw.close()
+
+class _Speculation:
+    """Retrieval, and in full mode generation, started before the LLM topic gate has answered"""
+    
+    def __init__(self, query: str, emotion: str, context: str, stream: bool, generate: bool,
+                 user_id: Optional[str] = None):
+        self.context = context
+        self.started = time.perf_counter()
+        self.medical = _speculation_executor.submit(get_medical_content_from_database, query)
+        self.generation = None
+        if generate:
+            self.generation = _speculation_executor.submit(
+                lambda: _generate(query, self.medical.result(), emotion, context, stream, user_id))
+        _count_speculation("started")
+        _count_speculation("generations_started", int(generate))
+        print(f"🔮 Speculating: retrieval{' + generation' if generate else ''} while the gate decides")
+    
+    def commit(self) -> str:
+        """Gate passed: the speculative medical content (waits for it if still running)"""
+        hidden_ms = (time.perf_counter() - self.started) * 1000
+        _count_speculation("committed")
+        _count_speculation("hidden_ms", hidden_ms)
+        print(f"🔮 Speculation committed - {hidden_ms:.0f}ms of work overlapped the gate")
+        return self.medical.result()
+    
+    def discard(self) -> None:
+        """Gate failed: cancel whatever hasn't started, close what already has"""
+        _count_speculation("discarded")
+        self.medical.cancel()
+        if self.generation is None:
+            return
+        if self.generation.cancel():
+            _count_speculation("generations_cancelled")
+        else:
+            _count_speculation("generations_wasted")
+            self.generation.add_done_callback(
+                lambda done: done.exception() is None and _close_discarded(done.result()))
+        print(f"🔮 Speculation discarded")
+
+def _speculative_topic_gate(query: str, user_id: str, stream: bool):
+    """is_menstrual_related with retrieval (and maybe generation) running behind the LLM check.
+    Returns (is_menstrual, _Speculation or None, cached answer or None). The response cache is
+    looked up here, once per turn - a speculation only starts after a miss."""
+    
+    decision = _keyword_topic_decision(query)
+    if decision is None:
+        context = get_conversation_context(user_id)
+        if context and openai_client:
+            emotion = detect_emotion(query)
+            cached = _cached_response(query, emotion)
+            if cached is not None:
+                return _contextual_topic_decision(query, context), None, cached
+            
+            speculation = _Speculation(query, emotion, _with_recalled_turns(user_id, query, context), stream,
+                                       _speculate_generation(query, openai_client), user_id)
+            try:
+                is_menstrual = _contextual_topic_decision(query, context)
+            except BaseException:
+                speculation.discard()
+                raise
+            if not is_menstrual:
+                speculation.discard()
+                return False, None, None
+            return True, speculation, None
+        
+        # No LLM call to hide latency behind
+        decision = _referential_followup(query, context)
+    
+    if not decision:
+        return False, None, None
+    return True, None, _cached_response(query, detect_emotion(query))
+
+async def _discard_generation_async(generation_task) -> None:
+    """Async _Speculation.discard for a speculative generation task"""
+    _count_speculation("discarded")
+    if not generation_task.done():
+        generation_task.cancel()
+        _count_speculation("generations_cancelled")
+        print(f"🔮 Speculative generation cancelled")
+        return
+    _count_speculation("generations_wasted")
+    if not generation_task.cancelled() and generation_task.exception() is None:
+        raw = generation_task.result()
+        if hasattr(raw, "aclose"):
+            await raw.aclose()
+    print(f"🔮 Speculative generation discarded")
+
+def get_speculation_stats() -> Dict:
+    """How often speculative work was used vs thrown away, and how much gate latency it hid"""
+    with _speculation_lock:
+        stats = dict(_speculation_stats)
+    stats["mode"] = SPECULATION_MODE
+    stats["min_confidence"] = SPECULATION_MIN_CONFIDENCE
+    stats["hidden_ms"] = round(stats["hidden_ms"])
+    finished = stats["committed"] + stats["discarded"]
+    stats["commit_rate"] = round(stats["committed"] / finished, 3) if finished else 0.0
+    return stats
+
+def get_comprehensive_response(query: str, user_id: str = "user_001",
+                               stream: bool = False) -> Union[str, Iterator[str]]:
+    """MAIN function - Complete processing pipeline.
+    
+    With stream=True a generated answer comes back as a generator of text deltas
+    (memory is stored once it has been consumed); canned replies stay strings.
+    """
+    started = time.perf_counter()
+    
+    sanitized_query, early_response = _screen_query(query, user_id)
+    if early_response is not None:
+        return early_response
     
     # Step 3: Menstrual health detection
     print(f"🔍 Checking if menstrual/health related...")
-    is_menstrual = is_menstrual_related(sanitized_query)
+    speculation = None
+    looked_up, cached = False, None  # the response cache is looked up once per turn
+    if SPECULATION_MODE in ("retrieval", "full"):
+        is_menstrual, speculation, cached = _speculative_topic_gate(sanitized_query, user_id, stream)
+        looked_up = True
+    else:
+        is_menstrual = is_menstrual_related(sanitized_query, user_id)
     
     if not is_menstrual:
-        print(f"🚫 Not menstrual-related - providing redirect")
-        redirect_response = """I'm Petal, your menstrual health companion! 🌸 
+        return _redirect_response(user_id, sanitized_query)
+    
+    # Step 4: Generate menstrual health response
+    print(f"✅ CONFIRMED menstrual health question - generating response")
+    
+    emotion = detect_emotion(sanitized_query)
+    if not looked_up:
+        cached = _cached_response(sanitized_query, emotion)
+    if cached is not None:
+        return _serve_cached_response(cached, user_id, sanitized_query, emotion, started, stream)
+    
+    if speculation:
+        context = speculation.context
+        medical_content = speculation.commit()
+    else:
+        context = _with_recalled_turns(user_id, sanitized_query, get_conversation_context(user_id))
+        medical_content = get_medical_content_from_database(sanitized_query)
+    
+    print(f"🎭 Emotion: {emotion}")
+    print(f"🏥 Medical content: {len(medical_content)} chars")
+    
+    if speculation and speculation.generation:
+        response = _finish_generation(speculation.generation.result(), sanitized_query, medical_content,
+                                      emotion, context, stream)
+    else:
+        response = create_response_with_all_systems(sanitized_query, medical_content, emotion, context,
+                                                     stream=stream, user_id=user_id)
+    
+    if stream:
+        return _finish_streamed_turn(response, user_id, sanitized_query, emotion, started)
+    
+    # Store conversation
+    store_memory(user_id, sanitized_query, response, emotion)
+    log_event("chat_logs.txt", f"User: {sanitized_query[:50]} | Emotion: {emotion} | Success")
+    
+    print(f"✅ Response generated: {len(response)} chars")
+    return response
 
-I help with period-related questions using medical expertise from trusted sources.
+# ====================
+# ASYNC PIPELINE (independent stages run concurrently on AsyncOpenAI)
+# ====================
 
-**I can help with:**
-🩸 Period timing, flow, irregularities, what's normal
-💊 Cramp relief, PMS/PMDD, bloating, mood changes  
-👧 First period support, teen concerns
-🏥 When to see doctors, warning signs
-💙 Emotional support, anxiety, self-care
+async def _in_thread(func, *args):
+    """Run blocking work in a thread that still sees the caller's Streamlit session"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx, add_script_run_ctx
+        script_ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        script_ctx = None
+    
+    def run():
+        if script_ctx is not None:
+            add_script_run_ctx(threading.current_thread(), script_ctx)
+        return func(*args)
+    
+    # run_in_executor rather than asyncio.to_thread, which needs Python 3.9
+    return await asyncio.get_running_loop().run_in_executor(None, run)
 
-Could you ask me something about periods or reproductive health? I'm here with caring support! 💕"""
+class _AsyncDeltaStream:
+    """_DeltaStream for async streamed completions"""
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._chunks = stream.__aiter__()
+        self.finish_reason = None
+    
+    @property
+    def completed(self) -> bool:
+        return self.finish_reason == "stop"
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self) -> str:
+        while True:
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                await self.aclose()
+                raise
+            except Exception as e:
+                print(f"❌ OpenAI stream interrupted: {e}")
+                await self.aclose()
+                raise StopAsyncIteration
+            if chunk.choices and chunk.choices[0].finish_reason:
+                self.finish_reason = chunk.choices[0].finish_reason
+            if chunk.choices and chunk.choices[0].delta.content:
+                return chunk.choices[0].delta.content
+    
+    async def aclose(self) -> None:
+        if hasattr(self._stream, "close"):
+            await self._stream.close()
+
+async def _complete_async(request: Dict, user_id: Optional[str] = None) -> str:
+    """Async _complete"""
+    async def create():
+        estimated = estimate_tokens(request["messages"], request.get("max_tokens", 0))
+        await llm_limiter.acquire_async(user_id, estimated)
+        response = await async_openai_client.chat.completions.create(**request)
+        llm_limiter.settle(user_id, estimated, getattr(getattr(response, "usage", None), "total_tokens", None))
+        return response.choices[0].message.content
+    
+    return await llm_flights.do_async(request_key(request), create)
+
+async def _open_stream_async(request: Dict, user_id: Optional[str] = None) -> AsyncIterator[str]:
+    await llm_limiter.acquire_async(user_id, estimate_tokens(request["messages"], request.get("max_tokens", 0)))
+    return _AsyncDeltaStream(await async_openai_client.chat.completions.create(**request))
+
+async def openai_chat_async(prompt, stream: bool = False, user_id: Optional[str] = None):
+    """Async openai_chat (stream=True returns an async generator of text deltas)"""
+    if not async_openai_client:
+        print(f"❌ OpenAI not available")
+        return None
+    
+    try:
+        request = _chat_request(prompt, stream)
         
-        store_memory(user_id, sanitized_query, redirect_response, "redirect")
-        return redirect_response
+        if stream:
+            deltas = await llm_flights.stream_async(request_key(request), lambda: _open_stream_async(request, user_id))
+            if deltas is None:
+                print(f"❌ OpenAI stream could not be opened")
+                return None
+            print(f"✅ OpenAI response streaming")
+            return deltas
+        
+        response = await _complete_async(request, user_id)
+        print(f"✅ OpenAI response generated")
+        return response
+        
+    except Exception as e:
+        print(f"❌ OpenAI error: {e}")
+        return None
+
+async def is_menstrual_related_async(query: str, context_task) -> bool:
+    """is_menstrual_related that only waits for the conversation context when keywords can't decide"""
     
-    # Step 4: Generate menstrual health response
-    print(f"✅ CONFIRMED menstrual health question - generating response")
+    decision = _keyword_topic_decision(query)
+    if decision is not None:
+        return decision
+    
+    return await _contextual_topic_decision_async(query, await context_task)
+
+async def _contextual_topic_decision_async(query: str, context: str) -> bool:
+    """Async _contextual_topic_decision"""
+    if context and async_openai_client:
+        try:
+            print(f"🤖 AI analyzing with context...")
+            is_health = _is_health_followup(await _complete_async(_followup_request(query, context)))
+            _record_gate_verdict(query, is_health)
+            if is_health:
+                return True
+                
+        except Exception as e:
+            print(f"AI failed: {e}")
     
-    context = get_conversation_context(user_id)
-    medical_content = get_medical_content_from_database(sanitized_query)
+    return _referential_followup(query, context)
+
+async def _astream_with_fallback(deltas: AsyncIterator[str], fallback, on_complete=None) -> AsyncIterator[str]:
+    parts = []
+    async for delta in deltas:
+        parts.append(delta)
+        yield delta
+    
+    if parts:
+        if not _stream_finished(deltas):
+            print(f"⚠️ OpenAI stream ended early - answer not cached")
+        elif on_complete:
+            on_complete("".join(parts) + MEDICAL_FOOTER)
+        yield MEDICAL_FOOTER
+    else:
+        print(f"❌ OpenAI stream empty, using fallback")
+        yield fallback()
+
+async def _generate_async(query: str, medical_content: str, emotion: str, context: str, stream: bool,
+                          user_id: Optional[str] = None):
+    """Async _generate"""
+    if not async_openai_client:
+        return None
+    return await openai_chat_async(_generation_prompt(query, medical_content, emotion, context), stream, user_id)
+
+async def _speculative_generate_async(query: str, medical_task, emotion: str, context: str, stream: bool,
+                                      user_id: Optional[str] = None):
+    """_generate_async once the (already running) retrieval finishes"""
+    return await _generate_async(query, await asyncio.shield(medical_task), emotion, context, stream, user_id)
+
+async def create_response_with_all_systems_async(query: str, medical_content: str, emotion: str, context: str,
+                                                 stream: bool = False,
+                                                 user_id: Optional[str] = None) -> Union[str, AsyncIterator[str]]:
+    """Async create_response_with_all_systems"""
+    
+    print(f"🎭 Creating response for emotion: {emotion}")
+    
+    raw = await _generate_async(query, medical_content, emotion, context, stream, user_id)
+    return _finish_generation(raw, query, medical_content, emotion, context, stream, _astream_with_fallback)
+
+async def _finish_streamed_turn_async(response: Union[str, AsyncIterator[str]], user_id: str, query: str,
+                                      emotion: str, started: float) -> AsyncIterator[str]:
+    """Async _finish_streamed_turn"""
+    if isinstance(response, str):
+        response = _aiter_once(response)
+    
+    parts = []
+    ttft_ms = None
+    finished = False
+    try:
+        async for delta in response:
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+                print(f"⚡ First token after {ttft_ms:.0f}ms")
+            parts.append(delta)
+            yield delta
+        finished = True
+    finally:
+        # Also runs when the reader stops early (closed stream, page rerun) - the turn is still recorded
+        full_response = "".join(parts)
+        total_ms = (time.perf_counter() - started) * 1000
+        if full_response or finished:
+            store_memory(user_id, query, full_response, emotion)
+        log_event("chat_logs.txt", f"User: {query[:50]} | Emotion: {emotion} | "
+                                   f"{'Success' if finished else 'Abandoned'} | "
+                                   f"TTFT: {ttft_ms or total_ms:.0f}ms | Total: {total_ms:.0f}ms")
+        print(f"{'✅ Response streamed' if finished else '⚠️ Stream abandoned after'}: {len(full_response)} chars")
+
+async def _aiter_once(text: str) -> AsyncIterator[str]:
+    yield text
+
+async def get_comprehensive_response_async(query: str, user_id: str = "user_001",
+                                           stream: bool = False) -> Union[str, AsyncIterator[str]]:
+    """Async get_comprehensive_response.
+    
+    Sanitization and crisis detection still run first. After that the topic gate,
+    context load, retrieval and emotion detection overlap, and generation starts as
+    soon as the gate passes and its inputs are ready (PETAL_SPECULATION=full starts
+    it while the LLM gate is still deciding).
+    """
+    started = time.perf_counter()
+    
+    sanitized_query, early_response = _screen_query(query, user_id)
+    if early_response is not None:
+        return early_response
+    
+    # Step 3+4 overlapped: retrieval and context load start before the topic gate answers
+    context_task = asyncio.ensure_future(_in_thread(get_conversation_context, user_id))
+    medical_task = asyncio.ensure_future(_in_thread(get_medical_content_from_database, sanitized_query))
     emotion = detect_emotion(sanitized_query)
     
+    print(f"🔍 Checking if menstrual/health related...")
+    generation_task = None
+    looked_up, cached = False, None  # the response cache is looked up once per turn
+    try:
+        is_menstrual = _keyword_topic_decision(sanitized_query)
+        if is_menstrual is None:
+            context = await context_task
+            speculate = context and _speculate_generation(sanitized_query, async_openai_client)
+            if speculate:
+                looked_up, cached = True, _cached_response(sanitized_query, emotion)
+            # Full speculation: the answer starts generating while the LLM gate decides
+            if speculate and cached is None:
+                generation_task = asyncio.ensure_future(
+                    _speculative_generate_async(sanitized_query, medical_task, emotion,
+                                                _with_recalled_turns(user_id, sanitized_query, context), stream,
+                                                user_id))
+                _count_speculation("started")
+                _count_speculation("generations_started")
+                speculated_at = time.perf_counter()
+                print(f"🔮 Speculating: generation while the gate decides")
+            is_menstrual = await _contextual_topic_decision_async(sanitized_query, context)
+    except BaseException:
+        context_task.cancel()
+        medical_task.cancel()
+        if generation_task is not None:
+            generation_task.cancel()
+        raise
+    
+    if not is_menstrual:
+        # Threads finish in the background; their results are simply dropped
+        context_task.cancel()
+        medical_task.cancel()
+        if generation_task is not None:
+            await _discard_generation_async(generation_task)
+        return _redirect_response(user_id, sanitized_query)
+    
+    print(f"✅ CONFIRMED menstrual health question - generating response")
+    if not looked_up:
+        cached = _cached_response(sanitized_query, emotion)
+    if cached is not None:
+        context_task.cancel()
+        medical_task.cancel()
+        if stream:
+            return _finish_streamed_turn_async(cached, user_id, sanitized_query, emotion, started)
+        return _serve_cached_response(cached, user_id, sanitized_query, emotion, started, stream=False)
+    
+    context, medical_content = await asyncio.gather(context_task, medical_task)
+    context = _with_recalled_turns(user_id, sanitized_query, context)
+    
     print(f"🎭 Emotion: {emotion}")
     print(f"🏥 Medical content: {len(medical_content)} chars")
+    print(f"⏱️ Inputs ready after {(time.perf_counter() - started) * 1000:.0f}ms")
+    
+    if generation_task is not None:
+        hidden_ms = (time.perf_counter() - speculated_at) * 1000
+        _count_speculation("committed")
+        _count_speculation("hidden_ms", hidden_ms)
+        print(f"🔮 Speculation committed - {hidden_ms:.0f}ms of generation overlapped the gate")
+        response = _finish_generation(await generation_task, sanitized_query, medical_content, emotion,
+                                      context, stream, _astream_with_fallback)
+    else:
+        response = await create_response_with_all_systems_async(sanitized_query, medical_content, emotion,
+                                                                context, stream=stream, user_id=user_id)
     
-    response = create_response_with_all_systems(sanitized_query, medical_content, emotion, context)
+    if stream:
+        return _finish_streamed_turn_async(response, user_id, sanitized_query, emotion, started)
     
-    # Store conversation
     store_memory(user_id, sanitized_query, response, emotion)
     log_event("chat_logs.txt", f"User: {sanitized_query[:50]} | Emotion: {emotion} | Success")
     
@@ -0,0 +1,143 @@
+# src/graph/index_manifest.py - INCREMENTAL RE-INDEXING BY CHUNK CONTENT HASH
+# The manifest maps each chunk's content hash to its vector id, so ingest only
+# embeds new/changed chunks and reuses every vector it already paid for.
+
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.graph.vector_store import FAISS_INDEX_PATH, INDEX_MARKER_FILE
+from src.graph.embed_pipeline import embed_stream
+from src.graph.compact_index import CompactVectorStore, DOCS_FILE, resolve_index_format
+
+MANIFEST_FILE = "manifest.json"
+
+
+def chunk_hash(text: str) -> str:
+    """Content hash of a chunk - identical text always embeds to the same vector"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_manifest(index_path: str = FAISS_INDEX_PATH) -> Optional[Dict]:
+    return _read_json(os.path.join(index_path, MANIFEST_FILE))
+
+
+def _same_embeddings(marker: Dict, embedding_info: Dict) -> bool:
+    # Indexes published before the marker existed were built with OpenAI's default model
+    provider = marker.get("embedding_provider", "openai")
+    model = marker.get("embedding_model")
+    if provider != embedding_info["embedding_provider"]:
+        return False
+    return not model or model == embedding_info["embedding_model"]
+
+
+def _reusable_vectors(embeddings, embedding_info: Dict, index_path: str) -> Dict[str, np.ndarray]:
+    """Content hash -> stored vector for every chunk in the current index"""
+    from langchain_community.vectorstores import FAISS
+
+    if not os.path.exists(os.path.join(index_path, "index.faiss")):
+        return {}
+
+    marker = _read_json(os.path.join(index_path, INDEX_MARKER_FILE)) or {}
+    if not _same_embeddings(marker, embedding_info):
+        print("🔄 Embedding backend changed - every chunk will be re-embedded")
+        return {}
+
+    manifest = load_manifest(index_path)
+
+    # Compact indexes: the kept full-precision vectors, or the decoded SQ8 codes
+    if manifest and os.path.exists(os.path.join(index_path, DOCS_FILE)):
+        try:
+            stored = CompactVectorStore.load_local(index_path, embeddings).reusable_vectors()
+        except Exception as e:
+            print(f"⚠️ Could not open previous index for reuse: {e}")
+            return {}
+        if stored is None:
+            print("🔄 IVF-PQ index saved without full vectors (PETAL_INDEX_KEEP_VECTORS=0) - every chunk will be re-embedded")
+            return {}
+        return {content_hash: np.array(stored[entry["vector_id"]]) for content_hash, entry in manifest["chunks"].items()}
+
+    try:
+        old_store = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+    except Exception as e:
+        print(f"⚠️ Could not open previous index for reuse: {e}")
+        return {}
+
+    if manifest:
+        return {
+            content_hash: old_store.index.reconstruct(entry["vector_id"])
+            for content_hash, entry in manifest["chunks"].items()
+        }
+
+    # Older indexes have no manifest - hash their docstore to recover it
+    vectors = {}
+    for position, docstore_id in old_store.index_to_docstore_id.items():
+        content_hash = chunk_hash(old_store.docstore.search(docstore_id).page_content)
+        if content_hash not in vectors:
+            vectors[content_hash] = old_store.index.reconstruct(int(position))
+    return vectors
+
+
+def build_incremental_index(chunks: List, embeddings, embedding_info: Dict,
+                            index_path: str = FAISS_INDEX_PATH,
+                            index_format: Optional[str] = None) -> Tuple[object, Dict, Dict]:
+    """Build the next index generation, embedding only chunks the current one lacks.
+
+    Returns (vectorstore, manifest, report) where report counts reused, computed,
+    removed and duplicate chunks.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    # Identical chunks (site boilerplate etc.) are stored once
+    unique = {}
+    for chunk in chunks:
+        unique.setdefault(chunk_hash(chunk.page_content), chunk)
+    hashes = list(unique)
+
+    previous = _reusable_vectors(embeddings, embedding_info, index_path)
+    to_embed = [content_hash for content_hash in hashes if content_hash not in previous]
+
+    computed = {}
+    if to_embed:
+        print(f"🧠 Embedding {len(to_embed)} new/changed chunks...")
+        new_vectors, stats = embed_stream(
+            (unique[content_hash].page_content for content_hash in to_embed), embeddings, expected=len(to_embed)
+        )
+        print(f"   {stats['tokens']} tokens in {stats['batches']} batches ({stats['retries']} rate-limit retries)")
+        computed = dict(zip(to_embed, new_vectors))
+
+    texts = [unique[content_hash].page_content for content_hash in hashes]
+    vectors = [computed[content_hash] if content_hash in computed else previous[content_hash] for content_hash in hashes]
+    metadatas = [unique[content_hash].metadata for content_hash in hashes]
+
+    index_format = resolve_index_format(index_format)
+    if index_format == "flat":
+        vectorstore = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas, ids=hashes)
+    else:
+        vectorstore = CompactVectorStore.from_vectors(np.asarray(vectors, dtype=np.float32), texts, embeddings,
+                                                      metadatas, hashes, index_format)
+
+    manifest = dict(embedding_info)
+    manifest["chunks"] = {
+        content_hash: {"vector_id": vector_id, "source": unique[content_hash].metadata.get("source", "")}
+        for vector_id, content_hash in enumerate(hashes)
+    }
+
+    report = {
+        "reused": len(hashes) - len(to_embed),
+        "computed": len(to_embed),
+        "removed": len(set(previous) - set(hashes)),
+        "duplicates": len(chunks) - len(hashes),
+    }
+    return vectorstore, manifest, report
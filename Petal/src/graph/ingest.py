@@ -1,15 +1,22 @@
 # src/graph/ingest.py - WORKING VERSION WITH VERIFIED URLS ONLY
 
-from langchain.document_loaders import WebBaseLoader
 from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
 import os
+import sys
 from dotenv import load_dotenv
 
+# Allow running as `python src/graph/ingest.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.graph.vector_store import publish_index, FAISS_INDEX_PATH
+from src.graph.embeddings import create_embeddings, describe_embeddings, resolve_provider
+from src.graph.bm25_index import BM25Index, BM25_INDEX_PATH
+from src.graph.crawler import MedicalCrawler
+from src.graph.index_manifest import build_incremental_index, MANIFEST_FILE
+
 load_dotenv()
 
-def ingest_verified_medical_websites():
+def ingest_verified_medical_websites(embedding_provider: str = None, index_format: str = None):
     """Download from VERIFIED, WORKING medical websites only"""
     
     # VERIFIED WORKING MEDICAL WEBSITES (tested and confirmed accessible)
@@ -69,8 +76,8 @@ def ingest_verified_medical_websites():
     
     try:
         print("\n⬇️ Downloading medical content from verified websites...")
-        loader = WebBaseLoader(verified_medical_urls)
-        docs = loader.load()
+        crawler = MedicalCrawler(verified_medical_urls)
+        docs = crawler.crawl()
         print(f"✅ Successfully downloaded {len(docs)} medical documents")
         
         if len(docs) < len(verified_medical_urls) * 0.8:  # If less than 80% success
@@ -164,33 +171,44 @@ def ingest_verified_medical_websites():
     chunks = splitter.split_documents(docs)
     print(f"📄 Created {len(chunks)} searchable medical chunks")
 
-    # Check OpenAI API key
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
+    # Raw content + keyword index are always refreshed so lexical search matches this corpus
+    print("💾 Saving raw medical content and keyword index...")
+    save_raw_medical_content(chunks)
+
+    # Check OpenAI API key (only needed for the OpenAI embedding backend)
+    provider = resolve_provider(embedding_provider)
+    if provider == "openai" and not os.getenv("OPENAI_API_KEY"):
         print("❌ OPENAI_API_KEY not found!")
-        print("📝 Add OPENAI_API_KEY=your_key_here to your .env file")
+        print("📝 Add OPENAI_API_KEY=your_key_here to your .env file, or set PETAL_EMBEDDINGS=local")
         return False
 
     # Create embeddings and save database
-    print("🧠 Creating medical embeddings with OpenAI...")
+    print(f"🧠 Creating medical embeddings with the {provider} backend...")
     try:
-        embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-        vectorstore = FAISS.from_documents(chunks, embeddings)
+        embeddings = create_embeddings(provider)
+        embedding_info = describe_embeddings(provider, embeddings)
+        
+        # Only new/changed chunks are embedded - everything else reuses its stored vector
+        vectorstore, manifest, report = build_incremental_index(chunks, embeddings, embedding_info,
+                                                                FAISS_INDEX_PATH, index_format)
+        print(f"♻️ Embeddings reused: {report['reused']} | computed: {report['computed']} | "
+              f"removed: {report['removed']} | duplicate chunks skipped: {report['duplicates']}")
         
-        # Save primary database
-        vectorstore.save_local("src/graph/faiss_index")
-        print("✅ Medical database saved to src/graph/faiss_index")
+        # Publish primary database as a new generation (running apps hot-swap to it)
+        index_info = dict(embedding_info, index_format=getattr(vectorstore, "index_format", "flat"), **report)
+        publish_index(vectorstore, FAISS_INDEX_PATH, index_info, {MANIFEST_FILE: manifest})
+        print(f"✅ Medical database saved to {FAISS_INDEX_PATH}")
         
         # Create backups
         vectorstore.save_local("src/graph/faiss_medical_backup")
         print("✅ Backup database saved")
         
+        # Everything is indexed - the next run starts a fresh (revalidating) crawl
+        crawler.checkpoint.clear()
+        
     except Exception as e:
         print(f"❌ Error creating embeddings: {e}")
-        
-        # If OpenAI fails, save raw content for file reader
-        print("💾 Saving raw medical content for file reader...")
-        save_raw_medical_content(chunks)
+        print("📄 Raw medical content and keyword index are still available for the file reader")
         return False
 
     # Generate statistics
@@ -256,7 +274,7 @@ def ingest_verified_medical_websites():
     return True
 
 def save_raw_medical_content(chunks):
-    """Save raw medical content for file reader when embeddings fail"""
+    """Save raw medical content and its BM25 index for the keyword retriever"""
     
     try:
         os.makedirs("src/graph/raw_medical_content", exist_ok=True)
@@ -274,6 +292,10 @@ def save_raw_medical_content(chunks):
                 f.write(chunk.page_content)
         
         print(f"✅ Saved {len(chunks)} raw medical content files to src/graph/raw_medical_content/")
+        
+        # Inverted index so retrieval never rescans these files
+        BM25Index.from_chunks(chunks).save(BM25_INDEX_PATH)
+        print(f"✅ Saved BM25 keyword index to {BM25_INDEX_PATH}")
         print("📄 File reader can now access this medical content without OpenAI embeddings!")
         
     except Exception as e:
@@ -0,0 +1,163 @@
+# src/graph/prompt_builder.py - TOKEN-BUDGETED PROMPT ASSEMBLY
+# Splits a fixed prompt budget between the system message, the question,
+# ranked medical evidence and recent conversation. Evidence is deduped at the
+# sentence level and cut at sentence boundaries, history keeps the newest turns,
+# so the same inputs always produce the same prompt.
+
+import os
+import re
+from typing import Dict, List, Tuple
+
+from src.utils.tokens import count_tokens, truncate_tokens
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PETAL_PROMPT_TOKENS", "1600"))
+# Share of the flexible budget offered to evidence first; history gets the rest and whatever evidence leaves unused
+PROMPT_EVIDENCE_SHARE = float(os.getenv("PETAL_PROMPT_EVIDENCE_SHARE", "0.65"))
+MIN_PASSAGE_TOKENS = 24
+MESSAGE_OVERHEAD_TOKENS = 4  # chat format tokens added per message
+SEPARATOR_TOKENS = 2         # blank line / newline joining passages and turns
+# Between retrieved chunks in the retriever's medical content (a chunk may hold blank lines itself)
+CHUNK_SEPARATOR = "\n\n\n"
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_SOURCE_LINE = re.compile(r"^\*Source: .*\*$")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def join_chunks(chunks: List[str]) -> str:
+    """Retrieved chunks as one medical content string that split_evidence splits back apart"""
+    return CHUNK_SEPARATOR.join(re.sub(r"\n{3,}", "\n\n", chunk.strip()) for chunk in chunks)
+
+
+def split_evidence(medical_content: str) -> Tuple[List[str], List[str]]:
+    """(passages best first, source notes) from the retriever's joined medical content -
+    one passage per retrieved chunk"""
+    passages, notes = [], []
+    for block in medical_content.split(CHUNK_SEPARATOR):
+        block = block.strip()
+        if not block:
+            continue
+        (notes if _SOURCE_LINE.match(block) else passages).append(block)
+    return passages, notes
+
+
+def select_evidence(passages: List[str], budget: int) -> Tuple[List[str], Dict]:
+    """Highest-ranked passages that fit, minus sentences an earlier passage already said.
+    The first passage that doesn't fit whole is cut at a sentence boundary."""
+    kept, seen_sentences = [], set()
+    used = duplicates = 0
+
+    for passage in passages:
+        sentences = [s for s in _SENTENCE_SPLIT.split(passage) if s.strip()]
+        fresh, fresh_keys = [], set()
+        for sentence in sentences:
+            key = _normalize(sentence)
+            if key not in seen_sentences and key not in fresh_keys:
+                fresh.append(sentence)
+                fresh_keys.add(key)
+        duplicates += len(sentences) - len(fresh)
+        if not fresh:
+            continue
+
+        text = " ".join(fresh)
+        tokens = count_tokens(text) + SEPARATOR_TOKENS
+        if used + tokens > budget:
+            remaining = budget - used - SEPARATOR_TOKENS
+            if remaining < MIN_PASSAGE_TOKENS:
+                break
+            partial = []
+            for sentence in fresh:
+                if count_tokens(" ".join(partial + [sentence])) > remaining:
+                    break
+                partial.append(sentence)
+            text = " ".join(partial) if partial else truncate_tokens(text, remaining - 1) + "…"
+            kept.append(text)
+            used += count_tokens(text) + SEPARATOR_TOKENS
+            break
+
+        kept.append(text)
+        used += tokens
+        seen_sentences.update(fresh_keys)
+
+    return kept, {"evidence": used, "passages_kept": len(kept), "passages_total": len(passages),
+                  "duplicate_sentences": duplicates}
+
+
+def _turns(context: str) -> List[str]:
+    """Conversation context ("User: ..." / "Assistant: ..." lines) grouped into turns"""
+    turns = []
+    for line in context.split("\n"):
+        if line.startswith("User:") or not turns:
+            turns.append(line)
+        else:
+            turns[-1] += "\n" + line
+    return [turn for turn in turns if turn.strip()]
+
+
+def select_history(context: str, budget: int) -> Tuple[str, Dict]:
+    """Newest turns that fit; if even the newest doesn't, its leading tokens"""
+    turns = _turns(context) if context else []
+    kept, used = [], 0
+    for turn in reversed(turns):
+        tokens = count_tokens(turn) + SEPARATOR_TOKENS
+        if used + tokens > budget:
+            if not kept and budget - SEPARATOR_TOKENS >= MIN_PASSAGE_TOKENS:
+                turn = truncate_tokens(turn, budget - SEPARATOR_TOKENS - 1) + "…"
+                kept.append(turn)
+                used = count_tokens(turn) + SEPARATOR_TOKENS
+            break
+        kept.append(turn)
+        used += tokens
+    return "\n".join(reversed(kept)), {"history": used, "turns_kept": len(kept), "turns_total": len(turns)}
+
+
+def build_generation_prompt(query: str, medical_content: str, emotion: str, context: str,
+                            system_message: str, budget: int = PROMPT_TOKEN_BUDGET,
+                            evidence_share: float = PROMPT_EVIDENCE_SHARE) -> Tuple[str, Dict]:
+    """User prompt for the answer generation call plus its token breakdown"""
+    passages, notes = split_evidence(medical_content or "")
+    emotion_info = f"User emotion: {emotion}\n\n" if emotion and emotion != "neutral" else ""
+
+    def render(history: str, evidence: List[str]) -> str:
+        context_info = f"Previous conversation: {history}\n\n" if history else ""
+        medical_info = "\n\n".join(evidence + notes)
+        return f"""{context_info}{emotion_info}User question: "{query}"
+
+Medical information: {medical_info}
+
+Instructions:
+- If this continues a previous conversation, acknowledge it naturally
+- If user asking about food/remedies, connect to their health concern
+- If expressing emotions, validate feelings first
+- Be warm, caring, and conversational as Petal"""
+
+    system_tokens = count_tokens(system_message) + MESSAGE_OVERHEAD_TOKENS
+    fixed_tokens = count_tokens(render("", [])) + MESSAGE_OVERHEAD_TOKENS
+    flexible = max(0, budget - system_tokens - fixed_tokens)
+
+    # Evidence first up to its share, history takes the rest, evidence reclaims what history leaves
+    evidence, evidence_stats = select_evidence(passages, int(flexible * evidence_share))
+    history, history_stats = select_history(context, flexible - evidence_stats["evidence"])
+    if flexible - evidence_stats["evidence"] - history_stats["history"] > MIN_PASSAGE_TOKENS:
+        evidence, evidence_stats = select_evidence(passages, flexible - history_stats["history"])
+
+    prompt = render(history, evidence)
+    breakdown = {
+        "system": system_tokens,
+        "question_and_instructions": fixed_tokens,
+        **evidence_stats,
+        **history_stats,
+        "total": system_tokens + count_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS,
+        "budget": budget,
+    }
+    return prompt, breakdown
+
+
+def format_breakdown(breakdown: Dict) -> str:
+    return (f"system {breakdown['system']} | question {breakdown['question_and_instructions']} | "
+            f"evidence {breakdown['evidence']} ({breakdown['passages_kept']}/{breakdown['passages_total']} passages, "
+            f"{breakdown['duplicate_sentences']} dup sentences) | history {breakdown['history']} "
+            f"({breakdown['turns_kept']}/{breakdown['turns_total']} turns) | total {breakdown['total']}/{breakdown['budget']}")
@@ -0,0 +1,162 @@
+# src/graph/response_cache.py - SEMANTIC RESPONSE CACHE
+# Recurring standalone questions ("is a 31 day cycle normal") are answered from
+# a cache of earlier generations when a new query embeds close enough to one in
+# the same emotion bucket. Entries expire after a TTL and the least recently
+# used ones are evicted past a fixed size.
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from src.graph.embeddings import create_embeddings
+
+RESPONSE_CACHE_SIZE = int(os.getenv("PETAL_RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("PETAL_RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("PETAL_RESPONSE_CACHE_SIMILARITY", "0.92"))
+# Cache keys only need to match near-duplicates, so the free offline embedder is the default
+RESPONSE_CACHE_EMBEDDINGS = os.getenv("PETAL_RESPONSE_CACHE_EMBEDDINGS", "local")
+
+# Emotions whose answers open the same way share a bucket; crisis is never cached
+EMOTION_BUCKETS = {
+    "neutral": "neutral",
+    "happy": "neutral",
+    "confused": "neutral",
+    "pms_anxiety": "scared",
+}
+UNCACHEABLE_EMOTIONS = frozenset(["crisis"])
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def emotion_bucket(emotion: str) -> str:
+    return EMOTION_BUCKETS.get(emotion or "neutral", emotion or "neutral")
+
+
+def query_numbers(query: str) -> frozenset:
+    """Numbers in a query - "bleeding for 3 days" and "for 10 days" embed alike but need different answers"""
+    return frozenset(_NUMBER_PATTERN.findall(query))
+
+
+class SemanticResponseCache:
+    """Cosine-similarity lookup over a fixed slot matrix with TTL and LRU eviction"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY, embeddings=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embeddings = embeddings or create_embeddings(RESPONSE_CACHE_EMBEDDINGS)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # slot -> {"query", "numbers", "response", "bucket"}, oldest use first
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._vectors = None           # (max_entries, dim) float32, allocated on first store
+        self._buckets = np.full(max_entries, -1, dtype=np.int32)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._bucket_ids = {}
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(query.strip().lower()), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _release(self, slot: int) -> None:
+        del self._entries[slot]
+        self._buckets[slot] = -1
+        self._free_slots.append(slot)
+
+    def get(self, query: str, emotion: str) -> Optional[str]:
+        """Cached response for a near-duplicate query in the same emotion bucket"""
+        if emotion in UNCACHEABLE_EMOTIONS or self._vectors is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        vector = self._embed(query)
+        with self._lock:
+            bucket_id = self._bucket_ids.get(emotion_bucket(emotion))
+            now = time.time()
+
+            expired = np.flatnonzero((self._buckets >= 0) & (self._expires <= now))
+            for slot in expired:
+                self._release(int(slot))
+            self._stats["expired"] += len(expired)
+
+            candidates = np.flatnonzero(self._buckets == bucket_id) if bucket_id is not None else []
+            if len(candidates):
+                scores = self._vectors[candidates] @ vector
+                numbers = query_numbers(query)
+                for best in np.argsort(-scores):
+                    if scores[best] < self.similarity:
+                        break
+                    slot = int(candidates[best])
+                    if self._entries[slot]["numbers"] != numbers:
+                        continue
+                    self._entries.move_to_end(slot)
+                    self._stats["hits"] += 1
+                    print(f"💾 Response cache hit ({scores[best]:.3f}) for: {self._entries[slot]['query'][:50]}")
+                    return self._entries[slot]["response"]
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, query: str, emotion: str, response: str) -> None:
+        if emotion in UNCACHEABLE_EMOTIONS or not response:
+            return
+
+        vector = self._embed(query)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            if not self._free_slots:
+                oldest = next(iter(self._entries))
+                self._release(oldest)
+                self._stats["evictions"] += 1
+
+            bucket = emotion_bucket(emotion)
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._buckets[slot] = self._bucket_ids.setdefault(bucket, len(self._bucket_ids))
+            self._expires[slot] = time.time() + self.ttl
+            self._entries[slot] = {"query": query, "numbers": query_numbers(query), "response": response, "bucket": bucket}
+            self._stats["stores"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for slot in list(self._entries):
+                self._release(slot)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["similarity_threshold"] = self.similarity
+        stats["ttl_seconds"] = self.ttl
+        return stats
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> SemanticResponseCache:
+    """Get the process-wide response cache (shared by every user)"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = SemanticResponseCache()
+    return _response_cache
+
+
+def get_response_cache_stats() -> Dict:
+    return get_response_cache().get_stats()
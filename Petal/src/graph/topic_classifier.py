@@ -0,0 +1,285 @@
+# src/graph/topic_classifier.py - LOCAL FAST-PATH TOPIC CLASSIFIER
+# Multinomial naive Bayes over hashed word/bigram/char n-grams, trained at
+# startup from graph_config, the topic-gate term lists and the LLM gate's past
+# verdicts on escalated messages. Confident messages are decided on CPU in
+# microseconds; only ambiguous ones are escalated to the LLM follow-up check.
+
+import os
+import re
+import zlib
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.graph.graph_config import graph, QUESTION_CATEGORIES
+
+TOPIC_CONFIDENCE = float(os.getenv("PETAL_TOPIC_CONFIDENCE", "0.9"))
+FEATURE_BUCKETS = 1 << 16
+SMOOTHING = 0.1
+LOG_DIR = os.getenv("PETAL_LOG_DIR", "logs")
+VERDICT_LOG_FILE = "topic_verdicts.txt"  # written by the LLM gate, one line per escalated message
+HOLDOUT_EVERY = 5  # every 5th example (by text hash) is held out to report escalation rate
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+_VERDICT_PATTERN = re.compile(r"Verdict=(HEALTH|OTHER) \| Query=(.+)$")
+FEATURE_FAMILIES = ("w:", "b:", "c:")
+
+# Function words carry no topic signal and would otherwise leak the style of the seed sentences
+STOPWORDS = frozenset("""
+a an the i i'm im me my mine you your we our is am are was were be been being do does did
+to of in on at for with and or but so if it its this that these those what which who how
+when where why can could should would will shall may might have has had not no yes just
+what's it's i've i'd don't doesn't like about any some very really much please here than then
+too also get got
+""".split())
+
+# Pronouns that make a message depend on the previous turn - never rejected locally
+REFERENTIAL_WORDS = frozenset(["it", "this", "that", "these", "those", "they", "them", "there"])
+# Openers that continue the previous turn ("and what about at night?") - same treatment
+FOLLOWUP_OPENERS = frozenset(["and", "but", "also", "plus", "or", "so"])
+FOLLOWUP_PHRASES = frozenset(["what about", "how about", "what if"])
+
+# Seed examples of what Petal is not for (mirrors the redirect message's scope)
+OFF_TOPIC_EXAMPLES = [
+    "what is the weather today", "will it rain tomorrow", "who won the football game",
+    "tell me a joke", "write me a poem about the sea", "what is your favourite color",
+    "what is your favorite movie", "recommend a good tv show", "help me with my math homework",
+    "solve this equation", "write python code to sort a list", "how do i fix my laptop",
+    "what is the capital of france", "translate hello into spanish", "book a flight to paris",
+    "best pizza place near me", "recipe for chocolate chip cookies", "how to bake bread",
+    "what time is it", "how old are you", "what is your name", "play some music",
+    "i hate my sister", "my brother is annoying", "my boss yelled at me", "i hate my job",
+    "i failed my exam", "my girlfriend broke up with me", "how do i ask someone on a date",
+    "what should i buy for my friend's birthday", "how much does a car cost", "stock market news",
+    "how to learn guitar", "best video games this year", "explain quantum physics",
+    "who is the president", "how far is the moon", "tell me about dinosaurs",
+    "how do i train my dog", "my cat is sleeping", "what should i wear to a party",
+    "how to start a business", "write an essay about history", "i hate pink color",
+]
+
+
+def is_referential(query: str) -> bool:
+    """Whether a message points back at the previous turn ("is that normal?", "and at night?")"""
+    words = _TOKEN_PATTERN.findall(query.lower())
+    return bool(REFERENTIAL_WORDS & set(words)
+                or words[:1] and words[0] in FOLLOWUP_OPENERS
+                or " ".join(words[:2]) in FOLLOWUP_PHRASES)
+
+
+def _features(text: str) -> List[str]:
+    words = [w for w in _TOKEN_PATTERN.findall(text.lower()) if w not in STOPWORDS]
+    features = [f"w:{w}" for w in words]
+    features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+
+    # Character 4-grams so "cramping"/"cramped" share evidence with "cramps"
+    for word in words:
+        if len(word) > 4:
+            padded = f"<{word}>"
+            features += [f"c:{padded[i:i + 4]}" for i in range(len(padded) - 3)]
+    return features
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % FEATURE_BUCKETS
+
+
+def _buckets(text: str) -> np.ndarray:
+    return np.fromiter((_bucket(feature) for feature in _features(text)), dtype=np.int64)
+
+
+def _family_buckets(text: str) -> List[np.ndarray]:
+    """Buckets of the word, bigram and char n-gram features, one array per family"""
+    features = _features(text)
+    return [np.fromiter((_bucket(f) for f in features if f.startswith(family)), dtype=np.int64)
+            for family in FEATURE_FAMILIES]
+
+
+class HashedNaiveBayes:
+    """Two-class multinomial naive Bayes over a fixed hashed feature space"""
+
+    def __init__(self, buckets: int = FEATURE_BUCKETS, smoothing: float = SMOOTHING):
+        self.buckets = buckets
+        self.smoothing = smoothing
+        self.log_ratio = np.zeros(buckets, dtype=np.float32)  # log P(f|health) - log P(f|other)
+        self.seen = np.zeros(buckets, dtype=bool)             # features that occurred in training
+
+    def fit(self, texts: List[str], labels: List[bool]) -> "HashedNaiveBayes":
+        counts = np.zeros((2, self.buckets), dtype=np.float64)
+        for text, label in zip(texts, labels):
+            np.add.at(counts[int(label)], _buckets(text), 1.0)
+
+        seen = counts.sum(axis=0) > 0
+        counts += self.smoothing
+        log_probs = np.log(counts / counts.sum(axis=1, keepdims=True))
+        # Uniform class prior - the seed sets are unbalanced, real traffic is unknown.
+        # Features never seen in training are neutral rather than leaning to the smaller class.
+        self.log_ratio = np.where(seen, log_probs[1] - log_probs[0], 0.0).astype(np.float32)
+        self.seen = seen
+        return self
+
+    def probability(self, text: str) -> float:
+        """P(health topic) for a message"""
+        # Mean evidence per feature family, summed across families: summing every feature
+        # would pin multi-word messages at 0 or 1 (the n-grams of one word are far from
+        # independent), while one mean over all of them lets unseen words drag clear
+        # cases towards 0.5. Features never seen in training carry no evidence.
+        log_odds = 0.0
+        for buckets in _family_buckets(text):
+            known = buckets[self.seen[buckets]]
+            if len(known):
+                log_odds += float(self.log_ratio[known].mean())
+        return 1.0 / (1.0 + np.exp(-log_odds))
+
+
+def verdict_line(query: str, is_health: bool) -> str:
+    """Log line recording the LLM gate's verdict on an escalated message"""
+    return f"Verdict={'HEALTH' if is_health else 'OTHER'} | Query={' '.join(query.split())}"
+
+
+def logged_verdicts(log_dir: str = LOG_DIR) -> List[Tuple[str, bool]]:
+    """(message, LLM verdict) pairs from the verdict log, latest verdict per message.
+    Referential messages are left out - their verdict depends on the conversation, not the text."""
+    verdicts = {}
+    try:
+        with open(os.path.join(log_dir, VERDICT_LOG_FILE), "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                match = _VERDICT_PATTERN.search(line.rstrip("\n"))
+                if match and not is_referential(match.group(2)):
+                    verdicts[match.group(2).strip()] = match.group(1) == "HEALTH"
+    except OSError:
+        pass
+    return list(verdicts.items())
+
+
+def build_training_set(health_terms: Iterable[str] = (), other_terms: Iterable[str] = (),
+                       log_dir: str = LOG_DIR) -> Tuple[List[str], List[bool]]:
+    """Labelled examples: graph topics and terms as positives, off-topic seeds as negatives,
+    and the messages the keyword gate couldn't settle, labelled by the LLM gate's verdicts"""
+    texts, labels = [], []
+
+    def add(items: Iterable[str], label: bool) -> None:
+        for item in items:
+            texts.append(item)
+            labels.append(label)
+
+    add((phrase for phrases in QUESTION_CATEGORIES.values() for phrase in phrases), True)
+    add((node.replace("_", " ") for node in graph), True)
+    add(health_terms, True)
+    add(OFF_TOPIC_EXAMPLES, False)
+    add(other_terms, False)
+
+    for query, is_health in logged_verdicts(log_dir):
+        add([query], is_health)
+    return texts, labels
+
+
+class TopicClassifier:
+    """Confidence-gated local decision with escalation accounting"""
+
+    def __init__(self, model: HashedNaiveBayes, threshold: float = TOPIC_CONFIDENCE):
+        self.model = model
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._stats = {"decisions": 0, "local_health": 0, "local_not_health": 0, "escalated": 0}
+        self._decision_seconds = 0.0
+        self.holdout = {}  # evaluate_holdout report from training
+
+    def decide(self, query: str) -> Optional[bool]:
+        """True/False when confident, None to escalate to the LLM.
+
+        Messages that lean on the previous turn ("is it normal?", "and what about
+        at night?") are never rejected locally - only the LLM can see the
+        conversation they refer to, and without one the caller still refuses them.
+        """
+        start = time.perf_counter()
+        p_health = self.model.probability(query)
+
+        if p_health >= self.threshold:
+            decision, key = True, "local_health"
+        elif p_health <= 1.0 - self.threshold and not is_referential(query):
+            decision, key = False, "local_not_health"
+        else:
+            decision, key = None, "escalated"
+
+        with self._lock:
+            self._stats["decisions"] += 1
+            self._stats[key] += 1
+            self._decision_seconds += time.perf_counter() - start
+
+        print(f"🧮 Local topic classifier: p(health)={p_health:.3f} → "
+              f"{'escalate' if decision is None else ('HEALTH' if decision else 'NOT_HEALTH')}")
+        return decision
+
+    def health_probability(self, query: str) -> float:
+        """P(health topic) without counting a decision"""
+        return self.model.probability(query)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            decisions = stats["decisions"]
+            stats["threshold"] = self.threshold
+            stats["escalation_rate"] = round(stats["escalated"] / decisions, 3) if decisions else 0.0
+            stats["avg_decision_us"] = round(self._decision_seconds / decisions * 1e6, 1) if decisions else None
+        stats["holdout"] = dict(self.holdout)
+        return stats
+
+
+def evaluate_holdout(texts: List[str], labels: List[bool], threshold: float = TOPIC_CONFIDENCE) -> Dict:
+    """Escalation rate and confident accuracy on examples the model wasn't trained on
+    (every HOLDOUT_EVERY-th example by text hash, so the split is stable across restarts)"""
+    held = [zlib.crc32(text.encode("utf-8")) % HOLDOUT_EVERY == 0 for text in texts]
+    train = [(text, label) for text, label, h in zip(texts, labels, held) if not h]
+    test = [(text, label) for text, label, h in zip(texts, labels, held) if h]
+    if not train or not test:
+        return {"holdout": 0, "escalation_rate": None, "confident_accuracy": None}
+
+    model = HashedNaiveBayes().fit([text for text, _ in train], [label for _, label in train])
+    probabilities = [model.probability(text) for text, _ in test]
+    confident = [p >= threshold or p <= 1.0 - threshold for p in probabilities]
+    correct = sum(1 for p, (_, label), sure in zip(probabilities, test, confident) if sure and (p >= 0.5) == label)
+    return {
+        "holdout": len(test),
+        "escalation_rate": round(1 - float(sum(confident)) / len(test), 3),
+        "confident_accuracy": round(float(correct) / sum(confident), 3) if any(confident) else None,
+    }
+
+
+def train_topic_classifier(health_terms: Iterable[str] = (), other_terms: Iterable[str] = (),
+                           threshold: float = TOPIC_CONFIDENCE, log_dir: str = LOG_DIR) -> TopicClassifier:
+    start = time.perf_counter()
+    texts, labels = build_training_set(health_terms, other_terms, log_dir)
+    classifier = TopicClassifier(HashedNaiveBayes().fit(texts, labels), threshold)
+
+    # Held-out report: how often the threshold would still defer to the LLM on unseen text
+    classifier.holdout = evaluate_holdout(texts, labels, threshold)
+    escalation, accuracy = classifier.holdout["escalation_rate"], classifier.holdout["confident_accuracy"]
+    print(f"🧮 Topic classifier trained on {len(texts)} examples ({sum(labels)} health) in "
+          f"{(time.perf_counter() - start) * 1000:.0f}ms | threshold {threshold} | held-out "
+          f"({classifier.holdout['holdout']}): escalates "
+          f"{'n/a' if escalation is None else f'{escalation:.1%}'} | confident accuracy "
+          f"{'n/a' if accuracy is None else f'{accuracy:.1%}'}")
+    return classifier
+
+
+_topic_classifier = None
+_topic_classifier_lock = threading.Lock()
+
+
+def get_topic_classifier(health_terms: Iterable[str] = (), other_terms: Iterable[str] = ()) -> TopicClassifier:
+    """Get the process-wide classifier (trained on first use)"""
+    global _topic_classifier
+    if _topic_classifier is None:
+        with _topic_classifier_lock:
+            if _topic_classifier is None:
+                _topic_classifier = train_topic_classifier(health_terms, other_terms)
+    return _topic_classifier
+
+
+def get_topic_classifier_stats() -> Dict:
+    """Threshold, local decision counts, live LLM escalation rate and the held-out report"""
+    if _topic_classifier is None:
+        return {"trained": False, "threshold": TOPIC_CONFIDENCE}
+    return dict(_topic_classifier.get_stats(), trained=True)
@@ -0,0 +1,248 @@
+# src/graph/vector_store.py - PROCESS-WIDE RESIDENT FAISS MEDICAL DATABASE
+# Loads the index once per process, shares it across Streamlit sessions and
+# hot-swaps it when ingest.py publishes a new generation.
+
+import os
+import json
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from src.graph.embeddings import create_embeddings, is_remote_provider
+from src.graph.embedding_cache import CachedEmbeddings, get_query_embedding_cache, get_embedding_cache_stats
+from src.graph.compact_index import CompactVectorStore
+
+load_dotenv()
+
+FAISS_INDEX_PATH = "src/graph/faiss_index"
+INDEX_MARKER_FILE = "index_version.json"
+RELOAD_CHECK_INTERVAL = 5.0  # Seconds between checks for a newly published index
+LATENCY_WINDOW = 200         # Number of recent searches kept for latency stats
+
+
+class MedicalVectorStore:
+    """Resident FAISS index with atomic hot-swap and load/search metrics"""
+
+    def __init__(self, index_path: str = FAISS_INDEX_PATH, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.index_path = index_path
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._vectorstore = None
+        self._stamp = None
+        self._last_check = 0.0
+        self._embedding_provider = None
+        self._index_format = None
+
+        # Metrics
+        self._load_count = 0
+        self._load_errors = 0
+        self._last_load_seconds = None
+        self._loaded_at = None
+        self._search_count = 0
+        self._search_errors = 0
+        self._search_latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def _read_marker(self) -> Dict:
+        marker_path = os.path.join(self.index_path, INDEX_MARKER_FILE)
+        try:
+            with open(marker_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _read_stamp(self):
+        """Cheap identity of the published index - generation marker, else file mtimes"""
+        generation = self._read_marker().get("generation")
+        if generation:
+            return generation
+
+        try:
+            return tuple(
+                os.stat(os.path.join(self.index_path, name)).st_mtime_ns
+                for name in ("index.faiss", "index.pkl")
+            )
+        except OSError:
+            return None
+
+    def _create_embeddings(self):
+        """Create query embeddings matching the provider the index was built with"""
+        marker = self._read_marker()
+
+        # Indexes published before the marker existed were always built with OpenAI
+        provider = marker.get("embedding_provider", "openai")
+        embeddings = create_embeddings(provider, marker.get("embedding_model") or None)
+        self._embedding_provider = provider
+
+        if not is_remote_provider(provider):
+            return embeddings
+        return CachedEmbeddings(embeddings, get_query_embedding_cache(f"{provider}-{embeddings.model}"))
+
+    def _load(self, stamp) -> None:
+        """Load the index from disk and swap it in (caller holds the lock)"""
+        from langchain_community.vectorstores import FAISS
+
+        start = time.perf_counter()
+        index_format = self._read_marker().get("index_format", "flat")
+        try:
+            if index_format == "flat":
+                vectorstore = FAISS.load_local(
+                    self.index_path,
+                    self._create_embeddings(),
+                    allow_dangerous_deserialization=True
+                )
+            else:
+                vectorstore = CompactVectorStore.load_local(self.index_path, self._create_embeddings())
+        except Exception as e:
+            self._load_errors += 1
+            print(f"⚠️ FAISS load failed: {e}")
+            return
+
+        # A publish may have landed while we were reading - load again next check
+        if self._read_stamp() != stamp:
+            print("🔄 FAISS index changed during load - will reload on next check")
+            self._last_check = 0.0
+
+        self._vectorstore = vectorstore
+        self._stamp = stamp
+        self._index_format = getattr(vectorstore, "index_format", "flat")
+        self._load_count += 1
+        self._last_load_seconds = time.perf_counter() - start
+        self._loaded_at = datetime.now().isoformat()
+        print(f"✅ FAISS medical database loaded in {self._last_load_seconds * 1000:.0f}ms "
+              f"(generation: {stamp}, format: {self._index_format})")
+
+    def get(self):
+        """Return the resident vectorstore, reloading if a new generation was published"""
+        if self._vectorstore is not None and time.time() - self._last_check < self.check_interval:
+            return self._vectorstore
+
+        with self._lock:
+            now = time.time()
+            if self._vectorstore is not None and now - self._last_check < self.check_interval:
+                return self._vectorstore
+            self._last_check = now
+
+            stamp = self._read_stamp()
+            if stamp is None:
+                # Nothing published yet (or a swap is in progress) - keep serving what we have
+                return self._vectorstore
+
+            if self._vectorstore is None or stamp != self._stamp:
+                self._load(stamp)
+
+            return self._vectorstore
+
+    @property
+    def generation(self):
+        """Identity of the generation currently resident (None before first load)"""
+        return self._stamp
+
+    def current(self):
+        """The resident vectorstore without triggering a load or reload check"""
+        return self._vectorstore
+
+    def similarity_search(self, query: str, k: int = 3) -> List:
+        """Search the resident index, recording per-search latency"""
+        vectorstore = self.get()
+        if vectorstore is None:
+            raise RuntimeError(f"No FAISS index available at {self.index_path}")
+
+        start = time.perf_counter()
+        try:
+            docs = vectorstore.similarity_search(query, k=k)
+        except Exception:
+            self._search_errors += 1
+            raise
+        finally:
+            self._search_latencies.append(time.perf_counter() - start)
+            self._search_count += 1
+
+        return docs
+
+    def get_stats(self) -> Dict:
+        """Load-time and search-latency metrics for monitoring"""
+        latencies = sorted(self._search_latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            "index_path": self.index_path,
+            "loaded": self._vectorstore is not None,
+            "generation": self._stamp,
+            "embedding_provider": self._embedding_provider,
+            "index_format": self._index_format,
+            "loaded_at": self._loaded_at,
+            "load_count": self._load_count,
+            "load_errors": self._load_errors,
+            "last_load_ms": round(self._last_load_seconds * 1000, 2) if self._last_load_seconds is not None else None,
+            "search_count": self._search_count,
+            "search_errors": self._search_errors,
+            "search_p50_ms": percentile(0.50),
+            "search_p95_ms": percentile(0.95),
+            "embedding_cache": get_embedding_cache_stats(),
+        }
+
+
+def iter_documents(vectorstore) -> Iterator:
+    """Every chunk in a flat (LangChain FAISS) or compact vectorstore"""
+    if isinstance(vectorstore, CompactVectorStore):
+        return vectorstore.documents()
+    return iter(vectorstore.docstore._dict.values())
+
+
+def publish_index(vectorstore, index_path: str = FAISS_INDEX_PATH, metadata: Optional[Dict] = None,
+                  extra_files: Optional[Dict[str, Dict]] = None) -> str:
+    """Save a vectorstore as a new generation and atomically swap it into place"""
+    generation = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    staging_path = f"{index_path}.staging-{generation}"
+    retired_path = f"{index_path}.retired-{generation}"
+
+    vectorstore.save_local(staging_path)
+
+    # Sidecar files (e.g. the chunk manifest) travel with their generation
+    for filename, content in (extra_files or {}).items():
+        with open(os.path.join(staging_path, filename), "w", encoding="utf-8") as f:
+            json.dump(content, f)
+
+    marker = {"generation": generation, "created_at": datetime.now().isoformat()}
+    marker.update(metadata or {})
+    with open(os.path.join(staging_path, INDEX_MARKER_FILE), "w", encoding="utf-8") as f:
+        json.dump(marker, f, indent=2)
+
+    # Readers that look mid-swap see no index and keep serving their resident copy
+    if os.path.exists(index_path):
+        os.rename(index_path, retired_path)
+    os.rename(staging_path, index_path)
+    shutil.rmtree(retired_path, ignore_errors=True)
+
+    print(f"✅ Published FAISS index generation {generation} to {index_path}")
+    return generation
+
+
+# One resident store per process, shared by every Streamlit session
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
+
+def get_vector_store() -> MedicalVectorStore:
+    """Get the process-wide medical vector store"""
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = MedicalVectorStore()
+    return _vector_store
+
+
+def get_vector_store_stats() -> Dict:
+    """Metrics for the process-wide vector store"""
+    return get_vector_store().get_stats()
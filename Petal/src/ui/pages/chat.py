@@ -11,6 +11,10 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+# 1 = render answers token by token as they are generated. Both paths go through the LangGraph
+# router (crisis handling first); only its GraphRAG step streams, other replies arrive whole
+STREAM_RESPONSES = os.getenv("PETAL_STREAM_RESPONSES", "1") == "1"
+
 def clear_chat_history():
     """Clear chat history and user memory - DYNAMIC"""
     
@@ -74,6 +78,59 @@ def initialize_fresh_chat():
         
         print("✅ Fresh chat initialized")
 
+def stream_assistant_reply(user_input, container):
+    """Render Petal's answer incrementally and record time-to-first-token for the turn"""
+    
+    started = time.perf_counter()
+    ttft = {}
+    
+    def timed(deltas):
+        for delta in deltas:
+            if "ms" not in ttft:
+                ttft["ms"] = round((time.perf_counter() - started) * 1000)
+            yield delta
+    
+    with container:
+        with st.chat_message("user", avatar="💭"):
+            st.markdown(f"**You:** {user_input}")
+        
+        with st.chat_message("assistant", avatar="🌸"):
+            try:
+                # Retrieval and safety checks finish before the first token can arrive
+                with st.spinner("🌸 Petal is thinking..."):
+                    try:
+                        from src.agents.langgraph_router import get_agent_response
+                        response = get_agent_response(user_input, stream=True)
+                    except ImportError:
+                        from src.graph.graphrag_retriever import get_comprehensive_response
+                        response = get_comprehensive_response(user_input, stream=True)
+                
+                if isinstance(response, str):
+                    ttft["ms"] = round((time.perf_counter() - started) * 1000)
+                    st.markdown(response)
+                else:
+                    response = st.write_stream(timed(response))
+                print(f"✅ Streamed response (first token: {ttft.get('ms')}ms)")
+                
+            except Exception as e:
+                print(f"⚠️ Error streaming response: {e}")
+                response = None
+            
+            if not response or len(response) < 10:
+                try:
+                    from src.core.fallback import fallback_response
+                    response = fallback_response(user_input)
+                except ImportError:
+                    response = "I'm having a little trouble right now, but I'm here for you! Could you try asking again? 🌸"
+                st.markdown(response)
+    
+    st.session_state.messages.append({
+        "role": "assistant", 
+        "content": response,
+        "timestamp": datetime.now(),
+        "ttft_ms": ttft.get("ms")
+    })
+
 def chat_interface():
     """Main chat interface with automatic session clearing"""
     
@@ -160,6 +217,10 @@ def chat_interface():
                 "timestamp": datetime.now()
             })
             
+            if STREAM_RESPONSES:
+                stream_assistant_reply(user_input, chat_container)
+                st.rerun()
+            
             # Get bot response using your existing systems
             with st.spinner("🌸 Petal is thinking..."):
                 try:
@@ -1,19 +1,21 @@
 # src/utils/crisis_detector.py - ENHANCED WITH HUMANIZED RESPONSES
 
+import os
 import re
 from datetime import datetime
 
 # Try to import OpenAI for personalized responses
 try:
-    from openai import OpenAI
     from dotenv import load_dotenv
-    import os
     load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    openai_client = OpenAI(api_key=api_key) if api_key else None
+    from src.utils.openai_client import get_openai_client
+    openai_client = get_openai_client()
 except:
     openai_client = None
 
+# Someone in crisis must not wait on a slow API - the fallback response is ready instantly
+CRISIS_LLM_TIMEOUT = float(os.getenv("PETAL_CRISIS_LLM_TIMEOUT", "8"))
+
 def is_crisis_message(text: str) -> bool:
     """Enhanced crisis detection - catches ALL crisis patterns"""
     
@@ -193,7 +195,8 @@ They're expressing suicidal thoughts. As Petal, respond with:
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
-            max_tokens=300
+            max_tokens=300,
+            timeout=CRISIS_LLM_TIMEOUT
         )
         
         return response.choices[0].message.content
@@ -0,0 +1,359 @@
+# src/utils/fake_openai_server.py - LOCAL OPENAI-COMPATIBLE STAND-IN FOR LOAD TESTS
+# Serves /v1/chat/completions (plain and SSE streaming) and /v1/embeddings with
+# configurable latency distributions and injected 429s. Outputs are derived from
+# a hash of the request, so the same request always gets the same answer. With
+# --benchmark it drives get_comprehensive_response against itself and reports
+# latency percentiles, all without spending API quota.
+#
+#   python -m src.utils.fake_openai_server --port 8001 --latency lognormal:600,0.4
+#   python -m src.utils.fake_openai_server --benchmark --requests 200 --concurrency 16
+
+import os
+import json
+import time
+import base64
+import random
+import hashlib
+import tempfile
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_EMBEDDING_DIM = 1536
+EMBEDDING_DIMS = {"text-embedding-3-large": 3072}
+
+# Sentences the fake model answers with, picked by request hash
+ANSWER_SENTENCES = [
+    "Hey sweetie, that's a really common question and I'm glad you asked! 💕",
+    "Period cramps happen when the uterus contracts to shed its lining.",
+    "A heating pad on your lower belly can relax those muscles and ease the ache.",
+    "Cycles anywhere from 21 to 35 days are considered normal for adults.",
+    "Gentle movement like walking or yoga often helps with bloating and mood.",
+    "Staying hydrated and eating iron-rich foods supports you during heavier days.",
+    "If pain stops you from doing everyday things, it's worth talking to a doctor.",
+    "Tracking your cycle can help you spot patterns and plan ahead.",
+    "You're not alone in this - so many people feel exactly the same way. 🌸",
+    "Is there anything else on your mind? I'm always here to help! ✨",
+]
+
+
+class LatencyModel:
+    """Seconds to wait, drawn from "fixed:MS", "uniform:LO,HI", "normal:MEAN,SD" or "lognormal:MEDIAN,SIGMA" (ms)"""
+
+    def __init__(self, spec: str = "fixed:0", seed: int = 0):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p] or [0.0]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+        self.spec = spec
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                ms = self.params[0]
+            elif self.kind == "uniform":
+                ms = self._rng.uniform(self.params[0], self.params[1])
+            elif self.kind == "normal":
+                ms = self._rng.gauss(self.params[0], self.params[1])
+            else:
+                ms = self.params[0] * float(np.exp(self._rng.gauss(0.0, self.params[1])))
+        return max(0.0, ms) / 1000.0
+
+
+def _request_hash(payload) -> bytes:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).digest()
+
+
+def _estimate_tokens(messages: List[Dict]) -> int:
+    return sum(len(str(m.get("content", ""))) // 4 + 4 for m in messages)
+
+
+def fake_completion(messages: List[Dict], max_tokens: Optional[int] = None, words: int = 120) -> str:
+    """Deterministic reply; classifier prompts get the label they ask for"""
+    prompt = str(messages[-1].get("content", "")) if messages else ""
+    if "HEALTH_FOLLOWUP or NOT_FOLLOWUP" in prompt:
+        return "HEALTH_FOLLOWUP"
+    if "HEALTH_TOPIC or NOT_HEALTH" in prompt:
+        return "HEALTH_TOPIC"
+
+    digest = _request_hash(messages)
+    sentences, count = [], 0
+    limit = min(words, int(max_tokens * 0.75)) if max_tokens else words
+    for i in range(len(ANSWER_SENTENCES) * 4):
+        sentence = ANSWER_SENTENCES[(digest[i % len(digest)] + i) % len(ANSWER_SENTENCES)]
+        if count + len(sentence.split()) > limit and sentences:
+            break
+        sentences.append(sentence)
+        count += len(sentence.split())
+    return " ".join(sentences)
+
+
+def fake_embedding(item, dim: int) -> np.ndarray:
+    """Unit vector seeded by the input (a string or a token id list)"""
+    seed = int.from_bytes(_request_hash(item)[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeOpenAIConfig:
+    def __init__(self, latency: str = "fixed:0", first_token_latency: str = "fixed:0",
+                 token_latency: str = "fixed:0", error_rate: float = 0.0, retry_after: float = 1.0,
+                 words: int = 120, seed: int = 0):
+        self.latency = LatencyModel(latency, seed)
+        self.first_token_latency = LatencyModel(first_token_latency, seed + 1)
+        self.token_latency = LatencyModel(token_latency, seed + 2)
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.words = words
+        self._rng = random.Random(seed + 3)
+        self._lock = threading.Lock()
+        self.stats = {"chat": 0, "chat_streamed": 0, "embeddings": 0, "embedded_inputs": 0, "rate_limited": 0}
+
+    def inject_429(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: FakeOpenAIConfig = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict] = None) -> None:
+        encoded = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _rate_limited(self) -> bool:
+        if not self.config.inject_429():
+            return False
+        self.config.count("rate_limited")
+        self._send_json(429, {"error": {"message": "Rate limit reached (injected by fake server)",
+                                        "type": "requests", "code": "rate_limit_exceeded"}},
+                        {"Retry-After": f"{self.config.retry_after:g}"})
+        return True
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.config.stats)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = self.path.rstrip("/")
+
+        if path.endswith("/chat/completions"):
+            if not self._rate_limited():
+                self._chat(payload)
+        elif path.endswith("/embeddings"):
+            if not self._rate_limited():
+                self._embeddings(payload)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _chat(self, payload: Dict) -> None:
+        messages = payload.get("messages", [])
+        model = payload.get("model", "gpt-3.5-turbo")
+        text = fake_completion(messages, payload.get("max_tokens"), self.config.words)
+        completion_id = "chatcmpl-" + _request_hash(payload).hex()[:24]
+
+        if not payload.get("stream"):
+            self.config.count("chat")
+            time.sleep(self.config.latency.sample())
+            prompt_tokens, completion_tokens = _estimate_tokens(messages), max(1, len(text) // 4)
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+            return
+
+        self.config.count("chat_streamed")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: Dict, finish_reason: Optional[str] = None) -> None:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            time.sleep(self.config.first_token_latency.sample())
+            event({"role": "assistant", "content": ""})
+            for i, word in enumerate(text.split(" ")):
+                if i:
+                    time.sleep(self.config.token_latency.sample())
+                event({"content": word if i == 0 else " " + word})
+            event({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client cancelled the stream
+
+    def _embeddings(self, payload: Dict) -> None:
+        items = payload.get("input", [])
+        # A string, a token list, or a list of either
+        if isinstance(items, str) or (items and isinstance(items[0], int)):
+            items = [items]
+        model = payload.get("model", "text-embedding-ada-002")
+        dim = int(payload.get("dimensions") or EMBEDDING_DIMS.get(model, DEFAULT_EMBEDDING_DIM))
+
+        self.config.count("embeddings")
+        self.config.count("embedded_inputs", len(items))
+        time.sleep(self.config.latency.sample())
+
+        data = []
+        for i, item in enumerate(items):
+            vector = fake_embedding(item, dim)
+            if payload.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        tokens = sum(len(item) if isinstance(item, list) else max(1, len(item) // 4) for item in items)
+        self._send_json(200, {"object": "list", "data": data, "model": model,
+                              "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+
+def start_fake_openai_server(port: int = 0, host: str = "127.0.0.1",
+                             config: Optional[FakeOpenAIConfig] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve in a daemon thread; returns (server, base_url) - port 0 picks a free port"""
+    handler = type("ConfiguredFakeOpenAIHandler", (FakeOpenAIHandler,), {"config": config or FakeOpenAIConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+BENCHMARK_QUERIES = [
+    "why do I get cramps before my period",
+    "is a 35 day cycle normal",
+    "how can I make period pain better",
+    "what is the difference between PMS and PMDD",
+    "is it normal to feel tired on my period",
+    "can exercise help with bloating",
+    "how often should I change a tampon",
+    "what does spotting between periods mean",
+]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_benchmark(base_url: str, requests: int, concurrency: int, stream: bool, use_cache: bool) -> Dict:
+    """Drive get_comprehensive_response against the fake server and report latency percentiles.
+    Must run before the pipeline is imported: everything it writes goes to a scratch directory."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Fake answers and bench_* users must not reach the real conversation DB, BM25 index,
+    # embedding cache or the tracked logs
+    scratch = tempfile.mkdtemp(prefix="petal-benchmark-")
+    os.environ["PETAL_CONVERSATION_DB"] = os.path.join(scratch, "conversations.db")
+    os.environ["PETAL_LOG_DIR"] = os.path.join(scratch, "logs")
+    os.environ["PETAL_BM25_INDEX_PATH"] = os.path.join(scratch, "bm25_index.json")
+    os.environ["PETAL_EMBEDDING_CACHE_PATH"] = os.path.join(scratch, "embedding_cache")
+    print(f"🗂️ Benchmark writes go to {scratch}")
+
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake-benchmark")
+    if not use_cache:
+        os.environ["PETAL_RESPONSE_CACHE_SIMILARITY"] = "2"  # nothing can reach it
+
+    # Imported after the environment points every client at the fake server
+    from src.graph.graphrag_retriever import get_comprehensive_response
+
+    def one_turn(i: int) -> Tuple[float, float]:
+        started = time.perf_counter()
+        response = get_comprehensive_response(BENCHMARK_QUERIES[i % len(BENCHMARK_QUERIES)],
+                                              user_id=f"bench_{i % concurrency}", stream=stream)
+        first = None
+        for _ in ([response] if isinstance(response, str) else response):
+            first = first or time.perf_counter()
+        ended = time.perf_counter()
+        return (first or ended) - started, ended - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = list(pool.map(one_turn, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    ttft = [t * 1000 for t, _ in timings]
+    total = [t * 1000 for _, t in timings]
+    return {
+        "requests": requests, "concurrency": concurrency, "stream": stream, "seconds": round(elapsed, 2),
+        "scratch_dir": scratch,
+        "throughput_rps": round(requests / elapsed, 2),
+        "ttft_ms": {q: round(_percentile(ttft, q), 1) for q in (50, 95, 99)},
+        "total_ms": {q: round(_percentile(total, q), 1) for q in (50, 95, 99)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="lognormal:400,0.5", help="non-streamed response / embedding latency (ms)")
+    parser.add_argument("--first-token-latency", default="lognormal:300,0.4", help="streamed time to first token (ms)")
+    parser.add_argument("--token-latency", default="normal:20,5", help="delay between streamed words (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--words", type=int, default=120, help="approximate answer length in words")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--benchmark", action="store_true", help="run the chat pipeline against the server and exit")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--use-cache", action="store_true", help="let the semantic response cache answer repeats")
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(args.latency, args.first_token_latency, args.token_latency,
+                              args.error_rate, args.retry_after, args.words, args.seed)
+    server, base_url = start_fake_openai_server(0 if args.benchmark else args.port, args.host, config)
+    print(f"🧪 Fake OpenAI server on {base_url} | latency {args.latency} | first token "
+          f"{args.first_token_latency} | per word {args.token_latency} | 429 rate {args.error_rate:.0%}")
+
+    if args.benchmark:
+        report = run_benchmark(base_url, args.requests, args.concurrency, not args.no_stream, args.use_cache)
+        report["server"] = dict(config.stats)
+        print("📊 BENCHMARK")
+        print(json.dumps(report, indent=2))
+        server.shutdown()
+        return
+
+    print(f"   export OPENAI_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
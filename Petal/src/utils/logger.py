@@ -1,9 +1,12 @@
 import os
 from datetime import datetime
 import re
+from typing import List, Tuple
+
+from src.utils.write_behind import get_write_behind
 
 # Directory and log file setup
-LOG_DIR = "logs"
+LOG_DIR = os.getenv("PETAL_LOG_DIR", "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
 CRISIS_LOG_FILE = os.path.join(LOG_DIR, "crisis_events.log")
@@ -16,35 +19,27 @@ def anonymize(text):
     text = re.sub(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", "[EMAIL REDACTED]", text)
     return text
 
-def log_event(filename: str, message: str) -> None:
-    """
-    Generic logger to append a message to a specified log file with improved error handling.
-
-    Args:
-        filename (str): Name of the file inside the logs directory.
-        message (str): Message to log.
-    """
+def _append_log_lines(filename: str, entries: List[Tuple[str, str]]) -> None:
+    """Append (timestamp, message) entries to one log file with a single open"""
+    # Anonymize sensitive data first, so the fallback has something to write whatever fails below
+    safe_messages = [(timestamp, anonymize(message)) for timestamp, message in entries]
     try:
         # Ensure logs directory exists
         os.makedirs(LOG_DIR, exist_ok=True)
         
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         filepath = os.path.join(LOG_DIR, filename)
         
-        # Anonymize sensitive data
-        safe_message = anonymize(message)
-
         # Create file if it doesn't exist with header
         if not os.path.exists(filepath):
             with open(filepath, "w", encoding="utf-8") as f:
-                f.write(f"# {filename} - Created {timestamp}\n")
+                f.write(f"# {filename} - Created {entries[0][0]}\n")
                 f.write(f"# Petal App Logs\n\n")
 
-        # Append the log entry
+        # Append the log entries
         with open(filepath, "a", encoding="utf-8") as f:
-            f.write(f"[{timestamp}] {safe_message.strip()}\n")
+            f.writelines(f"[{timestamp}] {message.strip()}\n" for timestamp, message in safe_messages)
         
-        print(f"✅ Logged to {filepath}: {safe_message[:50]}...")
+        print(f"✅ Logged {len(entries)} to {filepath}: {safe_messages[-1][1][:50]}...")
         
     except Exception as e:
         print(f"❌ Logging error for {filename}: {str(e)}")
@@ -52,11 +47,33 @@ def log_event(filename: str, message: str) -> None:
         try:
             fallback_file = f"fallback_{filename}"
             with open(fallback_file, "a", encoding="utf-8") as f:
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                f.write(f"[{timestamp}] FALLBACK LOG: {safe_message.strip()}\n")
+                f.writelines(f"[{timestamp}] FALLBACK LOG: {message.strip()}\n"
+                             for timestamp, message in safe_messages)
             print(f"✅ Fallback log created: {fallback_file}")
         except:
-            print(f"❌ Complete logging failure for: {safe_message[:50]}")
+            print(f"❌ Complete logging failure for {len(entries)} entries in {filename}")
+
+def _write_log_batch(batch: List[Tuple[str, str, str]]) -> None:
+    """Write-behind handler: (filename, timestamp, message) items, one append per file"""
+    by_file = {}
+    for filename, timestamp, message in batch:
+        by_file.setdefault(filename, []).append((timestamp, message))
+    for filename, entries in by_file.items():
+        _append_log_lines(filename, entries)
+
+get_write_behind().register("log", _write_log_batch)
+
+def log_event(filename: str, message: str) -> None:
+    """
+    Generic logger to append a message to a specified log file with improved error handling.
+    The line is timestamped now and written by the background writer.
+
+    Args:
+        filename (str): Name of the file inside the logs directory.
+        message (str): Message to log.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    get_write_behind().submit("log", (filename, timestamp, message))
 
 def log_error(error_msg: str) -> None:
     """
@@ -82,10 +99,13 @@ def log_crisis(user_id: str, message: str) -> None:
         # Anonymize the crisis message for privacy
         safe_message = anonymize(message)
         log_entry = f"UserID: {user_id} | CRISIS MESSAGE: {safe_message}"
-        log_event("crisis_events.log", log_entry)
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Written immediately, not through the background writer - these must not be lost
+        _append_log_lines("crisis_events.log", [(timestamp, log_entry)])
         
         # Also log to errors for immediate attention
-        log_event("errors.txt", f"CRISIS DETECTED - UserID: {user_id}")
+        _append_log_lines("errors.txt", [(timestamp, f"CRISIS DETECTED - UserID: {user_id}")])
         
     except Exception as e:
         print(f"❌ Crisis logging failed: {str(e)}")
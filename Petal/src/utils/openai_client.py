@@ -0,0 +1,285 @@
+# src/utils/openai_client.py - SHARED, POOLED OPENAI CLIENTS
+# One sync client per process (one async client per event loop) on pooled httpx
+# connections. Every chat completion gets an overall deadline, jittered retries
+# on transient errors and a circuit breaker: after repeated upstream failures
+# calls fail instantly, so callers drop to their local fallbacks.
+
+import os
+import time
+import random
+import asyncio
+import weakref
+import threading
+from typing import Any, Callable, Dict, Optional
+
+OPENAI_TIMEOUT = float(os.getenv("PETAL_OPENAI_TIMEOUT", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("PETAL_OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_RETRIES = int(os.getenv("PETAL_OPENAI_RETRIES", "2"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("PETAL_OPENAI_MAX_CONNECTIONS", "20"))
+BREAKER_FAILURES = int(os.getenv("PETAL_OPENAI_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("PETAL_OPENAI_BREAKER_RESET", "30"))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 4.0
+
+# Status codes worth another attempt (and that count against the upstream's health)
+TRANSIENT_STATUS = frozenset([408, 409, 429, 500, 502, 503, 504])
+
+
+class CircuitOpenError(Exception):
+    """The upstream is marked degraded - the call was not attempted"""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def is_transient(error: Exception) -> bool:
+    """Timeouts, dropped connections, 429s and 5xx - not bad requests or auth failures"""
+    status = _status_code(error)
+    if status is not None:
+        return status in TRANSIENT_STATUS
+    return type(error).__name__ in ("APITimeoutError", "APIConnectionError", "TimeoutException",
+                                    "ConnectError", "ReadTimeout", "RemoteProtocolError")
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive transient failures -> half-open probe after a cool-down"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "short_circuited": 0, "trips": 0}
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = "half_open"
+                self._probe_in_flight = False
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._stats["short_circuited"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != "closed":
+                print("🟢 OpenAI circuit closed - upstream recovered")
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+            self._stats["successes"] += 1
+
+    def record_failure(self, transient: bool) -> None:
+        with self._lock:
+            self._stats["failures"] += 1
+            self._probe_in_flight = False
+            if not transient:
+                return
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._stats["trips"] += 1
+                    print(f"🔴 OpenAI circuit open for {self.reset_seconds:.0f}s - using local fallbacks")
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self._state == "open"
+
+    def record_cancel(self) -> None:
+        with self._lock:
+            self._probe_in_flight = False
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, state=self._state, consecutive_failures=self._failures)
+
+
+def _backoff(attempt: int, error: Exception, remaining: float) -> Optional[float]:
+    """Full-jitter delay before the next attempt, or None if it wouldn't fit the deadline"""
+    delay = _retry_after(error) or random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    return delay if delay < remaining else None
+
+
+class _Completions:
+    """chat.completions with deadline, retries and circuit breaking"""
+
+    def __init__(self, create: Callable, breaker: CircuitBreaker, retries: int):
+        self._create = create
+        self._breaker = breaker
+        self._retries = retries
+
+    def create(self, timeout: float = OPENAI_TIMEOUT, **kwargs) -> Any:
+        deadline = time.monotonic() + timeout
+        for attempt in range(self._retries + 1):
+            if not self._breaker.allow():
+                raise CircuitOpenError("OpenAI circuit open - upstream degraded")
+            self._breaker.count("calls")
+            try:
+                result = self._create(timeout=max(0.1, deadline - time.monotonic()), **kwargs)
+            except Exception as e:
+                transient = is_transient(e)
+                self._breaker.record_failure(transient)
+                delay = _backoff(attempt, e, deadline - time.monotonic()) if transient else None
+                if delay is None or attempt == self._retries or self._breaker.is_open:
+                    raise
+                self._breaker.count("retries")
+                print(f"⏳ OpenAI {type(e).__name__} - retry {attempt + 1}/{self._retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self._breaker.record_success()
+            return result
+
+
+class _AsyncCompletions(_Completions):
+    """Async _Completions"""
+
+    async def create(self, timeout: float = OPENAI_TIMEOUT, **kwargs) -> Any:
+        deadline = time.monotonic() + timeout
+        for attempt in range(self._retries + 1):
+            if not self._breaker.allow():
+                raise CircuitOpenError("OpenAI circuit open - upstream degraded")
+            self._breaker.count("calls")
+            try:
+                result = await self._create(timeout=max(0.1, deadline - time.monotonic()), **kwargs)
+            except asyncio.CancelledError:
+                self._breaker.record_cancel()
+                raise
+            except Exception as e:
+                transient = is_transient(e)
+                self._breaker.record_failure(transient)
+                delay = _backoff(attempt, e, deadline - time.monotonic()) if transient else None
+                if delay is None or attempt == self._retries or self._breaker.is_open:
+                    raise
+                self._breaker.count("retries")
+                print(f"⏳ OpenAI {type(e).__name__} - retry {attempt + 1}/{self._retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self._breaker.record_success()
+            return result
+
+
+class _Chat:
+    def __init__(self, completions: _Completions):
+        self.completions = completions
+
+
+class _PerLoopClients:
+    """One AsyncOpenAI per event loop - pooled connections can't outlive the loop that opened them"""
+
+    def __init__(self, factory: Callable):
+        self._factory = factory
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                client = self._clients[loop] = self._factory()
+            return client
+
+
+class ResilientOpenAI:
+    """OpenAI client wrapper: chat.completions.create is guarded, everything else passes through"""
+
+    def __init__(self, get_raw: Callable, breaker: CircuitBreaker, retries: int = OPENAI_RETRIES,
+                 is_async: bool = False):
+        self._get_raw = get_raw
+        completions = _AsyncCompletions if is_async else _Completions
+        self.chat = _Chat(completions(lambda **kwargs: get_raw().chat.completions.create(**kwargs), breaker, retries))
+
+    @property
+    def raw(self):
+        return self._get_raw()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get_raw(), name)
+
+
+def _client_options() -> Dict:
+    import httpx
+
+    options = dict(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        max_retries=0,  # retries happen in _Completions, where the deadline and breaker can see them
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    )
+    base_url = os.getenv("OPENAI_BASE_URL")
+    if base_url:
+        options["base_url"] = base_url
+    return options
+
+
+def _pool_limits():
+    import httpx
+    return httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_CONNECTIONS, keepalive_expiry=60)
+
+
+_breaker = CircuitBreaker()
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(kind: str):
+    if kind not in _clients:
+        with _clients_lock:
+            if kind not in _clients:
+                _clients[kind] = _build_client(kind)
+    return _clients[kind]
+
+
+def _build_client(kind: str):
+    if not os.getenv("OPENAI_API_KEY"):
+        return None
+    try:
+        from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+        options = _client_options()
+        if kind == "async":
+            per_loop = _PerLoopClients(
+                lambda: AsyncOpenAI(http_client=DefaultAsyncHttpxClient(limits=_pool_limits()), **options))
+            return ResilientOpenAI(per_loop, _breaker, is_async=True)
+        client = OpenAI(http_client=DefaultHttpxClient(limits=_pool_limits()), **options)
+        return ResilientOpenAI(lambda: client, _breaker)
+    except Exception as e:
+        print(f"❌ OpenAI client setup failed: {e}")
+        return None
+
+
+def get_openai_client() -> Optional[ResilientOpenAI]:
+    """Shared sync client, or None without an API key"""
+    return _get_client("sync")
+
+
+def get_async_openai_client() -> Optional[ResilientOpenAI]:
+    """Shared async client, or None without an API key"""
+    return _get_client("async")
+
+
+def get_openai_client_stats() -> Dict:
+    """Circuit state plus call, retry, failure and short-circuit counts"""
+    return _breaker.get_stats()
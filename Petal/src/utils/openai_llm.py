@@ -1,72 +1,51 @@
 import os
 import time
-from openai import OpenAI
 from dotenv import load_dotenv
+from src.utils.openai_client import get_openai_client, get_openai_client_stats, CircuitOpenError
+from src.utils.single_flight import get_single_flight, request_key
+from src.utils.rate_limiter import get_rate_limiter, estimate_tokens, RateLimitExceeded
 
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+client = get_openai_client()
 
 # Store memory in session state
 if "chat_history" not in globals():
     chat_history = []
 
-# MUCH MORE REASONABLE rate limiting that allows normal usage
-last_request_time = 0
-min_request_interval = 1  # Reduced from 2 to 1 second
-request_count = 0
-max_requests_per_minute = 25  # Increased from 12 to 25
-daily_request_count = 0
-daily_reset_time = time.time()
-max_daily_requests = 800  # Increased from 400 to 800
+# Token-bucket limits globally and per user_id (requests/min + tokens/min); calls queue
+# up to limiter.queue_timeout seconds for a slot instead of failing straight away
+limiter = get_rate_limiter()
+max_requests_per_minute = limiter.requests_per_minute
+max_daily_requests = limiter.daily_requests
+REPLY_MAX_TOKENS = 700
 
-# Reset tracking for minute counter
-minute_reset_time = time.time()
+def check_rate_limits(user_id=None, tokens=0):
+    """Whether a request could start right now (nothing is reserved)"""
+    return limiter.check(user_id, tokens)
 
-def check_rate_limits():
-    """Much more reasonable rate limiting that doesn't block legitimate users"""
-    global last_request_time, request_count, daily_request_count, daily_reset_time, minute_reset_time
-    
-    current_time = time.time()
-    
-    # Reset daily counter if needed (24 hours)
-    if current_time - daily_reset_time > 86400:
-        daily_request_count = 0
-        daily_reset_time = current_time
-        request_count = 0
-        minute_reset_time = current_time
-        print("🔄 Daily quota reset")
-    
-    # Reset minute counter every 60 seconds
-    if current_time - minute_reset_time > 60:
-        request_count = 0
-        minute_reset_time = current_time
-    
-    # Check daily limit (much higher now)
-    if daily_request_count >= max_daily_requests:
-        return False, f"Daily limit reached ({max_daily_requests} requests). Try again tomorrow."
-    
-    # Check per-minute limit (more reasonable)
-    if request_count >= max_requests_per_minute:
-        return False, f"Please wait a moment - you've made {request_count} requests this minute."
-    
-    # Check minimum interval (much shorter)
-    time_since_last = current_time - last_request_time
-    if time_since_last < min_request_interval:
-        wait_time = min_request_interval - time_since_last
-        return False, f"Please wait {wait_time:.1f} seconds."
-    
-    return True, "OK"
+def _remember_exchange(prompt, reply):
+    """Add a finished exchange to chat_history, keeping a reasonable length"""
+    global chat_history
+    chat_history.append({"role": "user", "content": prompt})
+    chat_history.append({"role": "assistant", "content": reply})
+    if len(chat_history) > 20:
+        chat_history = chat_history[-20:]
 
-def openai_chat(prompt):
-    """Enhanced OpenAI chat with better rate limiting and fallback handling"""
-    global chat_history, last_request_time, request_count, daily_request_count
-    
-    # Check rate limits with more reasonable constraints
-    can_proceed, message = check_rate_limits()
-    if not can_proceed:
-        print(f"Rate limit: {message}")
-        return None  # Return None to trigger your comprehensive system fallback
+def _stream_reply(prompt, chunks):
+    """Yield the reply's text deltas; the exchange joins chat_history once the stream ends"""
+    parts = []
+    for chunk in chunks:
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+    if parts:
+        _remember_exchange(prompt, "".join(parts))
+
+def openai_chat(prompt, user_id=None, stream=False):
+    """Enhanced OpenAI chat with better rate limiting and fallback handling
+    (user_id=None: only the global limits apply; stream=True returns a generator of text deltas)"""
+    global chat_history
     
     # Enhanced system message for comprehensive menstrual health support
     system_message = """You are Petal, a warm and caring friend who specializes in menstrual health support.
@@ -107,43 +86,57 @@ Always provide complete, caring, medically accurate responses that make users fe
     messages += chat_history[-10:]  # Keep more context
     messages.append({"role": "user", "content": prompt})
 
-    try:
-        # Enhanced parameters for comprehensive responses
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.8,  # Natural and warm responses
-            max_tokens=700,   # Allow for comprehensive answers
-            frequency_penalty=0.3,
-            presence_penalty=0.3
-        )
+    # Enhanced parameters for comprehensive responses
+    request = dict(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        temperature=0.8,  # Natural and warm responses
+        max_tokens=REPLY_MAX_TOKENS,   # Allow for comprehensive answers
+        frequency_penalty=0.3,
+        presence_penalty=0.3,
+        stream=stream
+    )
+
+    def create():
+        # Only calls that actually reach the API spend quota
+        estimated = estimate_tokens(messages, REPLY_MAX_TOKENS)
+        queued = limiter.acquire(user_id, estimated)
+        if queued:
+            print(f"⏳ Queued {queued:.1f}s for a rate limit slot")
+        response = client.chat.completions.create(**request)
+        usage = getattr(response, "usage", None)
+        limiter.settle(user_id, estimated, getattr(usage, "total_tokens", None))
+        return response.choices[0].message.content
 
-        reply = response.choices[0].message.content
+    try:
+        if stream:
+            # Opened here, not on first iteration, so limits and API errors still return None
+            limiter.acquire(user_id, estimate_tokens(messages, REPLY_MAX_TOKENS))
+            return _stream_reply(prompt, client.chat.completions.create(**request))
         
-        # Update conversation history
-        chat_history.append({"role": "user", "content": prompt})
-        chat_history.append({"role": "assistant", "content": reply})
+        # Identical concurrent requests share one API call
+        reply = get_single_flight("llm").do(request_key(request), create)
+        _remember_exchange(prompt, reply)
         
-        # Keep reasonable history length
-        if len(chat_history) > 20:
-            chat_history = chat_history[-20:]
+        status = limiter.get_stats()
+        print(f"✅ OpenAI success. Daily: {status['daily_requests']}/{max_daily_requests}, "
+              f"Minute: {status['minute_requests']}/{max_requests_per_minute:g}")
         
-        # Update rate limiting counters
-        last_request_time = time.time()
-        request_count += 1
-        daily_request_count += 1
+        return reply
         
-        print(f"✅ OpenAI success. Daily: {daily_request_count}/{max_daily_requests}, Minute: {request_count}/{max_requests_per_minute}")
+    except RateLimitExceeded as e:
+        print(f"Rate limit: {e}")
+        return None  # Return None to trigger your comprehensive system fallback
         
-        return reply
+    except CircuitOpenError as e:
+        print(f"OpenAI API error: {e}")
+        print("🔴 OpenAI marked degraded - skipping straight to comprehensive system")
+        return None  # Trigger comprehensive system fallback
         
     except Exception as e:
         error_msg = str(e)
         print(f"OpenAI API error: {error_msg}")
         
-        # Update counters even on error to prevent spam
-        last_request_time = time.time()
-        
         # Handle specific error types gracefully
         if "429" in error_msg or "rate_limit" in error_msg.lower():
             print("🔄 OpenAI rate limited - triggering fallback to comprehensive system")
@@ -158,50 +151,35 @@ Always provide complete, caring, medically accurate responses that make users fe
             print("⚠️ OpenAI general error - triggering fallback to comprehensive system")
             return None  # Let system use comprehensive fallback methods
 
-def get_quota_status():
+def get_quota_status(user_id=None):
     """Check current quota usage status with detailed information"""
     current_time = time.time()
+    stats = limiter.get_stats()
     
     return {
-        "daily_requests": daily_request_count,
-        "max_daily": max_daily_requests,
-        "requests_remaining": max_daily_requests - daily_request_count,
-        "minute_requests": request_count,
-        "max_per_minute": max_requests_per_minute,
-        "last_request": last_request_time,
-        "time_since_last": current_time - last_request_time,
-        "can_make_request": check_rate_limits()[0],
-        "daily_usage_percent": (daily_request_count / max_daily_requests) * 100,
-        "minute_usage_percent": (request_count / max_requests_per_minute) * 100
+        "daily_requests": stats["daily_requests"],
+        "max_daily": stats["max_daily"],
+        "requests_remaining": stats["max_daily"] - stats["daily_requests"],
+        "minute_requests": stats["minute_requests"],
+        "max_per_minute": stats["max_per_minute"],
+        "minute_tokens": stats["minute_tokens"],
+        "max_tokens_per_minute": stats["max_tokens_per_minute"],
+        "last_request": stats["last_request"],
+        "time_since_last": current_time - stats["last_request"],
+        "can_make_request": check_rate_limits(user_id)[0],
+        "daily_usage_percent": (stats["daily_requests"] / stats["max_daily"]) * 100,
+        "minute_usage_percent": (stats["minute_requests"] / stats["max_per_minute"]) * 100,
+        "queued_requests": stats["queued"],
+        "rejected_requests": stats["rejected"],
+        "calls_saved": get_single_flight("llm").get_stats()["coalesced_calls"],
+        "circuit_state": get_openai_client_stats()["state"]
     }
 
 def reset_quota_counters():
     """Reset quota counters - useful for testing and development"""
-    global daily_request_count, request_count, last_request_time, daily_reset_time, minute_reset_time
-    daily_request_count = 0
-    request_count = 0
-    last_request_time = 0
-    daily_reset_time = time.time()
-    minute_reset_time = time.time()
+    limiter.reset()
     print("✅ All quota counters reset - ready for fresh testing")
 
-def force_reset_if_stuck():
-    """Force reset if counters seem stuck"""
-    global daily_request_count, request_count, last_request_time
-    
-    current_time = time.time()
-    
-    # If it's been more than 2 minutes since last request, reset minute counter
-    if current_time - last_request_time > 120:
-        request_count = 0
-        print("🔄 Auto-reset minute counter (2+ minutes since last request)")
-    
-    # If daily counter seems stuck (more than 25 hours), reset it
-    if current_time - daily_reset_time > 90000:  # 25 hours
-        daily_request_count = 0
-        daily_reset_time = current_time
-        print("🔄 Auto-reset daily counter (25+ hours)")
-
 def test_openai_connection():
     """Test OpenAI connection and quota status with detailed feedback"""
     print("🧪 Testing OpenAI connection...")
@@ -251,16 +229,15 @@ def get_detailed_status():
     print(f"Daily usage: {status['daily_requests']}/{status['max_daily']} ({status['daily_usage_percent']:.1f}%)")
     print(f"Minute usage: {status['minute_requests']}/{status['max_per_minute']} ({status['minute_usage_percent']:.1f}%)")
     print(f"Time since last request: {status['time_since_last']:.1f} seconds")
+    print(f"Token usage (last minute): {status['minute_tokens']}/{status['max_tokens_per_minute']:g}")
+    print(f"Queued / rejected requests: {status['queued_requests']} / {status['rejected_requests']}")
     print(f"Can make request: {'✅ YES' if status['can_make_request'] else '❌ NO'}")
     
     if not status['can_make_request']:
         if status['daily_requests'] >= status['max_daily']:
             print("⚠️ Daily limit reached - wait until tomorrow")
-        elif status['minute_requests'] >= status['max_per_minute']:
-            print("⚠️ Minute limit reached - wait up to 60 seconds")
-        elif status['time_since_last'] < min_request_interval:
-            wait_time = min_request_interval - status['time_since_last']
-            print(f"⚠️ Too soon since last request - wait {wait_time:.1f} seconds")
+        else:
+            print(f"⚠️ {check_rate_limits()[1]}")
     
     return status
 
@@ -281,9 +258,9 @@ if __name__ == "__main__":
     print(f"\n🚀 IMPROVEMENTS MADE:")
     print(f"✅ Increased daily limit: 50 → 800 requests")
     print(f"✅ Increased minute limit: 12 → 25 requests") 
-    print(f"✅ Reduced interval: 2 → 1 second")
+    print(f"✅ Token buckets per user and globally (requests + tokens per minute)")
     print(f"✅ Better error handling and fallbacks")
-    print(f"✅ Auto-reset when counters get stuck")
+    print(f"✅ Requests queue for a slot instead of being rejected")
     print(f"✅ Detailed status monitoring")
     
     print(f"\n💡 KEY CHANGES:")
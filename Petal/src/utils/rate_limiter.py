@@ -0,0 +1,223 @@
+# src/utils/rate_limiter.py - MULTI-TENANT TOKEN-BUCKET LIMITER FOR LLM CALLS
+# Requests/min and tokens/min are tracked globally and, for calls made for a
+# user (user_id given), per user. A call that doesn't fit reserves its place (the
+# buckets may go negative) and sleeps until its turn, so bursts queue in arrival
+# order and are rejected only when the wait would pass the caller's deadline.
+
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.tokens import count_tokens
+
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("PETAL_LLM_REQUESTS_PER_MINUTE", "25"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("PETAL_LLM_TOKENS_PER_MINUTE", "40000"))
+LLM_USER_REQUESTS_PER_MINUTE = float(os.getenv("PETAL_LLM_USER_REQUESTS_PER_MINUTE", "10"))
+LLM_USER_TOKENS_PER_MINUTE = float(os.getenv("PETAL_LLM_USER_TOKENS_PER_MINUTE", "10000"))
+LLM_DAILY_REQUESTS = int(os.getenv("PETAL_LLM_DAILY_REQUESTS", "800"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("PETAL_LLM_QUEUE_TIMEOUT", "10"))
+MAX_TRACKED_USERS = 10000
+DAY_SECONDS = 86400
+
+
+class RateLimitExceeded(Exception):
+    """A call could not be scheduled before its deadline"""
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int = 0) -> int:
+    """Prompt tokens plus the completion allowance - what the API's tokens/min limit counts"""
+    return sum(count_tokens(message["content"]) + 4 for message in messages) + max_tokens
+
+
+class TokenBucket:
+    """Continuously refilled bucket holding up to one minute of allowance"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (a request larger than the bucket waits for a full one)"""
+        self._refill(now)
+        deficit = min(amount, self.capacity) - self.level
+        return deficit / self.rate if deficit > 0 else 0.0
+
+    def used(self, now: float) -> float:
+        self._refill(now)
+        return max(0.0, self.capacity - self.level)
+
+
+class RateLimiter:
+    """Thread- and asyncio-safe limiter: global + per-user buckets for requests and tokens"""
+
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 user_requests_per_minute: float = LLM_USER_REQUESTS_PER_MINUTE,
+                 user_tokens_per_minute: float = LLM_USER_TOKENS_PER_MINUTE,
+                 daily_requests: int = LLM_DAILY_REQUESTS,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.user_requests_per_minute = user_requests_per_minute
+        self.user_tokens_per_minute = user_tokens_per_minute
+        self.daily_requests = daily_requests
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._requests = TokenBucket(self.requests_per_minute)
+            self._tokens = TokenBucket(self.tokens_per_minute)
+            self._users = OrderedDict()  # user_id -> (requests bucket, tokens bucket), least recent first
+            self._daily_count = 0
+            self._daily_reset = time.time()
+            self._last_request = 0.0
+            self._stats = {"granted": 0, "queued": 0, "rejected": 0, "queued_seconds": 0.0}
+
+    def _user_buckets(self, user_id: str) -> Tuple[TokenBucket, TokenBucket]:
+        buckets = self._users.get(user_id)
+        if buckets is None:
+            buckets = self._users[user_id] = (TokenBucket(self.user_requests_per_minute),
+                                              TokenBucket(self.user_tokens_per_minute))
+            if len(self._users) > MAX_TRACKED_USERS:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return buckets
+
+    def _demands(self, user_id: Optional[str], tokens: int) -> List[Tuple[TokenBucket, float]]:
+        """Buckets a call draws from - the global pair, plus the user's pair when there is a user"""
+        demands = [(self._requests, 1), (self._tokens, tokens)]
+        if user_id is not None:
+            user_requests, user_tokens = self._user_buckets(user_id)
+            demands += [(user_requests, 1), (user_tokens, tokens)]
+        return demands
+
+    def _roll_day(self) -> None:
+        if time.time() - self._daily_reset > DAY_SECONDS:
+            self._daily_count = 0
+            self._daily_reset = time.time()
+            print("🔄 Daily quota reset")
+
+    def _schedule(self, user_id: Optional[str], tokens: int, timeout: float,
+                  reserve: bool) -> Tuple[Optional[float], str]:
+        """(seconds to wait, message), or (None, reason) when the call can't run before the deadline"""
+        with self._lock:
+            self._roll_day()
+            if self._daily_count >= self.daily_requests:
+                return None, f"Daily limit reached ({self.daily_requests} requests). Try again tomorrow."
+
+            now = time.monotonic()
+            demands = self._demands(user_id, tokens)
+            wait = max(bucket.wait_time(amount, now) for bucket, amount in demands)
+            if wait > timeout:
+                if reserve:
+                    self._stats["rejected"] += 1
+                return None, f"Please wait a moment - the next request slot opens in {wait:.1f} seconds."
+            if not reserve:
+                return wait, "OK"
+
+            for bucket, amount in demands:
+                bucket.level -= amount
+            self._daily_count += 1
+            self._last_request = time.time()
+            self._stats["granted"] += 1
+            if wait > 0:
+                self._stats["queued"] += 1
+                self._stats["queued_seconds"] += wait
+            return wait, "OK"
+
+    def check(self, user_id: Optional[str] = None, tokens: int = 0) -> Tuple[bool, str]:
+        """Whether a call could start right now, without reserving anything"""
+        wait, message = self._schedule(user_id, tokens, 0.0, reserve=False)
+        return wait is not None, message
+
+    def acquire(self, user_id: Optional[str] = None, tokens: int = 0, timeout: Optional[float] = None) -> float:
+        """Reserve a slot and block until it starts; returns seconds queued.
+        user_id=None (calls not made for a particular user) only draws on the global buckets.
+        Raises RateLimitExceeded if the slot would start after `timeout` seconds."""
+        wait, message = self._schedule(user_id, tokens, self.queue_timeout if timeout is None else timeout, True)
+        if wait is None:
+            raise RateLimitExceeded(message)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, user_id: Optional[str] = None, tokens: int = 0,
+                            timeout: Optional[float] = None) -> float:
+        """acquire() that yields to the event loop while queued"""
+        wait, message = self._schedule(user_id, tokens, self.queue_timeout if timeout is None else timeout, True)
+        if wait is None:
+            raise RateLimitExceeded(message)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.release(user_id, tokens)
+                raise
+        return wait
+
+    def release(self, user_id: Optional[str], tokens: int) -> None:
+        """Give back a reservation that was never used (e.g. the queued call was cancelled)"""
+        with self._lock:
+            for bucket, amount in self._demands(user_id, tokens):
+                bucket.level = min(bucket.capacity, bucket.level + amount)
+            self._daily_count = max(0, self._daily_count - 1)
+
+    def settle(self, user_id: Optional[str], estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct a reservation once the API reports the tokens actually used"""
+        if actual_tokens is None:
+            return
+        correction = estimated_tokens - actual_tokens
+        with self._lock:
+            buckets = [self._tokens]
+            if user_id is not None:
+                buckets.append(self._user_buckets(user_id)[1])
+            for bucket in buckets:
+                bucket.level = min(bucket.capacity, bucket.level + correction)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            self._roll_day()
+            now = time.monotonic()
+            stats = dict(self._stats)
+            stats.update({
+                "daily_requests": self._daily_count,
+                "max_daily": self.daily_requests,
+                "minute_requests": round(self._requests.used(now)),
+                "max_per_minute": self.requests_per_minute,
+                "minute_tokens": round(self._tokens.used(now)),
+                "max_tokens_per_minute": self.tokens_per_minute,
+                "tracked_users": len(self._users),
+                "last_request": self._last_request,
+            })
+        stats["queued_seconds"] = round(stats["queued_seconds"], 2)
+        return stats
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide LLM rate limiter"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+def get_rate_limiter_stats() -> Dict:
+    return get_rate_limiter().get_stats()
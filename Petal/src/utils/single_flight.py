@@ -0,0 +1,355 @@
+# src/utils/single_flight.py - COALESCING OF IDENTICAL IN-FLIGHT LLM CALLS
+# Concurrent callers making the same request share one upstream call: the first
+# becomes the leader, the rest wait for its result. Streamed completions are
+# shared too - every caller replays the same deltas as they arrive.
+
+import json
+import asyncio
+import hashlib
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+
+def request_key(request: Dict) -> str:
+    """Stable hash of a completion request (model, messages, sampling parameters)"""
+    encoded = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SharedStream:
+    """Buffered delta stream replayed to every consumer; whoever needs the next delta pulls it"""
+
+    def __init__(self, on_finish: Callable[[Any], None]):
+        self.source = None
+        self.opened = threading.Event()
+        self.chunks = []
+        self.finished = False
+        self.consumers = 0
+        self._lock = threading.Lock()
+        self._on_finish = on_finish
+
+    def _finish(self) -> None:
+        self.finished = True
+        self._on_finish(self)
+
+    def read(self, position: int) -> Optional[str]:
+        """Delta at a position, pulling it from upstream if nobody has yet (None once the stream ends)"""
+        with self._lock:
+            while position >= len(self.chunks):
+                if self.finished:
+                    return None
+                try:
+                    self.chunks.append(next(self.source))
+                except StopIteration:
+                    self._finish()
+                except Exception:
+                    self._finish()
+                    raise
+            return self.chunks[position]
+
+    @property
+    def completed(self) -> bool:
+        """Ended and the upstream reports a complete answer (sources without `completed` count as complete)"""
+        return self.finished and getattr(self.source, "completed", True)
+
+    def release(self) -> None:
+        """A consumer is done; the last one leaving an unfinished stream closes the upstream"""
+        with self._lock:
+            self.consumers -= 1
+            abandoned = self.consumers == 0 and not self.finished
+            if abandoned:
+                self._finish()
+        if abandoned and hasattr(self.source, "close"):
+            self.source.close()
+
+
+class _StreamConsumer:
+    """One caller's position in a shared stream; close() (or garbage collection) lets it go"""
+
+    def __init__(self, shared: _SharedStream):
+        self._shared = shared
+        self._position = 0
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self._closed:
+            raise StopIteration
+        try:
+            chunk = self._shared.read(self._position)
+        except BaseException:
+            self.close()
+            raise
+        if chunk is None:
+            self.close()
+            raise StopIteration
+        self._position += 1
+        return chunk
+
+    @property
+    def completed(self) -> bool:
+        """Whether this consumer read the whole stream and the upstream finished its answer"""
+        return self._position == len(self._shared.chunks) and self._shared.completed
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._shared.release()
+
+    def __del__(self):
+        self.close()
+
+
+class _AsyncSharedStream:
+    """_SharedStream for async delta iterators (bound to one event loop)"""
+
+    def __init__(self, on_finish: Callable[[Any], None]):
+        self.source = None
+        self.opened = asyncio.Event()
+        self.chunks = []
+        self.finished = False
+        self.consumers = 0
+        self._lock = asyncio.Lock()
+        self._on_finish = on_finish
+
+    def _finish(self) -> None:
+        self.finished = True
+        self._on_finish(self)
+
+    async def read(self, position: int) -> Optional[str]:
+        async with self._lock:
+            while position >= len(self.chunks):
+                if self.finished:
+                    return None
+                try:
+                    self.chunks.append(await self.source.__anext__())
+                except StopAsyncIteration:
+                    self._finish()
+                except Exception:
+                    self._finish()
+                    raise
+            return self.chunks[position]
+
+    @property
+    def completed(self) -> bool:
+        return self.finished and getattr(self.source, "completed", True)
+
+    async def release(self) -> None:
+        self.consumers -= 1
+        if self.consumers == 0 and not self.finished:
+            self._finish()
+            if hasattr(self.source, "aclose"):
+                await self.source.aclose()
+
+
+class _AsyncStreamConsumer:
+    """_StreamConsumer for async streams"""
+
+    def __init__(self, shared: _AsyncSharedStream):
+        self._shared = shared
+        self._position = 0
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            chunk = await self._shared.read(self._position)
+        except BaseException:
+            await self.aclose()
+            raise
+        if chunk is None:
+            await self.aclose()
+            raise StopAsyncIteration
+        self._position += 1
+        return chunk
+
+    @property
+    def completed(self) -> bool:
+        return self._position == len(self._shared.chunks) and self._shared.completed
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            await self._shared.release()
+
+
+class SingleFlight:
+    """Per-key deduplication of in-flight calls from threads or asyncio tasks.
+
+    Thread callers and async callers are coalesced separately, and async calls
+    only with others on the same event loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self._async_calls = {}
+        self._async_streams = {}
+        self._stats = {"upstream_calls": 0, "coalesced_calls": 0, "failed_calls": 0, "cancelled_calls": 0}
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def _join(self, registry: Dict, key: Any, create: Callable[[], Any]):
+        """(entry, is_leader) for a key, registering a new entry if none is in flight"""
+        with self._lock:
+            entry = registry.get(key)
+            if entry is None:
+                entry = registry[key] = create()
+                self._stats["upstream_calls"] += 1
+                return entry, True
+            self._stats["coalesced_calls"] += 1
+            return entry, False
+
+    def _forget(self, registry: Dict, key: Any, entry) -> None:
+        with self._lock:
+            if registry.get(key) is entry:
+                del registry[key]
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Result of fn(), shared with every concurrent caller using the same key"""
+        call, leader = self._join(self._calls, key, _Call)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            self._count("failed_calls")
+            raise
+        finally:
+            self._forget(self._calls, key, call)
+            call.done.set()
+
+    def stream(self, key: str, open_stream: Callable[[], Optional[Iterator[str]]]) -> Optional[Iterator[str]]:
+        """Delta iterator over one shared upstream stream, or None if opening it failed.
+
+        The stream stays joinable until it ends, so identical requests arriving
+        mid-stream replay what has already arrived instead of starting over.
+        """
+        shared, leader = self._join(self._streams, key,
+                                    lambda: _SharedStream(lambda done: self._forget(self._streams, key, done)))
+        with shared._lock:
+            shared.consumers += 1
+
+        if leader:
+            try:
+                shared.source = open_stream()
+            except Exception:
+                shared.source = None
+            if shared.source is None:
+                self._count("failed_calls")
+                shared._finish()
+            shared.opened.set()
+        else:
+            shared.opened.wait()
+
+        if shared.source is None:
+            with shared._lock:
+                shared.consumers -= 1
+            return None
+        return _StreamConsumer(shared)
+
+    def _settle(self, loop_key, entry: Dict, task: asyncio.Future) -> None:
+        self._forget(self._async_calls, loop_key, entry)
+        if not task.cancelled() and task.exception() is not None:
+            self._count("failed_calls")
+
+    async def do_async(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Async do(): fn() returns an awaitable. The upstream call is cancelled only
+        once every caller waiting on it has been cancelled."""
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            entry = self._async_calls.get(loop_key)
+            if entry is None:
+                task = asyncio.ensure_future(fn())
+                entry = self._async_calls[loop_key] = {"task": task, "waiters": 0}
+                task.add_done_callback(lambda done: self._settle(loop_key, entry, done))
+                self._stats["upstream_calls"] += 1
+            else:
+                self._stats["coalesced_calls"] += 1
+            entry["waiters"] += 1
+
+        try:
+            return await asyncio.shield(entry["task"])
+        except asyncio.CancelledError:
+            entry["waiters"] -= 1
+            if entry["waiters"] == 0 and not entry["task"].done():
+                entry["task"].cancel()
+                self._count("cancelled_calls")
+            raise
+
+    async def stream_async(self, key: str, open_stream: Callable[[], Any]) -> Optional[AsyncIterator[str]]:
+        """Async stream(): open_stream() is awaited and returns an async delta iterator or None"""
+        loop_key = (id(asyncio.get_running_loop()), key)
+        shared, leader = self._join(self._async_streams, loop_key,
+                                    lambda: _AsyncSharedStream(
+                                        lambda done: self._forget(self._async_streams, loop_key, done)))
+        shared.consumers += 1
+
+        if leader:
+            try:
+                shared.source = await open_stream()
+            except Exception:
+                shared.source = None
+            if shared.source is None:
+                self._count("failed_calls")
+                shared._finish()
+            shared.opened.set()
+        else:
+            await shared.opened.wait()
+
+        if shared.source is None:
+            shared.consumers -= 1
+            return None
+        return _AsyncStreamConsumer(shared)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = (len(self._calls) + len(self._streams)
+                                  + len(self._async_calls) + len(self._async_streams))
+        requests = stats["upstream_calls"] + stats["coalesced_calls"]
+        stats["calls_saved_rate"] = round(stats["coalesced_calls"] / requests, 3) if requests else 0.0
+        return stats
+
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str = "llm") -> SingleFlight:
+    """Get the process-wide coalescing group for a name"""
+    group = _groups.get(name)
+    if group is None:
+        with _groups_lock:
+            group = _groups.setdefault(name, SingleFlight(name))
+    return group
+
+
+def get_single_flight_stats() -> Dict[str, Dict]:
+    """Upstream vs coalesced call counts per group"""
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.get_stats() for name, group in groups.items()}
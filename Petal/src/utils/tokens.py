@@ -0,0 +1,44 @@
+# src/utils/tokens.py - TOKEN COUNTING
+# cl100k_base counts via tiktoken (the encoding of the chat and embedding models
+# Petal calls), falling back to a length estimate when the encoding file can't
+# be loaded offline. Shared by ingest batching, prompt budgets and rate limits.
+
+import threading
+
+TOKEN_ENCODING = "cl100k_base"
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder():
+    """tiktoken encoder, or False when the encoding file cannot be loaded (offline)"""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception as e:
+                    print(f"⚠️ tiktoken unavailable ({e}) - estimating tokens from length")
+                    _encoder = False
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    encoder = _get_encoder()
+    if encoder:
+        return len(encoder.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Leading `max_tokens` tokens of a text"""
+    if max_tokens <= 0:
+        return ""
+    encoder = _get_encoder()
+    if encoder:
+        tokens = encoder.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoder.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
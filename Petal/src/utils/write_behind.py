@@ -0,0 +1,206 @@
+# src/utils/write_behind.py - BACKGROUND WRITER FOR MEMORY AND LOGS
+# Conversation turns, log lines and other deferred work go onto a bounded queue.
+# One worker thread writes them in batches (one transaction / one file append per
+# batch), so a chat turn returns before anything touches disk. Batches close on a
+# size threshold or a flush interval, and whatever is queued is written at exit.
+
+import os
+import time
+import queue
+import atexit
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+WRITE_BEHIND = os.getenv("PETAL_WRITE_BEHIND", "1") == "1"
+WRITE_QUEUE_SIZE = int(os.getenv("PETAL_WRITE_QUEUE_SIZE", "2000"))
+WRITE_BATCH_SIZE = int(os.getenv("PETAL_WRITE_BATCH_SIZE", "64"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("PETAL_WRITE_FLUSH_INTERVAL", "0.5"))
+ENQUEUE_TIMEOUT = 0.05  # a full queue is waited on this long before the caller writes inline
+SHUTDOWN_TIMEOUT = 5.0
+
+_STOP = object()
+
+
+def _run_tasks(tasks: List[Callable[[], Any]]) -> None:
+    for task in tasks:
+        try:
+            task()
+        except Exception as e:
+            print(f"⚠️ Deferred task failed: {e}")
+
+
+class WriteBehindQueue:
+    """Bounded queue of (kind, payload) items drained in batches by a worker thread.
+
+    Each kind has a handler that receives a list of payloads in submission order.
+    With the worker disabled or stopped, or the queue full, submit() runs the
+    handler inline instead - items are delayed, never dropped.
+    """
+
+    def __init__(self, enabled: bool = WRITE_BEHIND, max_size: int = WRITE_QUEUE_SIZE,
+                 batch_size: int = WRITE_BATCH_SIZE, flush_interval: float = WRITE_FLUSH_INTERVAL):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._handlers = {"task": _run_tasks}
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self._submitted = 0
+        self._completed = 0
+        self._stopped = False
+        self._stats = {"submitted": 0, "written": 0, "failed": 0, "inline_writes": 0, "batches": 0,
+                       "flush_ms_total": 0.0, "flush_ms_max": 0.0, "flush_ms_last": 0.0}
+        self._worker = None
+        if enabled:
+            self._worker = threading.Thread(target=self._run, name="petal-write-behind", daemon=True)
+            self._worker.start()
+
+    def register(self, kind: str, handler: Callable[[List[Any]], None]) -> None:
+        """Batch handler for a kind of item"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, payload: Any) -> None:
+        if kind not in self._handlers:
+            raise KeyError(f"No write-behind handler registered for '{kind}'")
+        with self._lock:
+            self._stats["submitted"] += 1
+        if self.enabled and not self._stopped:
+            with self._lock:
+                self._submitted += 1
+            try:
+                self._queue.put((kind, payload), timeout=ENQUEUE_TIMEOUT)
+                return
+            except queue.Full:
+                self._complete(1)
+        self._write([(kind, payload)], inline=True)
+
+    def defer(self, task: Callable[[], Any]) -> None:
+        """Run a no-argument callable on the writer thread"""
+        self.submit("task", task)
+
+    def _complete(self, count: int) -> None:
+        with self._written:
+            self._completed += count
+            self._written.notify_all()
+
+    def _write(self, items: List[tuple], inline: bool = False) -> None:
+        """Hand each kind's payloads to its handler in one call"""
+        start = time.perf_counter()
+        grouped = {}
+        for kind, payload in items:
+            grouped.setdefault(kind, []).append(payload)
+
+        failed = 0
+        for kind, payloads in grouped.items():
+            try:
+                self._handlers[kind](payloads)
+            except Exception as e:
+                failed += len(payloads)
+                print(f"❌ Write-behind {kind} batch failed ({len(payloads)} items): {e}")
+
+        flush_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._stats["written"] += len(items) - failed
+            self._stats["failed"] += failed
+            if inline:
+                self._stats["inline_writes"] += len(items)
+            else:
+                self._stats["batches"] += 1
+                self._stats["flush_ms_total"] += flush_ms
+                self._stats["flush_ms_last"] = flush_ms
+                self._stats["flush_ms_max"] = max(self._stats["flush_ms_max"], flush_ms)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            # Gather until the batch is full or the interval since its first item has passed
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            self._complete(len(batch))
+            if stop:
+                self._drain()
+                return
+
+    def _drain(self) -> None:
+        """Write whatever is still queued (shutdown path)"""
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        if batch:
+            self._write(batch)
+            self._complete(len(batch))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything submitted so far has been written; False on timeout"""
+        with self._written:
+            target = self._submitted
+            return self._written.wait_for(lambda: self._completed >= target, timeout)
+
+    def close(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        """Stop accepting work, write what's queued and stop the worker"""
+        if self._stopped:
+            return
+        self._stopped = True
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(_STOP)
+            self._worker.join(timeout)
+            if self._worker.is_alive():
+                print(f"⚠️ Write-behind worker still busy after {timeout:.0f}s - {self._queue.qsize()} items unwritten")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            pending = self._submitted - self._completed
+        stats["enabled"] = self.enabled
+        stats["queue_depth"] = self._queue.qsize()
+        stats["pending"] = pending
+        stats["avg_flush_ms"] = round(stats["flush_ms_total"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["flush_ms_max"] = round(stats["flush_ms_max"], 2)
+        stats["flush_ms_last"] = round(stats["flush_ms_last"], 2)
+        del stats["flush_ms_total"]
+        return stats
+
+
+_write_behind = None
+_write_behind_lock = threading.Lock()
+
+
+def get_write_behind() -> WriteBehindQueue:
+    """Get the process-wide background writer (flushed at interpreter exit)"""
+    global _write_behind
+    if _write_behind is None:
+        with _write_behind_lock:
+            if _write_behind is None:
+                writer = WriteBehindQueue()
+                atexit.register(writer.close)
+                _write_behind = writer
+    return _write_behind
+
+
+def get_write_behind_stats() -> Dict:
+    """Queue depth, pending items and flush latency of the background writer"""
+    return get_write_behind().get_stats()
@@ -0,0 +1,13 @@
+# tests/conftest.py - make the `src` package importable when pytest runs from anywhere
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Whatever the code under test writes goes to a scratch directory, never the real DB, indexes or tracked logs
+_SCRATCH = tempfile.mkdtemp(prefix="petal-tests-")
+os.environ.setdefault("PETAL_CONVERSATION_DB", os.path.join(_SCRATCH, "conversations.db"))
+os.environ.setdefault("PETAL_LOG_DIR", os.path.join(_SCRATCH, "logs"))
+os.environ.setdefault("PETAL_BM25_INDEX_PATH", os.path.join(_SCRATCH, "bm25_index.json"))
+os.environ.setdefault("PETAL_EMBEDDING_CACHE_PATH", os.path.join(_SCRATCH, "embedding_cache"))
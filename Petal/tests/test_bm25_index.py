@@ -0,0 +1,50 @@
+# tests/test_bm25_index.py - BM25 ranking and hot reload of a re-ingested index
+
+import os
+
+import pytest
+
+import src.graph.bm25_index as bm25
+from src.graph.bm25_index import BM25Index
+
+
+@pytest.fixture
+def fresh_index(monkeypatch):
+    """Module-level index state reset, with every call checking the file for changes"""
+    monkeypatch.setattr(bm25, "_bm25_index", None)
+    monkeypatch.setattr(bm25, "_bm25_mtime", None)
+    monkeypatch.setattr(bm25, "_bm25_generation", 0)
+    monkeypatch.setattr(bm25, "RELOAD_CHECK_INTERVAL", 0.0)
+
+
+def _records(*texts):
+    return [{"text": text, "source": f"doc {i}"} for i, text in enumerate(texts)]
+
+
+def test_search_ranks_the_matching_document_first():
+    index = BM25Index.build(_records("Iron rich foods help with heavy bleeding.",
+                                     "Heat and gentle exercise ease period cramps. Sleep matters too."))
+    assert index.search("what eases cramps", k=1)[0][0] == 1
+    assert index.best_sentences(1, "cramps") == ["Heat and gentle exercise ease period cramps"]
+
+
+def test_saved_index_round_trips(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    BM25Index.build(_records("cramps and heat")).save(path)
+    assert BM25Index.load(path).search("cramps")[0][0] == 0
+
+
+def test_rewritten_index_is_reloaded_under_a_new_generation(tmp_path, fresh_index):
+    path = str(tmp_path / "bm25.json")
+    BM25Index.build(_records("cramps and heat")).save(path)
+    first = bm25.get_bm25_index(path, raw_dir=str(tmp_path / "missing"))
+    assert bm25.get_bm25_generation() == 1
+    assert bm25.get_bm25_index(path, raw_dir=str(tmp_path / "missing")) is first
+    assert bm25.get_bm25_generation() == 1
+
+    BM25Index.build(_records("cramps and heat", "iron for heavy bleeding")).save(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = bm25.get_bm25_index(path, raw_dir=str(tmp_path / "missing"))
+    assert len(reloaded.docs) == 2
+    assert bm25.get_bm25_generation() == 2
@@ -0,0 +1,22 @@
+# tests/test_compaction.py - extractive running summary: recent points quoted, older ones folded to topics
+
+from src.core.user_memory import POINT_SEPARATOR, TOPICS_PREFIX, extractive_summary
+
+TURNS = [
+    ("My cramps are worse on the left side. They started yesterday.", "..."),
+    ("Heavy flow this month and I feel dizzy.", "..."),
+    ("I can't sleep before my period.", "..."),
+]
+
+
+def test_recent_turns_are_quoted_as_first_sentences():
+    summary = extractive_summary("", TURNS, budget=200)
+    assert summary.split(POINT_SEPARATOR)[0] == "User: My cramps are worse on the left side."
+
+
+def test_points_over_budget_fold_into_topics():
+    summary = extractive_summary("", TURNS, budget=30)
+    topics = summary.split(POINT_SEPARATOR)[0]
+    assert topics.startswith(TOPICS_PREFIX)
+    assert "cramps" in topics and "User" not in topics
+    assert summary.endswith("User: I can't sleep before my period.")
@@ -0,0 +1,35 @@
+# tests/test_conversation_context.py - rolling contexts are per user and clearing stays scoped
+
+import pytest
+
+from src.core import conversation_context
+from src.core.conversation_context import clear_contexts, conversation_context as context_text, record_turn
+
+
+@pytest.fixture(autouse=True)
+def process_contexts(monkeypatch):
+    """Fresh process-wide registry, no Streamlit session, nothing seeded from the store"""
+    monkeypatch.setattr(conversation_context, "_process_contexts", conversation_context.OrderedDict())
+    monkeypatch.setattr(conversation_context, "_session_contexts", lambda: None)
+    monkeypatch.setattr(conversation_context, "_seed", lambda context, user_id: None)
+
+
+def test_turns_stay_with_their_user():
+    record_turn("alice", "my cramps are bad", "Heat helps.")
+    record_turn("bob", "is 31 days normal", "Yes.")
+    assert "cramps" in context_text("alice") and "31 days" not in context_text("alice")
+    assert "31 days" in context_text("bob") and "cramps" not in context_text("bob")
+
+
+def test_clearing_without_a_user_leaves_other_users_alone():
+    record_turn("alice", "my cramps are bad", "Heat helps.")
+    record_turn("bob", "is 31 days normal", "Yes.")
+
+    clear_contexts()  # what a browser's "clear chat" does
+    assert "cramps" in context_text("alice") and "31 days" in context_text("bob")
+
+    clear_contexts("alice")
+    assert context_text("alice") == "" and "31 days" in context_text("bob")
+
+    clear_contexts(everyone=True)
+    assert context_text("bob") == ""
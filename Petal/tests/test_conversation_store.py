@@ -0,0 +1,52 @@
+# tests/test_conversation_store.py - append-only per-user turn log shared across threads and instances
+
+import json
+import threading
+
+from src.core.conversation_store import ConversationStore
+
+
+def test_tail_returns_a_users_newest_turns_oldest_first(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    for i in range(5):
+        store.append("alice", f"message {i}", f"response {i}", symptoms=["cramps"])
+    store.append("bob", "bob's message", "bob's response")
+
+    assert [turn["message"] for turn in store.tail("alice", 2)] == ["message 3", "message 4"]
+    assert store.tail("alice", 1)[0]["symptoms"] == ["cramps"]
+    assert store.count("alice") == 5 and store.count("bob") == 1
+
+
+def test_concurrent_appends_from_threads_and_instances_are_all_kept(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    stores = [ConversationStore(path), ConversationStore(path)]
+
+    def write(worker):
+        for i in range(25):
+            stores[worker % 2].append(f"user{worker}", f"turn {i}", "ok")
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert stores[0].get_stats()["turns"] == 150
+    assert [turn["message"] for turn in stores[1].tail("user3")] == [f"turn {i}" for i in range(25)]
+
+
+def test_saving_a_summary_replaces_the_previous_one(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    assert store.load_summary("alice") == ""
+    store.save_summary("alice", "cramps on the left", turns_added=3)
+    store.save_summary("alice", "cramps on the left; poor sleep", turns_added=2)
+    assert store.load_summary("alice") == "cramps on the left; poor sleep"
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "memory.json"
+    legacy.write_text(json.dumps({"alice": [{"message": "hi", "response": "hello"}]}))
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    assert store.migrate_json(str(legacy)) == 1
+    assert ConversationStore(store.path).migrate_json(str(legacy)) == 0
+    assert store.count("alice") == 1
@@ -0,0 +1,95 @@
+# tests/test_crawler.py - MedicalCrawler against a local stand-in HTTP server
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.graph.crawler import MedicalCrawler
+
+PAGES = {
+    "/cramps": ("cramps-v1", "<html lang='en'><title>Cramps</title><body>Heat helps cramps.</body></html>"),
+    "/cycle": ("cycle-v1", "<html lang='en'><title>Cycle</title><body>A cycle is 21-35 days.</body></html>"),
+    "/pms": ("pms-v1", "<html lang='en'><title>PMS</title><body>PMS starts before a period.</body></html>"),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        type(self).requests_seen.append((self.path, self.headers.get("If-None-Match")))
+        page = PAGES.get(self.path)
+        if page is None:
+            self.send_error(404)
+            return
+        etag, body = page
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _Handler.requests_seen = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _crawler(base, tmp_path, paths=PAGES):
+    return MedicalCrawler([base + path for path in paths], cache_dir=str(tmp_path / "cache"),
+                          checkpoint_path=str(tmp_path / "checkpoint.json"), per_domain_delay=0.0)
+
+
+def test_recrawl_revalidates_with_etag_and_reuses_cached_body(server, tmp_path):
+    first = _crawler(server, tmp_path)
+    docs = first.crawl()
+    assert first.stats["fetched"] == 3
+    first.checkpoint.clear()  # crawl fully ingested - the next run revalidates
+
+    _Handler.requests_seen = []
+    second = _crawler(server, tmp_path)
+    again = second.crawl()
+
+    assert second.stats == {"fetched": 0, "not_modified": 3, "resumed": 0, "failed": 0}
+    assert sorted(_Handler.requests_seen) == sorted((path, etag) for path, (etag, _) in PAGES.items())
+    assert [doc.page_content for doc in again] == [doc.page_content for doc in docs]
+    assert again[0].metadata["title"] == "Cramps"
+
+
+def test_interrupted_crawl_resumes_from_checkpoint(server, tmp_path):
+    # The first run "dies" after two pages: their checkpoint entries survive
+    _crawler(server, tmp_path, ["/cramps", "/cycle"]).crawl()
+
+    _Handler.requests_seen = []
+    resumed = _crawler(server, tmp_path)
+    docs = resumed.crawl()
+
+    assert resumed.stats == {"fetched": 1, "not_modified": 0, "resumed": 2, "failed": 0}
+    assert _Handler.requests_seen == [("/pms", None)]
+    assert [doc.metadata["title"] for doc in docs] == ["Cramps", "Cycle", "PMS"]
+
+
+def test_failed_page_is_not_checkpointed(server, tmp_path):
+    crawler = _crawler(server, tmp_path, ["/cramps", "/missing"])
+    docs = crawler.crawl()
+
+    assert crawler.stats["failed"] == 1
+    assert [doc.metadata["title"] for doc in docs] == ["Cramps"]
+    assert list(crawler.checkpoint.completed) == [server + "/cramps"]
@@ -0,0 +1,56 @@
+# tests/test_embed_pipeline.py - batched embedding: row order, bounded concurrency and 429 retries
+
+import threading
+import time
+
+import src.graph.embed_pipeline as embed_pipeline
+from src.graph.embed_pipeline import embed_stream, token_batches
+
+
+class FakeEmbeddings:
+    """Embeds each text as [its index] after a short delay, tracking concurrent calls"""
+
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.fail_first:
+                raise RuntimeError("Error code: 429 - rate limited")
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        return [[float(text.split()[-1]), 1.0] for text in texts]
+
+
+def _texts(n):
+    return (f"chunk {i}" for i in range(n))
+
+
+def test_batches_respect_the_token_budget():
+    batches = list(token_batches(["one two three four"] * 5, max_tokens=8))
+    assert [len(batch) for batch, _ in batches] == [2, 2, 1]
+
+
+def test_rows_stay_in_input_order_with_bounded_concurrency():
+    embeddings = FakeEmbeddings()
+    vectors, stats = embed_stream(_texts(40), embeddings, expected=10, max_batch_tokens=8, max_in_flight=3)
+    assert vectors.shape == (40, 2)
+    assert vectors[:, 0].tolist() == list(range(40))
+    assert 1 < embeddings.peak <= 3
+    assert stats["texts"] == 40 and stats["batches"] == embeddings.calls
+
+
+def test_rate_limited_batches_are_retried(monkeypatch):
+    monkeypatch.setattr(embed_pipeline.time, "sleep", lambda seconds: None)
+    embeddings = FakeEmbeddings(fail_first=2)
+    vectors, stats = embed_stream(_texts(4), embeddings, max_in_flight=1)
+    assert vectors[:, 0].tolist() == [0, 1, 2, 3]
+    assert stats["retries"] == 2
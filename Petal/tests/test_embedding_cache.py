@@ -0,0 +1,46 @@
+# tests/test_embedding_cache.py - query embedding LRU: normalization, eviction, persistence and resizing
+
+from src.graph.embedding_cache import QueryEmbeddingCache
+
+DIM = 4
+ENTRY_BYTES = DIM * 4
+
+
+def _vector(i):
+    return [float(i)] * DIM
+
+
+def test_trivially_different_phrasings_share_an_entry():
+    cache = QueryEmbeddingCache(max_bytes=10 * ENTRY_BYTES)
+    cache.put("Are cramps normal?", _vector(1))
+    assert cache.get("  are CRAMPS normal ") == _vector(1)
+    assert cache.get("are cramps rare") is None
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryEmbeddingCache(max_bytes=2 * ENTRY_BYTES)
+    cache.put("first", _vector(1))
+    cache.put("second", _vector(2))
+    cache.get("first")
+    cache.put("third", _vector(3))
+    assert cache.get("second") is None
+    assert cache.get("first") == _vector(1) and cache.get("third") == _vector(3)
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_persisted_cache_survives_restart_and_shrinks_to_a_new_budget(tmp_path):
+    path = str(tmp_path / "model")
+    cache = QueryEmbeddingCache(max_bytes=4 * ENTRY_BYTES, persist_path=path, namespace="model")
+    for i in range(4):
+        cache.put(f"query {i}", _vector(i))
+    cache.flush()
+
+    assert QueryEmbeddingCache(max_bytes=4 * ENTRY_BYTES, persist_path=path, namespace="other").get("query 0") is None
+
+    smaller = QueryEmbeddingCache(max_bytes=2 * ENTRY_BYTES, persist_path=path, namespace="model")
+    assert smaller.get_stats()["capacity"] == 2
+    assert smaller.get("query 3") == _vector(3) and smaller.get("query 0") is None
+
+    reopened = QueryEmbeddingCache(max_bytes=2 * ENTRY_BYTES, persist_path=path, namespace="model")
+    assert reopened.get("query 2") == _vector(2)
@@ -0,0 +1,53 @@
+# tests/test_episodic_memory.py - per-user episodic recall and who gets a persistent index
+
+from src.core.conversation_store import ConversationStore, has_user_identity
+from src.core.episodic_memory import EpisodicMemory, _SessionEpisodeStore, _memory_for, recalled_context
+
+
+def test_shared_and_missing_ids_have_no_identity():
+    assert has_user_identity("alice")
+    assert not has_user_identity("user_001")
+    assert not has_user_identity("")
+    assert not has_user_identity(None)
+
+
+def test_shared_id_gets_no_persistent_index_outside_a_session():
+    assert _memory_for("user_001") is None
+    assert recalled_context("user_001", "cramps on my left side") == ""
+
+
+def test_episodes_persist_per_user(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    EpisodicMemory(store=store).remember("alice", "I get sharp cramps on my left side")
+
+    reloaded = EpisodicMemory(store=store)
+    assert [item["text"] for item in reloaded.recall("alice", "sharp cramps on my left side")] == \
+        ["I get sharp cramps on my left side"]
+    assert reloaded.recall("bob", "sharp cramps on my left side") == []
+
+
+def test_session_index_keeps_only_the_newest_episodes():
+    memory = EpisodicMemory(capacity=2, store=_SessionEpisodeStore())
+    for message in ("my cramps are awful today", "heavy flow this month again", "mood swings all week long"):
+        memory.remember("user_001", message)
+    assert memory.recall("user_001", "my cramps are awful today") == []
+    assert memory.recall("user_001", "mood swings all week long")[0]["text"] == "mood swings all week long"
+
+
+HISTORY = [
+    "I always get migraines right before my period starts",
+    "I can't sleep at night before my period, I keep waking up at 3am",
+    "I get really bad cramps on my left side during my period",
+    "my period is 5 days late this month",
+    "I feel so bloated and tired during my period",
+]
+
+
+def test_recall_matches_the_symptom_not_the_cycle_boilerplate():
+    memory = EpisodicMemory(store=_SessionEpisodeStore())
+    for message in HISTORY:
+        memory.remember("user_001", message)
+
+    assert memory.recall("user_001", "can't sleep before my period", k=1)[0]["text"] == HISTORY[1]
+    assert memory.recall("user_001", "pain on the left during my period", k=1)[0]["text"] == HISTORY[2]
+    assert memory.recall("user_001", "when will my next period start") == []
@@ -0,0 +1,90 @@
+# tests/test_openai_client.py - retries, deadlines and the circuit breaker around chat completions
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import src.utils.openai_client as openai_client
+from src.utils.openai_client import CircuitBreaker, CircuitOpenError, ResilientOpenAI
+
+
+class Upstream(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _client(outcomes, breaker, retries=0, is_async=False):
+    """ResilientOpenAI over a fake upstream that plays back outcomes (exceptions raise, values return)"""
+    calls = []
+
+    def create(**request):
+        calls.append(request)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def create_async(**request):
+        return create(**request)
+
+    raw = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=create_async if is_async else create)))
+    return ResilientOpenAI(lambda: raw, breaker, retries=retries, is_async=is_async), calls
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(openai_client.time, "sleep", lambda seconds: None)
+
+
+def test_transient_failure_is_retried_within_the_deadline():
+    client, calls = _client([Upstream(503), "answer"], CircuitBreaker(), retries=2)
+    assert client.chat.completions.create(model="m", timeout=30) == "answer"
+    assert len(calls) == 2 and 0 < calls[1]["timeout"] <= 30
+
+
+def test_bad_request_is_not_retried_or_counted_against_the_upstream():
+    breaker = CircuitBreaker(failure_threshold=1)
+    client, calls = _client([Upstream(400)], breaker, retries=2)
+    with pytest.raises(Upstream):
+        client.chat.completions.create(model="m")
+    assert len(calls) == 1 and not breaker.is_open
+
+
+def test_breaker_opens_after_repeated_failures_and_probes_after_cool_down(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(openai_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    client, calls = _client([Upstream(503), Upstream(503), "recovered"], breaker)
+
+    for _ in range(2):
+        with pytest.raises(Upstream):
+            client.chat.completions.create(model="m")
+    with pytest.raises(CircuitOpenError):
+        client.chat.completions.create(model="m")
+    assert len(calls) == 2  # the short-circuited call never reached the upstream
+
+    now[0] += 30
+    assert client.chat.completions.create(model="m") == "recovered"
+    stats = breaker.get_stats()
+    assert stats["state"] == "closed" and stats["trips"] == 1 and stats["short_circuited"] == 1
+
+
+def test_failed_half_open_probe_reopens_the_circuit(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(openai_client.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    client, _ = _client([Upstream(503), Upstream(503)], breaker, is_async=True)
+
+    async def call():
+        return await client.chat.completions.create(model="m")
+
+    with pytest.raises(Upstream):
+        asyncio.run(call())
+    now[0] += 30
+    with pytest.raises(Upstream):
+        asyncio.run(call())
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call())
@@ -0,0 +1,69 @@
+# tests/test_rate_limiter.py - per-user and global buckets, queueing, rejection and released reservations
+
+import asyncio
+
+import pytest
+
+from src.utils.rate_limiter import RateLimiter, RateLimitExceeded
+
+
+def _limiter(**limits):
+    settings = dict(requests_per_minute=600, tokens_per_minute=1e6, user_requests_per_minute=600,
+                    user_tokens_per_minute=1e6, daily_requests=1000, queue_timeout=0.0)
+    settings.update(limits)
+    return RateLimiter(**settings)
+
+
+def test_one_user_exhausting_their_bucket_does_not_block_others():
+    limiter = _limiter(user_requests_per_minute=2)
+    limiter.acquire("alice")
+    limiter.acquire("alice")
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("alice")
+    assert limiter.acquire("bob") == 0
+    assert limiter.acquire() == 0  # calls without a user only draw on the global buckets
+    assert limiter.get_stats()["rejected"] == 1
+
+
+def test_global_bucket_caps_everyone():
+    limiter = _limiter(requests_per_minute=2)
+    limiter.acquire("alice")
+    limiter.acquire("bob")
+    assert not limiter.check("carol")[0]
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("carol")
+
+
+def test_burst_queues_in_order_within_the_deadline():
+    limiter = _limiter(user_requests_per_minute=60, queue_timeout=5)  # one request/second refill
+    for _ in range(60):
+        limiter.acquire("alice", timeout=0)
+    waits = [limiter._schedule("alice", 0, 5, reserve=True)[0] for _ in range(3)]
+    assert waits == sorted(waits) and 0.5 < waits[0] <= 1.0
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("alice", timeout=2)
+    assert limiter.get_stats()["queued"] == 3
+
+
+def test_cancelled_async_wait_gives_its_reservation_back():
+    limiter = _limiter(user_requests_per_minute=1, queue_timeout=120)
+
+    async def scenario():
+        await limiter.acquire_async("alice")
+        queued = asyncio.ensure_future(limiter.acquire_async("alice"))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+
+    asyncio.run(scenario())
+    assert limiter.get_stats()["daily_requests"] == 1
+    assert 50 < limiter._schedule("alice", 0, 120, reserve=False)[0] <= 60  # one minute, not two
+
+
+def test_settle_refunds_overestimated_tokens():
+    limiter = _limiter(tokens_per_minute=1000)
+    limiter.acquire("alice", tokens=800)
+    assert not limiter.check(tokens=800)[0]
+    limiter.settle("alice", 800, 100)
+    assert limiter.check(tokens=800)[0]
@@ -0,0 +1,38 @@
+# tests/test_response_cache.py - the shared answer cache never hands one user's conversation to another
+
+import pytest
+
+import src.graph.graphrag_retriever as retriever
+from src.graph.response_cache import SemanticResponseCache
+
+QUESTION = "is a 31 day cycle normal"
+HISTORY_A = "User: the cramps on my left side are awful\nAssistant: I'm so sorry, that sounds rough..."
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = SemanticResponseCache()
+    monkeypatch.setattr(retriever, "get_response_cache", lambda: cache)
+    return cache
+
+
+def test_answer_written_with_history_is_not_served_to_another_user(cache):
+    retriever._finish_generation("Totally normal - and like your left-side cramps, ...", QUESTION, "",
+                                 "neutral", HISTORY_A, stream=False)
+    assert retriever._cached_response(QUESTION, "neutral") is None
+
+    streamed = retriever._finish_generation(iter(["Totally normal - ", "and your cramps..."]), QUESTION, "",
+                                            "neutral", HISTORY_A, stream=True)
+    assert "".join(streamed).startswith("Totally normal")
+    assert retriever._cached_response(QUESTION, "neutral") is None
+
+
+def test_answer_written_without_history_is_shared(cache):
+    answer = retriever._finish_generation("Yes - anything from 21 to 35 days is normal.", QUESTION, "",
+                                          "neutral", "", stream=False)
+    assert retriever._cached_response("is a 31 day cycle normal?", "neutral") == answer
+
+
+def test_referential_questions_are_never_looked_up(cache):
+    retriever._finish_generation("Yes, that's normal.", "is that normal", "", "neutral", "", stream=False)
+    assert retriever._cached_response("is that normal", "neutral") is None
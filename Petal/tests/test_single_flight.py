@@ -0,0 +1,91 @@
+# tests/test_single_flight.py - identical in-flight calls share one upstream call or stream
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.utils.single_flight import SingleFlight, request_key
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    group = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(group.do("key", upstream))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while group.get_stats()["coalesced_calls"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["answer"] * 4
+    assert len(calls) == 1
+    assert group.get_stats()["in_flight"] == 0
+    assert group.do("key", lambda: "fresh") == "fresh"  # finished calls aren't reused
+
+
+def test_failed_call_is_not_reused():
+    group = SingleFlight("test")
+    with pytest.raises(ZeroDivisionError):
+        group.do("key", lambda: 1 / 0)
+    assert group.get_stats()["failed_calls"] == 1
+    assert group.do("key", lambda: "retried") == "retried"
+
+
+def test_late_stream_joiner_replays_earlier_deltas():
+    group = SingleFlight("test")
+    opened = []
+
+    def open_stream():
+        opened.append(1)
+        return iter(["Heat ", "helps", "."])
+
+    first = group.stream("key", open_stream)
+    assert next(first) == "Heat "
+    second = group.stream("key", open_stream)
+    assert list(second) == ["Heat ", "helps", "."]
+    assert list(first) == ["helps", "."]
+    assert len(opened) == 1 and first.completed and second.completed
+
+
+def test_upstream_is_cancelled_only_when_every_async_waiter_is():
+    group = SingleFlight("test")
+
+    async def scenario():
+        started = asyncio.Event()
+        upstream = []
+
+        async def call():
+            upstream.append(asyncio.current_task())
+            started.set()
+            await asyncio.sleep(5)
+
+        first = asyncio.ensure_future(group.do_async("key", call))
+        second = asyncio.ensure_future(group.do_async("key", call))
+        await started.wait()
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not upstream[0].cancelled()
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        await asyncio.sleep(0)
+        return upstream[0].cancelled()
+
+    assert asyncio.run(scenario())
+    assert group.get_stats()["cancelled_calls"] == 1
+
+
+def test_request_key_ignores_dict_order():
+    assert request_key({"model": "m", "temperature": 0.1}) == request_key({"temperature": 0.1, "model": "m"})
@@ -0,0 +1,58 @@
+# tests/test_speculation.py - the speculative topic gate looks the response cache up once per turn
+
+import asyncio
+
+import pytest
+
+import src.graph.graphrag_retriever as retriever
+
+FOLLOW_UP = "and what about at night"
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """A follow-up that only the LLM gate can decide, with every cache lookup recorded"""
+    lookups = {"count": 0, "answer": None}
+
+    def cached_response(query, emotion):
+        lookups["count"] += 1
+        return lookups["answer"]
+
+    monkeypatch.setattr(retriever, "_cached_response", cached_response)
+    monkeypatch.setattr(retriever, "openai_client", object())
+    monkeypatch.setattr(retriever, "async_openai_client", object())
+    monkeypatch.setattr(retriever, "get_conversation_context", lambda user_id: "User: my cramps are bad")
+    monkeypatch.setattr(retriever, "_keyword_topic_decision", lambda query, *args: None)
+    monkeypatch.setattr(retriever, "_contextual_topic_decision", lambda query, context: True)
+    monkeypatch.setattr(retriever, "get_medical_content_from_database", lambda query: "Heat helps cramps.")
+    monkeypatch.setattr(retriever, "_speculate_generation", lambda query, client: False)
+    monkeypatch.setattr(retriever, "create_response_with_all_systems",
+                        lambda *args, **kwargs: "generated answer")
+    return lookups
+
+
+@pytest.mark.parametrize("mode", ["off", "retrieval"])
+def test_cache_hit_is_looked_up_once(monkeypatch, lookups, mode):
+    monkeypatch.setattr(retriever, "SPECULATION_MODE", mode)
+    monkeypatch.setattr(retriever, "is_menstrual_related", lambda query, user_id: True)
+    lookups["answer"] = "cached answer"
+    assert retriever.get_comprehensive_response(FOLLOW_UP, user_id="alice") == "cached answer"
+    assert lookups["count"] == 1
+
+
+def test_speculation_after_a_miss_does_not_look_up_again(monkeypatch, lookups):
+    monkeypatch.setattr(retriever, "SPECULATION_MODE", "retrieval")
+    assert retriever.get_comprehensive_response(FOLLOW_UP, user_id="alice") == "generated answer"
+    assert lookups["count"] == 1
+
+
+def test_async_pipeline_looks_up_once(monkeypatch, lookups):
+    async def gate(query, context):
+        return True
+
+    monkeypatch.setattr(retriever, "_contextual_topic_decision_async", gate)
+    monkeypatch.setattr(retriever, "_speculate_generation", lambda query, client: True)
+    lookups["answer"] = "cached answer"
+    response = asyncio.run(retriever.get_comprehensive_response_async(FOLLOW_UP, user_id="alice"))
+    assert response == "cached answer"
+    assert lookups["count"] == 1
@@ -0,0 +1,62 @@
+# tests/test_streaming.py - streamed replies: deltas, history, and cut-off streams
+
+from types import SimpleNamespace
+
+import pytest
+
+import src.graph.graphrag_retriever as retriever
+import src.utils.openai_llm as openai_llm
+from src.utils.rate_limiter import RateLimiter
+
+
+def _chunk(text=None, finish_reason=None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text),
+                                                    finish_reason=finish_reason)])
+
+
+def _fake_client(chunks):
+    calls = []
+
+    def create(**request):
+        calls.append(request)
+        return iter(chunks)
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))), calls
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RateLimiter()
+    monkeypatch.setattr(openai_llm, "limiter", limiter)
+    monkeypatch.setattr(openai_llm, "chat_history", [])
+    return limiter
+
+
+def test_openai_chat_streams_deltas_and_records_the_finished_exchange(monkeypatch, limiter):
+    client, calls = _fake_client([_chunk("Heat "), _chunk("helps."), _chunk(finish_reason="stop")])
+    monkeypatch.setattr(openai_llm, "client", client)
+
+    deltas = openai_llm.openai_chat("cramps?", user_id="alice", stream=True)
+    assert calls[0]["stream"] is True
+    assert limiter.get_stats()["granted"] == 1  # the slot is taken when the stream opens
+    assert openai_llm.chat_history == []
+
+    assert list(deltas) == ["Heat ", "helps."]
+    assert openai_llm.chat_history[-1] == {"role": "assistant", "content": "Heat helps."}
+
+
+def test_cut_off_stream_is_shown_but_never_cached():
+    stored = []
+    cut_off = retriever._DeltaStream([_chunk("Heat "), _chunk("helps", finish_reason="length")])
+    text = "".join(retriever._stream_with_fallback(cut_off, lambda: "fallback", stored.append))
+    assert text == "Heat helps" + retriever.MEDICAL_FOOTER
+    assert stored == []
+
+    finished = retriever._DeltaStream([_chunk("Heat helps."), _chunk(finish_reason="stop")])
+    "".join(retriever._stream_with_fallback(finished, lambda: "fallback", stored.append))
+    assert stored == ["Heat helps." + retriever.MEDICAL_FOOTER]
+
+
+def test_empty_stream_falls_back():
+    empty = retriever._DeltaStream([])
+    assert list(retriever._stream_with_fallback(empty, lambda: "fallback")) == ["fallback"]
@@ -0,0 +1,62 @@
+# tests/test_topic_gate.py - a confident local NOT_HEALTH never refuses a follow-up the LLM could place
+
+import asyncio
+
+import pytest
+
+import src.graph.graphrag_retriever as retriever
+from src.graph.topic_classifier import get_topic_classifier, is_referential
+
+FOLLOW_UP = "and what about at night?"
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Classifier sure every message is off-topic; the LLM gate records what it was asked"""
+    classifier = get_topic_classifier(retriever.MENSTRUAL_TERMS, retriever.NON_MENSTRUAL_EXCLUSIONS)
+    monkeypatch.setattr(classifier.model, "probability", lambda query: 0.0)
+    asked = []
+
+    def complete(request):
+        asked.append(request["messages"][-1]["content"])
+        return "HEALTH_FOLLOWUP"
+
+    async def complete_async(request):
+        return complete(request)
+
+    monkeypatch.setattr(retriever, "openai_client", object())
+    monkeypatch.setattr(retriever, "async_openai_client", object())
+    monkeypatch.setattr(retriever, "_complete", complete)
+    monkeypatch.setattr(retriever, "_complete_async", complete_async)
+    monkeypatch.setattr(retriever, "_record_gate_verdict", lambda query, is_health: None)
+    monkeypatch.setattr(retriever, "get_medical_content_from_database", lambda query: "Heat helps cramps.")
+    monkeypatch.setattr(retriever, "_speculate_generation", lambda query, client: False)
+    return asked
+
+
+def test_continuations_count_as_referential():
+    assert is_referential(FOLLOW_UP)
+    assert is_referential("what about ibuprofen")
+    assert not is_referential("tell me a joke")
+
+
+def test_follow_up_with_context_escalates_to_the_llm(monkeypatch, gate):
+    monkeypatch.setattr(retriever, "get_conversation_context", lambda user_id: "User: my cramps are bad")
+    assert retriever.is_menstrual_related(FOLLOW_UP, "alice")
+    assert retriever._speculative_topic_gate(FOLLOW_UP, "alice", False)[0]
+    assert len(gate) == 2
+
+    async def context():
+        return "User: my cramps are bad"
+
+    assert asyncio.run(retriever.is_menstrual_related_async(FOLLOW_UP, context()))
+    assert len(gate) == 3
+
+
+def test_without_context_or_reference_the_local_verdict_stands(monkeypatch, gate):
+    monkeypatch.setattr(retriever, "get_conversation_context", lambda user_id: "")
+    assert not retriever.is_menstrual_related(FOLLOW_UP, "alice")
+
+    monkeypatch.setattr(retriever, "get_conversation_context", lambda user_id: "User: my cramps are bad")
+    assert not retriever.is_menstrual_related("tell me a joke", "alice")
+    assert gate == []
@@ -0,0 +1,71 @@
+# tests/test_write_behind.py - batched background writes: order, flush, and inline fallbacks
+
+import threading
+
+from src.utils.write_behind import WriteBehindQueue
+
+
+def test_items_are_written_in_order_in_batches():
+    writer = WriteBehindQueue(batch_size=10, flush_interval=0.05)
+    batches = []
+    writer.register("line", batches.append)
+    for i in range(25):
+        writer.submit("line", i)
+    assert writer.flush(timeout=5)
+    assert [item for batch in batches for item in batch] == list(range(25))
+    assert all(len(batch) <= 10 for batch in batches) and len(batches) < 25
+    assert writer.get_stats()["pending"] == 0
+    writer.close()
+
+
+def test_failed_batch_is_counted_and_later_items_still_written():
+    writer = WriteBehindQueue(flush_interval=0.01)
+    written = []
+
+    def handler(payloads):
+        if "bad" in payloads:
+            raise IOError("disk full")
+        written.extend(payloads)
+
+    writer.register("line", handler)
+    writer.submit("line", "bad")
+    assert writer.flush(timeout=5)
+    writer.submit("line", "good")
+    writer.defer(lambda: written.append("task"))
+    assert writer.flush(timeout=5)
+    assert written == ["good", "task"]
+    assert writer.get_stats()["failed"] == 1
+    writer.close()
+
+
+def test_full_queue_and_closed_writer_write_inline():
+    writer = WriteBehindQueue(max_size=1, flush_interval=0.01)
+    blocked, release = threading.Event(), threading.Event()
+    written = []
+
+    def handler(payloads):
+        blocked.set()
+        release.wait(5)
+        written.extend(payloads)
+
+    writer.register("line", handler)
+    writer.submit("line", 1)  # taken by the worker, which then blocks
+    blocked.wait(5)
+    writer.submit("line", 2)  # fills the queue
+    writer.register("inline", written.extend)
+    writer.submit("inline", 3)
+    assert written == [3]  # queue full - written by the caller instead of dropped
+    release.set()
+    writer.close()
+    assert written == [3, 1, 2]
+
+    writer.submit("inline", 4)
+    assert written[-1] == 4 and writer.get_stats()["inline_writes"] == 2
+
+
+def test_disabled_writer_writes_synchronously():
+    writer = WriteBehindQueue(enabled=False)
+    written = []
+    writer.register("line", written.extend)
+    writer.submit("line", "now")
+    assert written == ["now"] and writer.flush(timeout=0)